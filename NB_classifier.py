@@ -2,9 +2,168 @@ import re
 import ast
 from collections import defaultdict, Counter
 import math
-from typing import Dict, List, Tuple
+import os
+import time
+import hashlib
+import itertools
+import json
+import struct
+import csv
+import sys
+from typing import Dict, Iterable, Iterator, List, Tuple
+import pickle
+from types import MappingProxyType
+from vaderSentiment import vaderSentiment as vader_module
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import pandas as pd
+import numpy as np
+
+# _calculate_word_score strips everything but letters and digits from each
+# word. Stripping these characters (anything that is not alphanumeric or
+# whitespace) from the whole text before splitting gives the same tokens.
+_NON_ALNUM = re.compile(r'[^\w\s\ue000]|_')
+
+# Separates texts in a batch; a private-use character that is never a word
+_TEXT_SEP = '\ue000'
+
+# clean_and_tokenize's patterns for a batch of texts joined by _TEXT_SEP.
+# Markdown links may not span the separator, so no match crosses two texts.
+_URL = re.compile(r'http[s]?://\S+')
+_MARKDOWN_LINK = re.compile(r'\[([^\]\ue000]+)\]\([^\)\ue000]+\)')
+_NB_TOKEN = re.compile(r'\b[a-z]+\b|\ue000')
+
+# Financial-specific word scores, which take precedence over VADER's lexicon
+FINANCIAL_WORD_SCORES = {
+    # Financial positive terms
+    'bullish': 1.0, 'growth': 0.8, 'profit': 0.9, 'gain': 0.8, 'upside': 0.7,
+    'opportunity': 0.7, 'potential': 0.6, 'outperform': 0.8, 'buy': 0.7,
+    'strong': 0.7, 'positive': 0.7, 'increase': 0.6, 'rise': 0.6, 'surge': 0.8,
+    'breakthrough': 0.8, 'innovative': 0.7, 'leading': 0.6, 'premium': 0.6,
+    'dividend': 0.5, 'yield': 0.5, 'undervalued': 0.7, 'undervalue': 0.7,
+
+    # Financial negative terms
+    'bearish': -1.0, 'loss': -0.9, 'decline': -0.7, 'downside': -0.7,
+    'risk': -0.6, 'concern': -0.6, 'worry': -0.7, 'sell': -0.7,
+    'weak': -0.7, 'negative': -0.7, 'decrease': -0.6, 'fall': -0.6,
+    'crash': -0.9, 'plunge': -0.8, 'downtrend': -0.7, 'overvalued': -0.7,
+    'overvalue': -0.7, 'bankruptcy': -0.9, 'default': -0.9, 'delist': -0.8,
+    'dilution': -0.6, 'short': -0.7, 'bear': -0.8, 'dump': -0.8,
+
+    # Neutral/context-dependent terms
+    'hold': 0.0, 'neutral': 0.0, 'stable': 0.0, 'flat': 0.0, 'consolidate': 0.0,
+    'volatile': 0.0, 'uncertain': 0.0, 'mixed': 0.0, 'range': 0.0,
+    'technical': 0.0, 'fundamental': 0.0, 'analysis': 0.0, 'chart': 0.0,
+    'support': 0.0, 'resistance': 0.0, 'trend': 0.0, 'pattern': 0.0
+}
+
+# A post's overall score blends its own compound score with its comments'
+# average: 40% post, 60% comments
+POST_WEIGHT = 0.4
+COMMENT_WEIGHT = 0.6
+
+# Default compound score thresholds for positive and negative sentiment
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+# Prebuilt VADER lexicons and merged word_scores (see load_lexicons)
+LEXICON_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'lexicon_cache.pickle')
+LEXICON_CACHE_VERSION = 1
+
+# Loaded once per process by load_lexicons
+_lexicons = None
+
+# Custom Naive Bayes model file written by save_model
+NB_MODEL_PATH = 'nb_model.bin'
+NB_MODEL_MAGIC = b'RSNBMOD1'
+
+# Arrays in the model file start on this boundary so they can be memory-mapped
+_MODEL_ALIGNMENT = 64
+
+def _merge_word_scores(vader_lexicon: Dict[str, float]) -> Dict[str, float]:
+    """FINANCIAL_WORD_SCORES plus VADER's word list"""
+    scores = dict(FINANCIAL_WORD_SCORES)
+    
+    # Add VADER's word lists
+    for word, score in vader_lexicon.items():
+        if word not in scores:  # Don't override our custom scores
+            scores[word] = score
+    
+    return scores
+
+def _vader_fingerprint() -> Tuple:
+    """Identify the installed VADER code and lexicon files by size and modification time"""
+    vader_path = os.path.abspath(vader_module.__file__)
+    files = []
+    for path in (vader_path,
+                 os.path.join(os.path.dirname(vader_path), 'vader_lexicon.txt'),
+                 os.path.join(os.path.dirname(vader_path), 'emoji_utf8_lexicon.txt')):
+        stat = os.stat(path)
+        files.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(files)
+
+def _lexicon_fingerprint() -> Tuple:
+    """Identify the VADER installation and financial terms a lexicon cache was built from"""
+    terms = hashlib.blake2b(repr(sorted(FINANCIAL_WORD_SCORES.items())).encode(), digest_size=8).hexdigest()
+    return (LEXICON_CACHE_VERSION, _vader_fingerprint(), terms)
+
+def load_lexicons(cache_path: str = LEXICON_CACHE_PATH, use_cache: bool = True) -> Tuple[Dict, Dict, Dict]:
+    """
+    VADER's word and emoji lexicons and the merged word_scores, loaded
+    once per process. They come from a pickle cache, rebuilt whenever
+    vaderSentiment or FINANCIAL_WORD_SCORES changes, instead of parsing
+    VADER's text files and merging them for every SentimentAnalyzer.
+    """
+    global _lexicons
+    if _lexicons is not None and use_cache:
+        return _lexicons
+    
+    fingerprint = _lexicon_fingerprint()
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_fingerprint, lexicons = pickle.load(f)
+            if cached_fingerprint == fingerprint:
+                _lexicons = lexicons
+                return _lexicons
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            pass  # Unreadable cache; rebuild it below
+    
+    vader = SentimentIntensityAnalyzer()
+    lexicons = (vader.lexicon, vader.emojis, _merge_word_scores(vader.lexicon))
+    
+    if use_cache:
+        try:
+            with open(cache_path, 'wb') as f:
+                pickle.dump((fingerprint, lexicons), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            print(f"Could not write lexicon cache: {e}")
+        _lexicons = lexicons
+    return lexicons
+
+def _build_vader(lexicon: Dict[str, float], emojis: Dict[str, str]) -> SentimentIntensityAnalyzer:
+    """A VADER analyzer over already-parsed lexicons; its __init__ only parses the files into these"""
+    vader = SentimentIntensityAnalyzer.__new__(SentimentIntensityAnalyzer)
+    vader.lexicon = lexicon
+    vader.emojis = emojis
+    return vader
+
+def _softmax(log_scores: np.ndarray) -> np.ndarray:
+    """Row-wise normalized probabilities from unnormalized log scores"""
+    proba = np.exp(log_scores - log_scores.max(axis=1, keepdims=True))
+    return proba / proba.sum(axis=1, keepdims=True)
+
+def sentiment_fields(confidence: Dict) -> Dict:
+    """Flatten predict_sentiment output into the per-post columns the pipeline stores"""
+    return {
+        'post_sentiment': confidence['post_sentiment'],
+        'post_score': float(confidence['post_score']),
+        'post_word_score': float(confidence['post_word_score']),
+        'comment_sentiment': confidence['comment_sentiment'],
+        'comment_score': float(confidence['comment_score']),
+        'comment_word_scores': [float(score) for score in confidence['comment_word_scores']],
+        'overall_sentiment': confidence['overall_sentiment'],
+        'overall_score': float(confidence['overall_score']),
+        'num_comments_analyzed': int(confidence['num_comments'])
+    }
 
 class SentimentAnalyzer:
     """
@@ -12,9 +171,11 @@ class SentimentAnalyzer:
     Uses VADER as base model with ability to add custom training data
     """
     
-    def __init__(self):
-        # Initialize VADER
-        self.vader = SentimentIntensityAnalyzer()
+    def __init__(self, cache=None):
+        # Initialize VADER from the prebuilt lexicons, which analyzers in a
+        # process share read-only
+        vader_lexicon, vader_emojis, word_scores = load_lexicons()
+        self.vader = _build_vader(vader_lexicon, vader_emojis)
         
         # For custom training data
         self.custom_training_data = []
@@ -23,45 +184,60 @@ class SentimentAnalyzer:
         self.sentiment_counts = defaultdict(int)
         self.vocabulary = set()
         
+        # Compiled Naive Bayes model (see compile_nb_model)
+        self.nb_classes = []
+        self.nb_vocab = {}
+        self.nb_log_prior = None
+        self.nb_log_prob = None
+        self.nb_alpha = 1.0
+        self._nb_revision = 0
+        self._nb_lookup = {}
+        
+        # Examples already folded into the counts, and the model file whose
+        # counts haven't been unpacked into word_counts yet
+        self._trained_examples = 0
+        self._model_counts = None
+        
         # Sentiment thresholds
-        self.positive_threshold = 0.05
-        self.negative_threshold = -0.05
+        self.positive_threshold = POSITIVE_THRESHOLD
+        self.negative_threshold = NEGATIVE_THRESHOLD
+        
+        # Blend of VADER compound and lexicon word score for each text
+        self.vader_weight = 0.7
+        self.word_weight = 0.3
+        
+        # Share of the Naive Bayes score in the blend, once a custom model is trained
+        self.nb_weight = 0.3
+        
+        # Optional sentiment_cache.SentimentCache of per-text scores
+        self.cache = cache
+        self._version_key = None
+        self._version = None
+        
+        # Token ID vocabulary for word_scores_batch, built on first use
+        self._kernel_key = None
+        self._vocab = None
+        self._vocab_scores = None
         
-        # Initialize word scores
-        self.word_scores = self._initialize_word_scores()
+        # Initialize word scores (a read-only copy; see the word_scores setter)
+        self._word_scores_revision = 0
+        self.word_scores = word_scores
+    
+    @property
+    def word_scores(self) -> MappingProxyType:
+        """Read-only view of the lexicon scores; assign a new mapping to change them"""
+        return self._word_scores
+    
+    @word_scores.setter
+    def word_scores(self, scores: Dict[str, float]):
+        # The scores can't change in place, so the revision tells
+        # word_scores_batch and scoring_version when to rebuild
+        self._word_scores = MappingProxyType(dict(scores))
+        self._word_scores_revision += 1
     
     def _initialize_word_scores(self) -> Dict[str, float]:
         """Initialize word sentiment scores with financial-specific terms"""
-        scores = {
-            # Financial positive terms
-            'bullish': 1.0, 'growth': 0.8, 'profit': 0.9, 'gain': 0.8, 'upside': 0.7,
-            'opportunity': 0.7, 'potential': 0.6, 'outperform': 0.8, 'buy': 0.7,
-            'strong': 0.7, 'positive': 0.7, 'increase': 0.6, 'rise': 0.6, 'surge': 0.8,
-            'breakthrough': 0.8, 'innovative': 0.7, 'leading': 0.6, 'premium': 0.6,
-            'dividend': 0.5, 'yield': 0.5, 'undervalued': 0.7, 'undervalue': 0.7,
-            
-            # Financial negative terms
-            'bearish': -1.0, 'loss': -0.9, 'decline': -0.7, 'downside': -0.7,
-            'risk': -0.6, 'concern': -0.6, 'worry': -0.7, 'sell': -0.7,
-            'weak': -0.7, 'negative': -0.7, 'decrease': -0.6, 'fall': -0.6,
-            'crash': -0.9, 'plunge': -0.8, 'downtrend': -0.7, 'overvalued': -0.7,
-            'overvalue': -0.7, 'bankruptcy': -0.9, 'default': -0.9, 'delist': -0.8,
-            'dilution': -0.6, 'short': -0.7, 'bear': -0.8, 'dump': -0.8,
-            
-            # Neutral/context-dependent terms
-            'hold': 0.0, 'neutral': 0.0, 'stable': 0.0, 'flat': 0.0, 'consolidate': 0.0,
-            'volatile': 0.0, 'uncertain': 0.0, 'mixed': 0.0, 'range': 0.0,
-            'technical': 0.0, 'fundamental': 0.0, 'analysis': 0.0, 'chart': 0.0,
-            'support': 0.0, 'resistance': 0.0, 'trend': 0.0, 'pattern': 0.0
-        }
-        
-        # Add VADER's word lists
-        vader_words = self.vader.lexicon
-        for word, score in vader_words.items():
-            if word not in scores:  # Don't override our custom scores
-                scores[word] = score
-        
-        return scores
+        return _merge_word_scores(self.vader.lexicon)
     
     def _calculate_word_score(self, text: str) -> float:
         """Calculate sentiment score based on word counts"""
@@ -85,6 +261,126 @@ class SentimentAnalyzer:
             return round(normalized_score, 1)
         return 50.0  # Neutral score if no sentiment words found
     
+    def _lexicon_kernel(self) -> Tuple[Dict[str, int], np.ndarray]:
+        """Map word_scores to token IDs and a score array, rebuilding if word_scores changes"""
+        key = self._word_scores_revision
+        if self._kernel_key != key:
+            self._vocab = {word: i for i, word in enumerate(self.word_scores)}
+            self._vocab[_TEXT_SEP] = -2
+            self._vocab_scores = np.fromiter(self.word_scores.values(), dtype=np.float64,
+                                             count=len(self.word_scores))
+            self._kernel_key = key
+        return self._vocab, self._vocab_scores
+    
+    def word_scores_batch(self, texts: List[str]) -> List[float]:
+        """
+        Batch version of _calculate_word_score with identical results.
+        All texts are lowercased, cleaned and split in one go, tokens are
+        mapped to IDs, and per-text sums come from one bincount over the
+        token array.
+        """
+        vocab, vocab_scores = self._lexicon_kernel()
+        n = len(texts)
+        if n == 0:
+            return []
+        
+        buffer = f' {_TEXT_SEP} '.join(
+            text.replace(_TEXT_SEP, '') if isinstance(text, str) else '' for text in texts
+        )
+        tokens = _NON_ALNUM.sub('', buffer.lower()).split()
+        
+        get_id = vocab.get
+        token_ids = np.fromiter((get_id(token, -1) for token in tokens), dtype=np.int64, count=len(tokens))
+        
+        # Each separator starts the next text's segment
+        segments = np.cumsum(token_ids == -2)
+        known = token_ids >= 0
+        segments, token_ids = segments[known], token_ids[known]
+        
+        # bincount adds each text's scores in token order, like the Python loop
+        totals = np.bincount(segments, weights=vocab_scores[token_ids], minlength=n)
+        counts = np.bincount(segments, minlength=n)
+        
+        # Normalize score to 0-100 range
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized = ((totals / counts + 1) / 2) * 100
+        
+        scores = []
+        for text, count, score in zip(texts, counts.tolist(), normalized.tolist()):
+            if not isinstance(text, str):
+                scores.append(0.0)
+            elif count:
+                scores.append(round(score, 1))
+            else:
+                scores.append(50.0)  # Neutral score if no sentiment words found
+        return scores
+    
+    def scoring_version(self) -> str:
+        """
+        Digest of everything a text's cached scores depend on: word_scores,
+        the blend weights, the thresholds, the installed VADER files and the
+        Naive Bayes model in use. Recomputed whenever word_scores is replaced,
+        a parameter changes or the model is recompiled.
+        """
+        nb_model = self.nb_log_prob if self._nb_ready() else None
+        nb_revision = self._nb_revision if nb_model is not None else None
+        key = (self._word_scores_revision, nb_revision, self.vader_weight,
+               self.word_weight, self.nb_weight, self.positive_threshold, self.negative_threshold)
+        if self._version_key != key:
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(repr(key[2:]).encode())
+            digest.update(repr(_vader_fingerprint()).encode())
+            for word, score in sorted(self.word_scores.items()):
+                digest.update(f"{word}\0{score!r}\n".encode('utf-8', 'surrogatepass'))
+            if nb_model is not None:
+                digest.update('\0'.join(self.nb_classes).encode())
+                digest.update('\0'.join(self.nb_vocab).encode('utf-8', 'surrogatepass'))
+                digest.update(self.nb_log_prior.tobytes())
+                digest.update(nb_model.tobytes())
+            self._version = digest.hexdigest()
+            self._version_key = key
+        return self._version
+    
+    def _compute_text_scores(self, texts: List[str]) -> List[Tuple[float, float]]:
+        """
+        (compound, word_score) for each text: VADER blended with the lexicon
+        score, and with the Naive Bayes score when a custom model is trained
+        """
+        word_scores = self.word_scores_batch(texts)
+        nb_scores = self.nb_scores(texts).tolist() if self._nb_ready() else None
+        scores = []
+        for i, (text, word_score) in enumerate(zip(texts, word_scores)):
+            vader = self.vader.polarity_scores(text)
+            compound = (vader['compound'] * self.vader_weight) + ((word_score - 50) / 50 * self.word_weight)
+            if nb_scores is not None:
+                compound = compound * (1 - self.nb_weight) + nb_scores[i] * self.nb_weight
+            scores.append((compound, word_score))
+        return scores
+    
+    def text_scores(self, texts: List[str]) -> List[Tuple[float, float]]:
+        """(compound, word_score) for each text, taken from the cache when possible"""
+        if self.cache is None:
+            return self._compute_text_scores(texts)
+        
+        cache = self.cache
+        cache.set_version(self.scoring_version())
+        keys = [cache.key(text) for text in texts]
+        found = cache.get_many(keys)
+        
+        # Score each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            start = time.perf_counter()
+            computed = dict(zip(missing, self._compute_text_scores(list(missing.values()))))
+            cache.record_compute(len(computed), time.perf_counter() - start)
+            cache.put_many(computed)
+            found.update(computed)
+        
+        return [found[key] for key in keys]
+    
     def clean_and_tokenize(self, text: str) -> List[str]:
         """Clean text and convert to tokens"""
         if not text or not isinstance(text, str):
@@ -150,19 +446,27 @@ class SentimentAnalyzer:
         self.custom_training_data.append((data_dict, sentiment))
         self.custom_trained = False  # Reset training flag
     
-    def train_custom_model(self):
-        """Train the custom model on added examples"""
-        if not self.custom_training_data:
+    def train_custom_model(self, retrain: bool = False):
+        """
+        Fold the examples added since the last training into the counts and
+        recompile the model. retrain=True discards the counts (including
+        any loaded with load_model) and trains on all added examples again.
+        """
+        if retrain:
+            self.word_counts = defaultdict(lambda: defaultdict(int))
+            self.sentiment_counts = defaultdict(int)
+            self.vocabulary = set()
+            self._model_counts = None
+            self._trained_examples = 0
+        
+        new_examples = self.custom_training_data[self._trained_examples:]
+        if not new_examples:
             return
         
-        print(f"Training custom model on {len(self.custom_training_data)} examples...")
+        print(f"Training custom model on {len(new_examples)} new examples...")
+        self._unpack_model_counts()
         
-        # Reset counts
-        self.word_counts = defaultdict(lambda: defaultdict(int))
-        self.sentiment_counts = defaultdict(int)
-        self.vocabulary = set()
-        
-        for data_dict, sentiment in self.custom_training_data:
+        for data_dict, sentiment in new_examples:
             # Extract all text
             combined_text = self.extract_all_text(data_dict)
             
@@ -175,15 +479,140 @@ class SentimentAnalyzer:
                 self.word_counts[sentiment][word] += 1
                 self.vocabulary.add(word)
         
+        self._trained_examples = len(self.custom_training_data)
+        self.compile_nb_model()
         self.custom_trained = True
         print(f"Custom training complete. Vocabulary size: {len(self.vocabulary)}")
         print(f"Sentiment distribution: {dict(self.sentiment_counts)}")
     
+    def partial_fit(self, examples: List[Tuple[Dict, str]]):
+        """Add (data_dict, sentiment) examples and fold them into the trained model"""
+        for data_dict, sentiment in examples:
+            self.add_training_example(data_dict, sentiment)
+        self.train_custom_model()
+    
+    def compile_nb_model(self, alpha: float = None):
+        """
+        Compile word_counts and sentiment_counts into a Multinomial Naive
+        Bayes model: a word -> column index, log class priors, and a
+        classes x vocabulary matrix of Laplace-smoothed log P(word | class)
+        """
+        if alpha is not None:
+            self.nb_alpha = alpha
+        if self._model_counts is None:
+            # Otherwise this is a loaded model, with classes and vocabulary from its file
+            self.nb_classes = sorted(self.sentiment_counts)
+            self.nb_vocab = {word: i for i, word in enumerate(sorted(self.vocabulary))}
+            self._nb_lookup = dict(self.nb_vocab)
+            self._nb_lookup[_TEXT_SEP] = -2
+        class_counts = self._class_count_array().astype(np.float64)
+        counts = self._word_count_matrix().astype(np.float64)
+        
+        self.nb_log_prior = np.log(class_counts / class_counts.sum())
+        smoothed = counts + self.nb_alpha
+        self.nb_log_prob = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+        self._nb_revision += 1
+    
+    def _nb_ready(self) -> bool:
+        return self.custom_trained and self.nb_log_prob is not None and len(self.nb_classes) > 0
+    
+    def _nb_document_terms(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sparse document-term matrix of texts in coordinate form: parallel
+        arrays of document and vocabulary indices, one pair per known token
+        (a word repeated n times appears n times). Tokens are the same as
+        clean_and_tokenize's, found in one pass over the whole batch.
+        """
+        buffer = f' {_TEXT_SEP} '.join(
+            text.replace(_TEXT_SEP, '') if isinstance(text, str) else '' for text in texts
+        )
+        buffer = _MARKDOWN_LINK.sub(r'\1', _URL.sub('', buffer)).lower()
+        tokens = _NB_TOKEN.findall(buffer)
+        
+        # The vocabulary only holds words longer than two letters, so the
+        # short words clean_and_tokenize drops map to -1 like unknown words
+        term_ids = np.fromiter(map(self._nb_lookup.get, tokens, itertools.repeat(-1)),
+                               dtype=np.int64, count=len(tokens))
+        
+        doc_ids = np.cumsum(term_ids == -2)
+        known = term_ids >= 0
+        return doc_ids[known], term_ids[known]
+    
+    def nb_log_likelihoods(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Unnormalized log posteriors (texts x classes), computed as the sparse
+        document-term matrix times log_prob transposed plus the log priors,
+        and the number of known words in each text
+        """
+        n = len(texts)
+        doc_ids, term_ids = self._nb_document_terms(texts)
+        joint = np.empty((n, len(self.nb_classes)), dtype=np.float64)
+        for c in range(len(self.nb_classes)):
+            joint[:, c] = np.bincount(doc_ids, weights=self.nb_log_prob[c, term_ids], minlength=n)
+        joint += self.nb_log_prior
+        return joint, np.bincount(doc_ids, minlength=n)
+    
+    def nb_predict_proba(self, texts: List[str]) -> np.ndarray:
+        """Class probabilities (texts x nb_classes) from the custom Naive Bayes model"""
+        if not self._nb_ready():
+            raise ValueError("No custom model trained; call train_custom_model first")
+        joint, _ = self.nb_log_likelihoods(texts)
+        return _softmax(joint)
+    
+    def nb_predict(self, texts: List[str]) -> List[str]:
+        """Most likely sentiment label of each text under the custom Naive Bayes model"""
+        proba = self.nb_predict_proba(texts)
+        return [self.nb_classes[i] for i in proba.argmax(axis=1)]
+    
+    def nb_scores(self, texts: List[str]) -> np.ndarray:
+        """
+        Naive Bayes sentiment of each text on VADER's -1..1 scale,
+        P(positive) - P(negative). Texts without any word from the training
+        vocabulary score 0 rather than the class prior, so they don't move
+        the blended score.
+        """
+        if not self._nb_ready():
+            raise ValueError("No custom model trained; call train_custom_model first")
+        joint, known_words = self.nb_log_likelihoods(texts)
+        proba = _softmax(joint)
+        
+        scores = np.zeros(len(texts), dtype=np.float64)
+        if 'positive' in self.nb_classes:
+            scores += proba[:, self.nb_classes.index('positive')]
+        if 'negative' in self.nb_classes:
+            scores -= proba[:, self.nb_classes.index('negative')]
+        scores[known_words == 0] = 0.0
+        return scores
+    
     def predict_sentiment(self, data_dict: Dict) -> Dict[str, float]:
         """
         Predict sentiment using VADER and custom model if available
         Returns: (predicted_sentiment, confidence_scores)
         """
+        post_text, comment_texts = self._post_texts(data_dict)
+        
+        # Scores for the post and every comment in one batch
+        return self._confidence(self.text_scores([post_text] + comment_texts))
+    
+    def predict_sentiment_batch(self, posts: List[Dict]) -> List[Dict[str, float]]:
+        """
+        predict_sentiment for several posts, scoring the texts of all of
+        them in one text_scores call so the batch kernels see larger batches
+        """
+        texts = []
+        bounds = []
+        for data_dict in posts:
+            post_text, comment_texts = self._post_texts(data_dict)
+            start = len(texts)
+            texts.append(post_text)
+            texts.extend(comment_texts)
+            bounds.append((start, len(texts)))
+        
+        text_scores = self.text_scores(texts)
+        return [self._confidence(text_scores[start:end]) for start, end in bounds]
+    
+    def _post_texts(self, data_dict: Dict) -> Tuple[str, List[str]]:
+        """A post record's title + content text and its comment texts"""
         # Extract post content (title + post)
         post_text = []
         if data_dict.get('post_title') and isinstance(data_dict['post_title'], str):
@@ -198,25 +627,25 @@ class SentimentAnalyzer:
             comment_texts = [c for c in comments if isinstance(c, str)]
         elif isinstance(comments, str):
             try:
-                parsed_comments = ast.literal_eval(comments)
+                try:
+                    parsed_comments = json.loads(comments)  # What extract_company.csv_frame writes
+                except ValueError:
+                    parsed_comments = ast.literal_eval(comments)
                 comment_texts = [c for c in parsed_comments if isinstance(c, str)]
             except:
                 comment_texts = [comments] if comments else []
         else:
             comment_texts = []
         
+        return post_text, comment_texts
+    
+    def _confidence(self, text_scores: List[Tuple[float, float]]) -> Dict[str, float]:
+        """predict_sentiment's result from the (compound, word_score) of a post's text and then its comments"""
         # Analyze post content
-        post_vader = self.vader.polarity_scores(post_text)
-        post_word_score = self._calculate_word_score(post_text)
-        post_compound = (post_vader['compound'] * 0.7) + ((post_word_score - 50) / 50 * 0.3)
+        post_compound, post_word_score = text_scores[0]
         
         # Analyze comments
-        comment_scores = []
-        for comment in comment_texts:
-            comment_vader = self.vader.polarity_scores(comment)
-            comment_word_score = self._calculate_word_score(comment)
-            comment_compound = (comment_vader['compound'] * 0.7) + ((comment_word_score - 50) / 50 * 0.3)
-            comment_scores.append(comment_compound)
+        comment_scores = [compound for compound, _ in text_scores[1:]]
         
         # Calculate average comment sentiment
         avg_comment_score = sum(comment_scores) / len(comment_scores) if comment_scores else 0
@@ -250,7 +679,7 @@ class SentimentAnalyzer:
         
         # Overall sentiment (weighted average of post and comments)
         if comment_scores:
-            overall_score = (post_compound * 0.4) + (avg_comment_score * 0.6)  # 40% post, 60% comments
+            overall_score = (post_compound * POST_WEIGHT) + (avg_comment_score * COMMENT_WEIGHT)
         else:
             overall_score = post_compound  # Just use post if no comments
             
@@ -266,25 +695,37 @@ class SentimentAnalyzer:
         
         return confidence
     
-    def analyze_reddit_data(self, reddit_data: List[Dict]) -> List[Dict]:
+    def iter_analyze(self, reddit_data: Iterable[Dict], chunk_size: int = 1) -> Iterator[Dict]:
         """
-        Analyze sentiment for a list of Reddit data dictionaries
-        Returns list with sentiment predictions added
+        Lazily analyze any iterable of Reddit data dictionaries (e.g.
+        iter_post_records over a large CSV or JSONL dump), yielding each
+        with its sentiment predictions added. Only chunk_size posts are held
+        at a time; larger chunks score their texts in one batch.
         """
-        results = []
-        
+        chunk = []
         for data_dict in reddit_data:
-            sentiment = self.predict_sentiment(data_dict)
-            
+            chunk.append(data_dict)
+            if len(chunk) >= chunk_size:
+                yield from self._analyze_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._analyze_chunk(chunk)
+    
+    def _analyze_chunk(self, chunk: List[Dict]) -> Iterator[Dict]:
+        for data_dict, sentiment in zip(chunk, self.predict_sentiment_batch(chunk)):
             result = data_dict.copy()
             result['predicted_sentiment'] = sentiment['post_sentiment']
             result['sentiment_confidence'] = sentiment
-            result['confidence_score'] = sentiment[sentiment['post_sentiment']]
+            result['confidence_score'] = sentiment['post_score']
             result['word_score'] = sentiment['post_word_score']
-            
-            results.append(result)
-        
-        return results
+            yield result
+    
+    def analyze_reddit_data(self, reddit_data: List[Dict]) -> List[Dict]:
+        """
+        Analyze sentiment for a list of Reddit data dictionaries
+        Returns list with sentiment predictions added
+        """
+        return list(self.iter_analyze(reddit_data))
     
     def save_training_data(self, filepath: str):
         """Save custom training data to CSV"""
@@ -299,19 +740,271 @@ class SentimentAnalyzer:
             row['sentiment_label'] = sentiment
             data.append(row)
         
+        import pandas as pd
         df = pd.DataFrame(data)
         df.to_csv(filepath, index=False)
         print(f"Saved {len(data)} training examples to {filepath}")
     
     def load_training_data(self, filepath: str):
         """Load custom training data from CSV"""
+        import pandas as pd
         try:
             df = pd.read_csv(filepath)
-            for _, row in df.iterrows():
-                post_dict = row.to_dict()
+            for post_dict in df.to_dict('records'):
                 sentiment = post_dict.pop('sentiment_label')
                 self.add_training_example(post_dict, sentiment)
             print(f"Loaded {len(df)} training examples from {filepath}")
             self.train_custom_model()
         except Exception as e:
-            print(f"Error loading training data: {e}")
\ No newline at end of file
+            print(f"Error loading training data: {e}")
+    
+    def save_model(self, filepath: str = NB_MODEL_PATH):
+        """
+        Save the trained model as one binary file: a JSON header, the
+        vocabulary, then the class counts, word counts (classes x vocab),
+        log priors and log-probability matrix as aligned little-endian
+        arrays that load_model memory-maps
+        """
+        if not self._nb_ready():
+            raise ValueError("No custom model trained; call train_custom_model first")
+        
+        vocab = '\n'.join(self.nb_vocab).encode('utf-8')
+        class_counts = self._class_count_array().astype('<i8')
+        word_counts = self._word_count_matrix().astype('<i8')
+        arrays = [
+            ('class_counts', class_counts),
+            ('word_counts', word_counts),
+            ('log_prior', self.nb_log_prior.astype('<f8')),
+            ('log_prob', np.asarray(self.nb_log_prob, dtype='<f8'))
+        ]
+        
+        # Array offsets are relative to the aligned end of the vocabulary
+        header = {'classes': self.nb_classes, 'alpha': self.nb_alpha, 'vocab_size': len(self.nb_vocab),
+                  'vocab_bytes': len(vocab), 'arrays': {}}
+        offset = 0
+        for name, array in arrays:
+            header['arrays'][name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+            offset = _align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode('utf-8')
+        data_start = _align(len(NB_MODEL_MAGIC) + 4 + len(header_bytes) + len(vocab))
+        
+        # Written to a temporary file and renamed, so workers never map a half-written model
+        temp_path = f"{filepath}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(NB_MODEL_MAGIC)
+            f.write(struct.pack('<I', len(header_bytes)))
+            f.write(header_bytes)
+            f.write(vocab)
+            for name, array in arrays:
+                f.write(b'\0' * (data_start + header['arrays'][name]['offset'] - f.tell()))
+                f.write(array.tobytes())
+        os.replace(temp_path, filepath)
+        print(f"Saved custom model ({len(self.nb_vocab)} words, {len(self.nb_classes)} classes) to {filepath}")
+    
+    def load_model(self, filepath: str = NB_MODEL_PATH):
+        """
+        Load a model written by save_model. The arrays are memory-mapped
+        read-only rather than read, so loading costs the same whatever the
+        training set size, and processes loading the same file share its
+        pages. Training afterwards folds new examples into the loaded counts.
+        """
+        with open(filepath, 'rb') as f:
+            if f.read(len(NB_MODEL_MAGIC)) != NB_MODEL_MAGIC:
+                raise ValueError(f"{filepath} is not a custom model file")
+            header_size, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_size))
+            vocab = f.read(header['vocab_bytes']).decode('utf-8')
+            data_start = _align(f.tell())
+        
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            shape = tuple(spec['shape'])
+            if 0 in shape:
+                arrays[name] = np.zeros(shape, dtype=spec['dtype'])
+            else:
+                arrays[name] = np.memmap(filepath, dtype=spec['dtype'], mode='r',
+                                         offset=data_start + spec['offset'], shape=shape)
+        
+        self.nb_classes = header['classes']
+        self.nb_alpha = header['alpha']
+        self.nb_vocab = {word: i for i, word in enumerate(vocab.split('\n'))} if header['vocab_size'] else {}
+        self._nb_lookup = dict(self.nb_vocab)
+        self._nb_lookup[_TEXT_SEP] = -2
+        self.nb_log_prior = arrays['log_prior']
+        self.nb_log_prob = arrays['log_prob']
+        self._nb_revision += 1
+        
+        # Counts stay in the file until the model is trained further
+        self.word_counts = defaultdict(lambda: defaultdict(int))
+        self.sentiment_counts = defaultdict(int)
+        self.vocabulary = set()
+        self._model_counts = (arrays['class_counts'], arrays['word_counts'])
+        self._trained_examples = len(self.custom_training_data)
+        self.custom_trained = True
+        print(f"Loaded custom model ({len(self.nb_vocab)} words, {len(self.nb_classes)} classes) from {filepath}")
+    
+    def _unpack_model_counts(self):
+        """Move counts from a loaded model file into word_counts, so training can add to them"""
+        if self._model_counts is None:
+            return
+        class_counts, word_counts = self._model_counts
+        words = list(self.nb_vocab)
+        for c, sentiment in enumerate(self.nb_classes):
+            self.sentiment_counts[sentiment] += int(class_counts[c])
+            for i in np.flatnonzero(word_counts[c]).tolist():
+                self.word_counts[sentiment][words[i]] += int(word_counts[c, i])
+        self.vocabulary.update(words)
+        self._model_counts = None
+    
+    def _class_count_array(self) -> np.ndarray:
+        """Training examples per class in nb_classes order"""
+        if self._model_counts is not None:
+            return np.asarray(self._model_counts[0])
+        return np.array([self.sentiment_counts[sentiment] for sentiment in self.nb_classes], dtype=np.int64)
+    
+    def _word_count_matrix(self) -> np.ndarray:
+        """Word counts as a classes x vocabulary matrix in nb_vocab order"""
+        if self._model_counts is not None:
+            return np.asarray(self._model_counts[1])
+        counts = np.zeros((len(self.nb_classes), len(self.nb_vocab)), dtype=np.int64)
+        for c, sentiment in enumerate(self.nb_classes):
+            words = self.word_counts[sentiment]
+            if words:
+                counts[c, [self.nb_vocab[word] for word in words]] = list(words.values())
+        return counts
+
+def _align(offset: int) -> int:
+    return -(-offset // _MODEL_ALIGNMENT) * _MODEL_ALIGNMENT
+
+def iter_post_records(filepath: str) -> Iterator[Dict]:
+    """
+    Stream post records from a CSV or JSONL dump, or a Parquet run file or
+    directory of the archive (see archive.py), one row at a time, without
+    loading the file into a DataFrame
+    """
+    if filepath.endswith('.parquet') or os.path.isdir(filepath):
+        from archive import iter_archive_records
+        yield from iter_archive_records(filepath)
+        return
+    if filepath.endswith(('.jsonl', '.ndjson')):
+        with open(filepath, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    
+    # Comment lists can be far longer than the csv module's default field limit
+    csv.field_size_limit(sys.maxsize)
+    with open(filepath, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+# Post fields predict_sentiment reads; only these are sent to worker processes
+SCORING_FIELDS = ('post_title', 'post_content', 'comments')
+
+# Each worker process builds its analyzer once, in _init_worker
+_worker_analyzer = None
+
+def _init_worker(model_path=None, cache_path=None, cache_entries=None, cache_persistent=True):
+    global _worker_analyzer
+    cache = None
+    if cache_path is not None:
+        from sentiment_cache import SentimentCache
+        cache = SentimentCache(cache_path, max_memory_entries=cache_entries, persistent=cache_persistent)
+    _worker_analyzer = SentimentAnalyzer(cache=cache)
+    if model_path is not None:
+        # Memory-mapped, so every worker shares one copy of the model
+        _worker_analyzer.load_model(model_path)
+
+def _score_chunk(posts: List[Dict]) -> Tuple[List[Dict], Dict]:
+    """Score one chunk, returning its results and the worker's cache statistics for it"""
+    results = [sentiment_fields(confidence) for confidence in _worker_analyzer.predict_sentiment_batch(posts)]
+    cache = _worker_analyzer.cache
+    if cache is None:
+        return results, {}
+    cache.flush()
+    stats = cache.stats
+    cache.reset_stats()
+    return results, stats
+
+def scoring_pool(workers: int, model_path: str = None, cache=None):
+    """
+    Process pool for _score_chunk. Every worker builds its analyzer once,
+    loading the custom model at model_path if given, and with a
+    sentiment_cache.SentimentCache opens its own cache on the same SQLite file.
+    """
+    # Imported here, since scoring workers themselves never need it
+    from concurrent.futures import ProcessPoolExecutor
+    
+    initargs = (model_path,)
+    if cache is not None:
+        cache.create()
+        initargs += (cache.db_path, cache.max_memory_entries, cache.persistent)
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+
+def submit_scoring(executor, posts: List[Dict]):
+    """
+    Score posts on a scoring_pool. The future's result is their
+    sentiment_fields dicts and the worker's cache statistics for them.
+    """
+    return executor.submit(_score_chunk, [{field: post.get(field) for field in SCORING_FIELDS} for post in posts])
+
+def score_posts_parallel(posts: List[Dict], workers: int = None, chunk_size: int = 250,
+                         min_parallel_posts: int = 2000, analyzer: SentimentAnalyzer = None,
+                         cache=None, model_path: str = None) -> List[Dict]:
+    """
+    Score many posts on a process pool, returning sentiment_fields dicts in
+    the same order as posts.
+    
+    Posts are scored in chunks of chunk_size with predict_sentiment_batch;
+    on the pool, chunks also keep the pickling overhead per post low. Runs
+    smaller than min_parallel_posts, or with a single worker, are scored
+    in this process with analyzer (a new SentimentAnalyzer if not given),
+    since starting the pool and loading the lexicon in every worker would
+    cost more than it saves.
+    
+    With a sentiment_cache.SentimentCache, every worker opens its own cache
+    on the same SQLite file and their hit statistics are added to cache.stats.
+    model_path is a custom model file (see save_model) that every worker
+    loads; analyzer should have the same model loaded for small runs.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(posts) < min_parallel_posts:
+        analyzer = analyzer or SentimentAnalyzer()
+        if cache is not None:
+            analyzer.cache = cache
+        results = []
+        for i in range(0, len(posts), chunk_size):
+            results.extend(sentiment_fields(confidence)
+                           for confidence in analyzer.predict_sentiment_batch(posts[i:i + chunk_size]))
+        if analyzer.cache is not None:
+            analyzer.cache.flush()
+        return results
+    
+    posts = [{field: post.get(field) for field in SCORING_FIELDS} for post in posts]
+    chunks = [posts[i:i + chunk_size] for i in range(0, len(posts), chunk_size)]
+    
+    results = []
+    with scoring_pool(min(workers, len(chunks)), model_path, cache) as executor:
+        # map yields chunk results in submission order
+        for chunk_results, stats in executor.map(_score_chunk, chunks):
+            results.extend(chunk_results)
+            if cache is not None:
+                cache.merge_stats(stats)
+    return results
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Train the custom Naive Bayes sentiment model")
+    parser.add_argument('training_csv', nargs='+', help="Labelled posts (see save_training_data)")
+    parser.add_argument('--model', default=NB_MODEL_PATH, help="Model file to update")
+    parser.add_argument('--retrain', action='store_true',
+                        help="Start from an empty model instead of adding to the existing one")
+    args = parser.parse_args()
+    
+    analyzer = SentimentAnalyzer()
+    if os.path.exists(args.model) and not args.retrain:
+        analyzer.load_model(args.model)
+    for path in args.training_csv:
+        analyzer.load_training_data(path)
+    analyzer.save_model(args.model)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Columnar archive of analyzed posts, replacing the per-run CSV dumps.
+
+Each run is one Parquet file under a hive-style date partition:
+
+    output/archive/date=2025-06-15/run-20250615_093000.parquet
+
+Comments, comment IDs and times, per-comment scores, tickers and ticker
+attribution are stored as native list/map columns, so nothing is
+stringified on write or re-parsed on read. Readers pick the columns they need and filter on
+date without opening other partitions.
+
+    python archive.py import-csv output/these    # convert old CSV dumps
+    python archive.py rebuild --db reddit_sentiment_rebuilt.db [--search]
+"""
+
+import argparse
+import ast
+import json
+import os
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ARCHIVE_DIR = os.path.join('output', 'archive')
+
+# Columns of an analyzed post, as the batch and streaming pipelines produce them
+ARCHIVE_SCHEMA = pa.schema([
+    ('post_id', pa.string()),
+    ('subreddit', pa.string()),
+    ('post_title', pa.string()),
+    ('post_content', pa.string()),
+    ('post_author', pa.string()),
+    ('post_score', pa.float64()),
+    ('num_comments', pa.int64()),
+    ('created', pa.timestamp('us')),
+    ('comments', pa.list_(pa.string())),
+    ('comment_ids', pa.list_(pa.string())),
+    ('comment_times', pa.list_(pa.float64())),
+    ('url', pa.string()),
+    ('is_new_post', pa.bool_()),
+    ('last_comment_utc', pa.float64()),
+    ('reddit_num_comments', pa.int64()),
+    ('mentioned_tickers', pa.list_(pa.string())),
+    ('ticker_comments', pa.map_(pa.string(), pa.list_(pa.int32()))),
+    ('post_sentiment', pa.string()),
+    ('post_word_score', pa.float64()),
+    ('comment_sentiment', pa.string()),
+    ('comment_score', pa.float64()),
+    ('comment_word_scores', pa.list_(pa.float64())),
+    ('overall_sentiment', pa.string()),
+    ('overall_score', pa.float64()),
+    ('num_comments_analyzed', pa.int64()),
+])
+
+# The partition key, taken from the directory names
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+# Columns RedditDB.append_posts reads, so a rebuild skips the comment texts
+DATABASE_COLUMNS = [
+    'post_id', 'subreddit', 'post_title', 'post_content', 'post_author', 'post_score',
+    'num_comments', 'post_sentiment', 'post_word_score', 'comment_sentiment', 'comment_score',
+    'overall_sentiment', 'overall_score', 'num_comments_analyzed', 'url', 'is_new_post',
+    'comment_ids', 'comment_times', 'mentioned_tickers', 'ticker_comments', 'comment_word_scores',
+]
+
+class ArchiveWriter:
+    """
+    Appends batches of analyzed posts to one run's Parquet file, one row
+    group per batch. The file only appears under its final name on close(),
+    so readers never see a run that is still being written. kind names the
+    file: 'run' for pipeline runs, 'expired' for posts RedditDB.apply_retention
+    removed, which sort (and so replay) before the runs of their date.
+    """
+
+    def __init__(self, date=None, archive_dir=ARCHIVE_DIR, run_time=None, kind='run'):
+        date = date or datetime.now().strftime('%Y-%m-%d')
+        run_time = run_time or datetime.now()
+        partition_dir = os.path.join(archive_dir, f'date={date}')
+        os.makedirs(partition_dir, exist_ok=True)
+        self.path = os.path.join(partition_dir, f"{kind}-{run_time.strftime('%Y%m%d_%H%M%S')}.parquet")
+        # Dataset discovery skips names starting with '.'
+        self._temp_path = os.path.join(partition_dir, f".{os.path.basename(self.path)}.tmp")
+        self._writer = None
+        self.rows = 0
+
+    def write(self, df):
+        """Append a DataFrame of analyzed posts as one row group"""
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._temp_path, ARCHIVE_SCHEMA, compression='zstd')
+        self._writer.write_table(archive_table(df))
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._temp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_archive(df, date=None, archive_dir=ARCHIVE_DIR):
+    """Archive one run's DataFrame of analyzed posts; returns the file path"""
+    with ArchiveWriter(date, archive_dir) as writer:
+        writer.write(df)
+    return writer.path
+
+def archive_table(df):
+    """
+    A DataFrame of analyzed posts as an ARCHIVE_SCHEMA table. Missing
+    columns are null, and columns outside the schema are left out. List and
+    dict cells may also be JSON or Python-repr strings, as in CSV dumps.
+    """
+    columns = []
+    for field in ARCHIVE_SCHEMA:
+        if field.name not in df:
+            columns.append(pa.nulls(len(df), field.type))
+            continue
+        values = df[field.name].tolist()
+        if _is_nested(field.type):
+            values = [_parse_cell(value) if isinstance(value, str) else None if value is None or value != value
+                      else value for value in values]
+        columns.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(columns, schema=ARCHIVE_SCHEMA)
+
+def open_archive(archive_dir=ARCHIVE_DIR):
+    """The archive as a pyarrow dataset, with its date partition as a column"""
+    return ds.dataset(archive_dir, format='parquet', schema=ARCHIVE_SCHEMA.append(pa.field('date', pa.string())),
+                      partitioning=PARTITIONING)
+
+def _date_filter(start=None, end=None):
+    """Dataset filter on the date partition; partitions outside it are never opened"""
+    expression = None
+    if start is not None:
+        expression = ds.field('date') >= start
+    if end is not None:
+        expression = ds.field('date') <= end if expression is None else expression & (ds.field('date') <= end)
+    return expression
+
+def read_archive(archive_dir=ARCHIVE_DIR, start=None, end=None, columns=None):
+    """
+    Archived posts from dates start through end (both optional) as a
+    DataFrame, with only the given columns (plus date) read from disk
+    """
+    if columns is not None:
+        columns = list(columns) + ['date']
+    table = open_archive(archive_dir).to_table(columns=columns, filter=_date_filter(start, end))
+    return to_frame(table)
+
+def iter_archive_runs(archive_dir=ARCHIVE_DIR, start=None, end=None, columns=None):
+    """Yield (date, DataFrame) for each archived run from start through end, oldest first"""
+    for date, table in _iter_run_tables(archive_dir, start, end, columns):
+        yield date, to_frame(table)
+
+def iter_archive_columns(archive_dir=ARCHIVE_DIR, start=None, end=None, columns=None):
+    """
+    Yield (date, {column: list of cells}) for each archived run from start
+    through end, oldest first. RedditDB.append_posts takes these as they
+    are, which skips building a DataFrame of Python lists per run.
+    """
+    for date, table in _iter_run_tables(archive_dir, start, end, columns):
+        yield date, to_columns(table)
+
+def _iter_run_tables(archive_dir, start, end, columns):
+    dataset = open_archive(archive_dir)
+    fragments = sorted(dataset.get_fragments(filter=_date_filter(start, end)), key=lambda fragment: fragment.path)
+    for fragment in fragments:
+        date = ds.get_partition_keys(fragment.partition_expression)['date']
+        yield date, fragment.to_table(columns=columns, schema=dataset.schema)
+
+def iter_archive_records(path, batch_size=1000):
+    """Stream the post records of an archive directory or run file one at a time"""
+    dataset = ds.dataset(path, format='parquet', schema=ARCHIVE_SCHEMA, partitioning=PARTITIONING)
+    for batch in dataset.to_batches(batch_size=batch_size):
+        yield from batch.to_pylist(maps_as_pydicts='strict')
+
+def to_frame(table):
+    """
+    A table as a DataFrame with list and map cells as Python lists and
+    dicts (pandas would otherwise give numpy arrays and pair lists)
+    """
+    import pandas as pd
+
+    columns = {}
+    for field in table.schema:
+        column = table.column(field.name).combine_chunks()
+        columns[field.name] = _python_cells(column) if _is_nested(field.type) else column.to_numpy(zero_copy_only=False)
+    return pd.DataFrame(columns)
+
+def to_columns(table):
+    """A table's columns as lists of Python values, list and map cells as lists and dicts"""
+    return {field.name: _python_values(table.column(field.name).combine_chunks()) for field in table.schema}
+
+def _is_nested(arrow_type):
+    return pa.types.is_list(arrow_type) or pa.types.is_map(arrow_type)
+
+def _python_cells(array):
+    """
+    The cells of a list or map array as Python lists and dicts. Slicing one
+    flat list of the values is several times faster than Array.to_pylist(),
+    which builds an Arrow scalar per value.
+    """
+    bounds = array.offsets.to_numpy().tolist()
+    if pa.types.is_map(array.type):
+        keys = _python_values(array.keys)
+        items = _python_values(array.items)
+        cells = [dict(zip(keys[start:end], items[start:end])) for start, end in zip(bounds, bounds[1:])]
+    else:
+        values = _python_values(array.values)
+        cells = [values[start:end] for start, end in zip(bounds, bounds[1:])]
+    if array.null_count:
+        cells = [cell if valid else None for cell, valid in zip(cells, array.is_valid().to_pylist())]
+    return cells
+
+def _python_values(array):
+    if _is_nested(array.type):
+        return _python_cells(array)
+    return array.to_numpy(zero_copy_only=False).tolist()
+
+def _parse_cell(value):
+    """A list/dict cell of a CSV dump, stored as JSON or as a Python repr"""
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
+
+def import_csv_dumps(csv_dir, archive_dir=ARCHIVE_DIR):
+    """Convert the reddit_analysis_complete_*.csv dumps in csv_dir into archive runs"""
+    import pandas as pd
+
+    converted = 0
+    for file_name in sorted(os.listdir(csv_dir)):
+        if not (file_name.startswith('reddit_analysis_complete_') and file_name.endswith('.csv')):
+            continue
+        try:
+            run_time = datetime.strptime('_'.join(file_name[:-4].split('_')[3:5]), '%Y%m%d_%H%M')
+        except ValueError:
+            print(f"Could not parse date from filename: {file_name}. Skipping.")
+            continue
+
+        df = pd.read_csv(os.path.join(csv_dir, file_name))
+        if 'created' in df:
+            df['created'] = pd.to_datetime(df['created'])
+        with ArchiveWriter(run_time.strftime('%Y-%m-%d'), archive_dir, run_time) as writer:
+            writer.write(df)
+        print(f"  {file_name} -> {writer.path} ({len(df)} posts)")
+        converted += 1
+    return converted
+
+def rebuild_database_from_archive(archive_dir=ARCHIVE_DIR, new_db_path='reddit_sentiment_rebuilt.db',
+                                  start=None, end=None, search=False):
+    """
+    Rebuild the SQLite database from the archived runs, with a full-text
+    index of posts and comments if search is True, then re-export the web data
+    """
+    from database import RedditDB
+
+    if os.path.exists(new_db_path):
+        os.remove(new_db_path)
+        print(f"Removed existing database: {new_db_path}")
+    db = RedditDB(db_path=new_db_path, search=search)
+
+    # Runs are replayed in order, as later runs update posts stored by earlier ones
+    columns = DATABASE_COLUMNS + ['comments'] if search else DATABASE_COLUMNS
+    dates = []
+    with db.bulk_search_load():
+        for date, columns in iter_archive_columns(archive_dir, start, end, columns=columns):
+            db.append_posts(columns, date=date)
+            dates.append(date)
+    if not dates:
+        print(f"No archived runs found in '{archive_dir}'.")
+        db.close()
+        return
+
+    db.refresh_daily_summary(min(dates), max(dates))
+    print(f"Rebuilt {new_db_path} from {len(dates)} archived runs ({min(dates)} to {max(dates)})")
+    db.export_for_web()
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar archive of analyzed posts")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_csv = subparsers.add_parser('import-csv', help=import_csv_dumps.__doc__)
+    import_csv.add_argument('csv_dir')
+    rebuild = subparsers.add_parser('rebuild', help=rebuild_database_from_archive.__doc__)
+    rebuild.add_argument('--db', default='reddit_sentiment_rebuilt.db')
+    rebuild.add_argument('--start', default=None, help="First date to replay (YYYY-MM-DD)")
+    rebuild.add_argument('--end', default=None, help="Last date to replay (YYYY-MM-DD)")
+    rebuild.add_argument('--search', action='store_true', help="Build the full-text index of posts and comments")
+    args = parser.parse_args()
+
+    if args.command == 'import-csv':
+        print(f"Converted {import_csv_dumps(args.csv_dir, args.archive_dir)} CSV dumps")
+    else:
+        rebuild_database_from_archive(args.archive_dir, args.db, args.start, args.end, args.search)
@@ -0,0 +1,1295 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the hot paths of the pipeline.
+
+Each subcommand times an optimized path against the code it replaces on
+synthetic data from the offline FakeReddit client and checks that both
+produce the same results:
+
+    python benchmarks.py word-score
+    python benchmarks.py score --workers 4
+    python benchmarks.py cache
+    python benchmarks.py nb
+    python benchmarks.py nb-load
+    python benchmarks.py startup
+    python benchmarks.py analyze-stream
+    python benchmarks.py db-write
+    python benchmarks.py db-query
+    python benchmarks.py db-summary
+    python benchmarks.py web-export
+    python benchmarks.py archive
+    python benchmarks.py comments
+    python benchmarks.py search
+    python benchmarks.py retention
+    python benchmarks.py rolling
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import subprocess
+import sys
+import time
+
+# Startup budgets in seconds, measured in a fresh interpreter (after the
+# interpreter itself has started). Cron runs pay them once per run and
+# scoring pool workers once per worker.
+STARTUP_BUDGETS = {
+    'import main': ('import main', 0.05),
+    'import reddit_scrape, database': ('import reddit_scrape, database', 0.1),
+    'scoring worker': ('import NB_classifier; NB_classifier.SentimentAnalyzer()', 0.3),
+}
+
+def _fake_texts(n_posts=200, comments_per_post=50, seed=7):
+    """Post and comment texts from the offline FakeReddit client, plus some noisy ones"""
+    from fake_reddit import FakeReddit
+    from reddit_scrape import get_posts_with_comments
+
+    client = FakeReddit(posts_per_subreddit=n_posts // 5, comments_per_post=comments_per_post,
+                        latency=0, seed=seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        posts = get_posts_with_comments(client=client, post_limit=n_posts // 5)
+
+    texts = []
+    for post in posts:
+        texts.append(f"{post['post_title']} {post['post_content']}")
+        texts.extend(post['comments'])
+
+    # Punctuation, unicode, empty and non-string inputs
+    rng = random.Random(seed)
+    noise = ['', '   ', None, 'BUY!!! $TSLA to the moon 🚀🚀', "don't sell... it's under-valued",
+             'Ünïcödé gains — très bullish', 'snake_case_words and 100% growth', 'crash,crash;CRASH']
+    texts.extend(rng.choice(noise) for _ in range(len(texts) // 20))
+    return texts
+
+def _timed(fn, repeat=3):
+    """Best wall time of fn over repeat runs, and its result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_word_score(args):
+    """SentimentAnalyzer._calculate_word_score loop vs the word_scores_batch kernel"""
+    from NB_classifier import SentimentAnalyzer
+
+    analyzer = SentimentAnalyzer()
+    texts = _fake_texts(args.posts, args.comments)
+    print(f"Scoring {len(texts)} texts...")
+
+    loop_time, expected = _timed(lambda: [analyzer._calculate_word_score(text) for text in texts])
+    batch_time, actual = _timed(lambda: analyzer.word_scores_batch(texts))
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"  per-text loop: {loop_time * 1000:8.1f} ms")
+    print(f"  batch kernel:  {batch_time * 1000:8.1f} ms  ({loop_time / batch_time:.1f}x)")
+    print(f"  identical scores: {mismatches == 0} ({mismatches} mismatches)")
+    return mismatches == 0
+
+def _fake_posts(n_posts, comments_per_post, seed=7):
+    """Post records from the offline FakeReddit client, repeated up to n_posts"""
+    from fake_reddit import FakeReddit
+    from reddit_scrape import get_posts_with_comments
+
+    client = FakeReddit(posts_per_subreddit=min(n_posts, 1000) // 5, comments_per_post=comments_per_post,
+                        latency=0, seed=seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        posts = get_posts_with_comments(client=client, post_limit=min(n_posts, 1000) // 5)
+    return [posts[i % len(posts)] for i in range(n_posts)]
+
+def bench_score(args):
+    """In-process predict_sentiment loop vs score_posts_parallel on a process pool"""
+    import os
+    from NB_classifier import SentimentAnalyzer, score_posts_parallel
+
+    posts = _fake_posts(args.posts, args.comments)
+    workers = args.workers or os.cpu_count()
+    print(f"Scoring {len(posts)} posts ({sum(len(p['comments']) for p in posts)} comments), "
+          f"{workers} workers on {os.cpu_count()} CPUs...")
+
+    analyzer = SentimentAnalyzer()
+    serial_time, expected = _timed(lambda: score_posts_parallel(posts, workers=1, analyzer=analyzer), repeat=1)
+    pool_time, actual = _timed(lambda: score_posts_parallel(posts, workers=workers, chunk_size=args.chunk_size,
+                                                            min_parallel_posts=0), repeat=1)
+
+    print(f"  in-process:   {serial_time:8.2f} s")
+    print(f"  process pool: {pool_time:8.2f} s  ({serial_time / pool_time:.1f}x)")
+    print(f"  identical results: {expected == actual}")
+    return expected == actual
+
+def bench_cache(args):
+    """Uncached scoring vs a cold and a warm (on-disk) SentimentCache"""
+    import os
+    import tempfile
+    from NB_classifier import score_posts_parallel
+    from sentiment_cache import SentimentCache
+
+    posts = _fake_posts(args.posts, args.comments)
+    print(f"Scoring {len(posts)} posts ({sum(len(p['comments']) for p in posts)} comments)...")
+
+    uncached_time, expected = _timed(lambda: score_posts_parallel(posts, workers=1), repeat=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'sentiment_cache.db')
+        results = []
+        for run in ('cold', 'warm'):
+            # A fresh cache object each run, so the warm run reads from disk
+            cache = SentimentCache(db_path)
+            elapsed, result = _timed(lambda: score_posts_parallel(posts, workers=1, cache=cache), repeat=1)
+            print(f"  {run} cache:   {elapsed:8.2f} s  ({uncached_time / elapsed:.1f}x)  {cache.report()}")
+            cache.close()
+            results.append(result)
+
+    print(f"  uncached:     {uncached_time:8.2f} s")
+    identical = all(result == expected for result in results)
+    print(f"  identical results: {identical}")
+    return identical
+
+def _reference_nb_proba(analyzer, text):
+    """Naive Bayes posterior of one text, straight from the training counts"""
+    import math
+
+    words = [word for word in analyzer.clean_and_tokenize(text) if word in analyzer.vocabulary]
+    total_docs = sum(analyzer.sentiment_counts.values())
+    vocab_size = len(analyzer.vocabulary)
+    log_posteriors = []
+    for sentiment in analyzer.nb_classes:
+        counts = analyzer.word_counts[sentiment]
+        total_words = sum(counts.values())
+        log_p = math.log(analyzer.sentiment_counts[sentiment] / total_docs)
+        for word in words:
+            log_p += math.log((counts.get(word, 0) + analyzer.nb_alpha) /
+                              (total_words + analyzer.nb_alpha * vocab_size))
+        log_posteriors.append(log_p)
+    top = max(log_posteriors)
+    exps = [math.exp(log_p - top) for log_p in log_posteriors]
+    return [e / sum(exps) for e in exps]
+
+def bench_nb(args):
+    """Per-text Naive Bayes from the training counts vs the compiled batch model"""
+    import numpy as np
+    from NB_classifier import SentimentAnalyzer
+
+    # Train on synthetic posts labelled with VADER's sentiment of the title
+    analyzer = SentimentAnalyzer()
+    for post in _fake_posts(args.train_posts, 10):
+        compound = analyzer.vader.polarity_scores(post['post_title'])['compound']
+        label = 'positive' if compound >= 0.05 else 'negative' if compound <= -0.05 else 'neutral'
+        analyzer.add_training_example(post, label)
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.train_custom_model()
+
+    texts = _fake_texts(args.posts, args.comments)
+    print(f"Predicting {len(texts)} texts ({len(analyzer.vocabulary)} word vocabulary)...")
+
+    sample = texts[:args.check]
+    loop_time, expected = _timed(lambda: np.array([_reference_nb_proba(analyzer, text) for text in sample]), repeat=1)
+    batch_time, actual = _timed(lambda: analyzer.nb_predict_proba(texts))
+    loop_time *= len(texts) / len(sample)
+
+    max_diff = float(np.abs(actual[:len(sample)] - expected).max())
+    print(f"  per-text loop: {loop_time:8.2f} s  (extrapolated from {len(sample)} texts)")
+    print(f"  batch model:   {batch_time:8.2f} s  ({loop_time / batch_time:.1f}x)")
+    print(f"  max probability difference: {max_diff:.2e}")
+    return max_diff < 1e-9
+
+def bench_nb_load(args):
+    """Cold start: retraining from the labelled CSV vs memory-mapping the saved model"""
+    import os
+    import string
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from NB_classifier import SentimentAnalyzer
+
+    # Labelled posts over a large random vocabulary
+    rng = random.Random(11)
+    words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+             for _ in range(args.vocab)]
+    rows = [{'post_title': ' '.join(rng.choices(words, k=12)),
+             'post_content': ' '.join(rng.choices(words, k=60)),
+             'comments': '[]',
+             'sentiment_label': rng.choice(['positive', 'negative', 'neutral'])}
+            for _ in range(args.examples)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'training.csv')
+        model_path = os.path.join(tmp, 'nb_model.bin')
+        pd.DataFrame(rows).to_csv(csv_path, index=False)
+
+        def retrain():
+            analyzer = SentimentAnalyzer()
+            analyzer.load_training_data(csv_path)
+            return analyzer
+
+        def load():
+            analyzer = SentimentAnalyzer()
+            analyzer.load_model(model_path)
+            return analyzer
+
+        # Both include building the VADER analyzer, which load_model can't avoid
+        with contextlib.redirect_stdout(io.StringIO()):
+            base_time, _ = _timed(SentimentAnalyzer)
+            retrain_time, trained = _timed(retrain, repeat=1)
+            trained.save_model(model_path)
+            load_time, loaded = _timed(load)
+
+        texts = [row['post_title'] for row in rows[:2000]]
+        identical = np.array_equal(trained.nb_predict_proba(texts), loaded.nb_predict_proba(texts))
+        print(f"{args.examples} examples, {len(trained.nb_vocab)} word vocabulary, "
+              f"{os.path.getsize(model_path) / 1e6:.1f} MB model file")
+        print(f"  SentimentAnalyzer() alone: {base_time:8.2f} s")
+        print(f"  retrain from CSV:          {retrain_time:8.2f} s")
+        print(f"  load_model (mmap):         {load_time:8.2f} s  ({retrain_time / load_time:.0f}x)")
+        print(f"  identical predictions: {identical}")
+    return identical
+
+def _startup_time(statement):
+    """Seconds statement takes in a fresh interpreter started in this directory"""
+    script = ("import time; start = time.perf_counter()\n"
+              f"{statement}\n"
+              "print(time.perf_counter() - start)")
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return float(result.stdout.strip().splitlines()[-1])
+
+def bench_startup(args):
+    """Import and construction time of the pipeline entry points against STARTUP_BUDGETS"""
+    # Build the lexicon cache first, as any earlier run will have
+    _startup_time('import NB_classifier; NB_classifier.load_lexicons()')
+
+    ok = True
+    for name, (statement, budget) in STARTUP_BUDGETS.items():
+        # Best of several runs, since noise such as a slow disk read only ever adds time
+        best = min(_startup_time(statement) for _ in range(args.runs))
+        within = best <= budget
+        ok = ok and within
+        print(f"  {name:32s} {best * 1000:7.1f} ms  (budget {budget * 1000:.0f} ms)  "
+              f"{'ok' if within else 'OVER BUDGET'}")
+    return ok
+
+def bench_analyze_stream(args):
+    """Peak memory and throughput of iter_analyze over a CSV dump vs loading it whole"""
+    import json
+    import tempfile
+    import tracemalloc
+    import pandas as pd
+    from extract_company import csv_frame
+    from NB_classifier import SentimentAnalyzer, iter_post_records
+
+    analyzer = SentimentAnalyzer()
+
+    def peak_memory(fn):
+        tracemalloc.start()
+        try:
+            fn()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dump_path = os.path.join(tmp, 'dump.csv')
+        csv_frame(pd.DataFrame(_fake_posts(args.posts, args.comments))).to_csv(dump_path, index=False)
+        print(f"{args.posts} posts, {os.path.getsize(dump_path) / 1e6:.1f} MB CSV dump")
+
+        def load_all():
+            records = pd.read_csv(dump_path).to_dict('records')
+            return [record['sentiment_confidence'] for record in analyzer.analyze_reddit_data(records)]
+
+        def stream(chunk_size):
+            # Write results out as they arrive, like a real backfill
+            out_path = os.path.join(tmp, 'scored.jsonl')
+            with open(out_path, 'w', encoding='utf-8') as out:
+                for result in analyzer.iter_analyze(iter_post_records(dump_path), chunk_size=chunk_size):
+                    out.write(json.dumps(result['sentiment_confidence']) + '\n')
+            return out_path
+
+        runs = [('load whole dump', load_all)]
+        for chunk_size in (1, args.chunk_size):
+            runs.append((f'iter_analyze, chunk {chunk_size}', lambda chunk_size=chunk_size: stream(chunk_size)))
+
+        results = []
+        for name, fn in runs:
+            elapsed, result = _timed(fn, repeat=1)
+            if isinstance(result, str):
+                with open(result, encoding='utf-8') as f:
+                    result = [json.loads(line) for line in f]
+            results.append(json.loads(json.dumps(result)))
+            print(f"  {name:28s} {elapsed:7.2f} s   peak {peak_memory(fn) / 1e6:7.1f} MB")
+
+    identical = all(result == results[0] for result in results)
+    print(f"  identical results: {identical}")
+    return identical
+
+def _fake_analysis_frame(n_posts, rng):
+    """A day of analysis CSV rows (as main.py writes them) with random scores and tickers"""
+    import json
+    import pandas as pd
+
+    tickers = ['AAPL', 'TSLA', 'NVDA', 'AMD', 'GME', 'AMC', 'MSFT', 'PLTR', 'SPY', 'META']
+    sentiments = ['positive', 'negative', 'neutral']
+    rows = []
+    for i in range(n_posts):
+        n_comments = rng.randint(0, 30)
+        comment_scores = [round(rng.uniform(-1, 1), 4) for _ in range(n_comments)]
+        ticker_comments = {ticker: sorted(rng.sample(range(-1, n_comments), min(n_comments + 1, rng.randint(1, 4))))
+                           for ticker in rng.sample(tickers, rng.randint(0, 3))}
+        rows.append({
+            'subreddit': rng.choice(['wallstreetbets', 'stocks', 'investing', 'options']),
+            'post_title': f"Post {i} about {' '.join(ticker_comments) or 'the market'}",
+            'post_content': ' '.join(rng.choice(['calls', 'puts', 'moon', 'dip', 'hold']) for _ in range(40)),
+            'post_author': f"user{rng.randint(1, 5000)}",
+            'post_score': round(rng.uniform(-1, 1), 4),
+            'num_comments': rng.randint(n_comments, 500),
+            'post_sentiment': rng.choice(sentiments),
+            'post_word_score': round(rng.uniform(-1, 1), 4),
+            'comment_sentiment': rng.choice(sentiments),
+            'comment_score': round(rng.uniform(-1, 1), 4),
+            'overall_sentiment': rng.choice(sentiments),
+            'overall_score': round(rng.uniform(-1, 1), 4),
+            'num_comments_analyzed': n_comments,
+            'url': f"https://reddit.com/r/stocks/comments/{rng.getrandbits(40):x}/post_{i}/",
+            'mentioned_tickers': str(list(ticker_comments)),
+            'ticker_comments': json.dumps(ticker_comments),
+            'comment_word_scores': str(comment_scores),
+        })
+    return pd.DataFrame(rows)
+
+def bench_db_write(args):
+    """Rebuilding the database from daily CSVs: per-row inserts vs bulk writes on one connection"""
+    import sqlite3
+    import tempfile
+    from datetime import date as Date, timedelta
+    import pandas as pd
+    from database import RedditDB, _attribution, _parse_literal, _parse_tickers
+
+    class PerRowRedditDB(RedditDB):
+        """The previous write path: a fresh connection per call, one INSERT per post, ticker and comment"""
+        PRAGMAS = []
+
+        @contextlib.contextmanager
+        def _write_transaction(self):
+            conn = sqlite3.connect(self.db_path)
+            yield conn
+            conn.commit()
+            conn.close()
+
+        def _save_posts_raw(self, df, conn, date):
+            for _, row in df.iterrows():
+                cursor = conn.execute('''
+                    INSERT INTO posts_raw
+                    (date, subreddit, post_title, post_content, post_author, post_score,
+                     num_comments, post_sentiment, post_word_score, comment_sentiment,
+                     comment_score, overall_sentiment, overall_score, num_comments_analyzed, url)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (date,) + tuple(row[column] for column in self.POST_COLUMNS))
+                ticker_comments = _parse_literal(row.get('ticker_comments'), dict) or {}
+                comment_scores = _parse_literal(row.get('comment_word_scores'), list) or []
+                for ticker in _parse_tickers(row['mentioned_tickers']):
+                    conn.execute('''
+                        INSERT INTO stock_mentions
+                        (post_id, ticker, date, mentioned_in_post, attributed_comments,
+                         attributed_score, comment_indices)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (cursor.lastrowid, ticker, date) + _attribution(
+                        ticker_comments.get(ticker), row['post_score'], comment_scores
+                    ))
+                for position, score in enumerate(comment_scores):
+                    conn.execute('INSERT INTO comments (date, post_id, position, score) VALUES (?, ?, ?, ?)',
+                                 (date, cursor.lastrowid, position, score))
+
+    def contents(db_path):
+        # The columns the previous path wrote; created_at is the insert time
+        conn = sqlite3.connect(db_path)
+        tables = {
+            'posts_raw': f"SELECT id, date, {', '.join(RedditDB.POST_COLUMNS)} FROM posts_raw ORDER BY id",
+            'stock_mentions': 'SELECT * FROM stock_mentions ORDER BY id',
+            'comments': 'SELECT date, post_id, position, score FROM comments ORDER BY date, post_id, position',
+            'daily_ticker_summary': '''
+                SELECT date, ticker, mention_count, total_posts, total_comments, avg_post_score,
+                       avg_comment_score, avg_overall_score, sentiment_positive, sentiment_negative,
+                       sentiment_neutral, subreddit_breakdown, attributed_comments, avg_attributed_score
+                FROM daily_ticker_summary ORDER BY date, ticker
+            ''',
+        }
+        result = {name: conn.execute(query).fetchall() for name, query in tables.items()}
+        conn.close()
+        return result
+
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Read back from CSV, so cells are strings as in rebuild_db_from_csv.py
+        days = []
+        for day in range(args.days):
+            csv_path = os.path.join(tmp, f'day{day}.csv')
+            _fake_analysis_frame(args.posts, rng).to_csv(csv_path, index=False)
+            days.append(((Date(2025, 1, 1) + timedelta(days=day)).isoformat(), pd.read_csv(csv_path)))
+        n_mentions = sum(len(_parse_tickers(cell)) for _, df in days for cell in df['mentioned_tickers'])
+        print(f"{args.days} daily CSVs x {args.posts} posts, {n_mentions} stock mentions")
+
+        # save_daily_data is append_posts plus refresh_daily_summary in one
+        # transaction; they are timed apart as the summary code is shared
+        results = []
+        times = []
+        for name, db_class in [('per-row inserts', PerRowRedditDB), ('bulk, one connection', RedditDB)]:
+            db_path = os.path.join(tmp, f'{db_class.__name__}.db')
+            with contextlib.redirect_stdout(io.StringIO()):
+                db = db_class(db_path)
+            write_time, _ = _timed(lambda: [db.append_posts(df, date) for date, df in days], repeat=1)
+            summary_time, _ = _timed(lambda: [db.refresh_daily_summary(date) for date, _ in days], repeat=1)
+            db.close()
+            times.append(write_time)
+            results.append(contents(db_path))
+            print(f"  {name:22s} posts, mentions, comments {write_time:6.2f} s ({args.days * args.posts / write_time:7.0f} posts/s,"
+                  f" {times[0] / write_time:4.1f}x)   daily summaries {summary_time:6.2f} s")
+
+    identical = results[0] == results[1]
+    print(f"  identical tables: {identical}")
+    return identical
+
+def bench_db_query(args):
+    """Hot RedditDB query latency as history grows, with and without the schema indexes"""
+    import shutil
+    import sqlite3
+    import tempfile
+    from datetime import date, timedelta
+    from database import RedditDB
+
+    def latency(db_path, query, params):
+        conn = sqlite3.connect(db_path)
+
+        def run():
+            # The summary query rewrites its dates, so it runs as a refresh and is rolled back
+            if query.lstrip().startswith('INSERT'):
+                conn.execute('DELETE FROM daily_ticker_summary WHERE date BETWEEN ? AND ?', params)
+            rows = conn.execute(query, params).fetchall()
+            conn.rollback()
+            return rows
+
+        best, _ = _timed(run, repeat=args.repeat)
+        conn.close()
+        return best
+
+    rng = random.Random(3)
+    checkpoints = sorted(args.days)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'history.db')
+        bare_path = os.path.join(tmp, 'no_indexes.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = RedditDB(db_path)
+
+        queries = {
+            'daily summary': RedditDB.DAILY_SUMMARY_QUERY,
+            'ticker history': RedditDB.TICKER_HISTORY_QUERY,
+            'latest engagement': RedditDB.LATEST_ENGAGEMENT_QUERY,
+            'rolling stats': RedditDB.ROLLING_STATS_QUERY,
+            'web shard': RedditDB.WEB_SHARD_QUERY,
+            'weekly web shard': RedditDB.WEB_SHARD_QUERIES['weekly'],
+            'monthly web shard': RedditDB.WEB_SHARD_QUERIES['monthly'],
+            'comments': RedditDB.COMMENTS_QUERY,
+            'comment stats': RedditDB.COMMENT_STATS_QUERY,
+        }
+        names = list(queries)
+        print(f"{args.posts} posts per day; best of {args.repeat} in ms, indexed / without indexes")
+        print(f"  {'days':>5s}  {'posts':>7s}  " + '  '.join(f"{name:>22s}" for name in names))
+        day = date(2023, 1, 1)
+        for n_days in range(1, checkpoints[-1] + 1):
+            day_str = day.isoformat()
+            db.append_posts(_fake_analysis_frame(args.posts, rng), day_str)
+            db.refresh_daily_summary(day_str)
+            day += timedelta(days=1)
+            if n_days not in checkpoints:
+                continue
+
+            # The same data without the secondary indexes
+            db.close()
+            shutil.copy(db_path, bare_path)
+            bare = sqlite3.connect(bare_path)
+            for name, _, _ in RedditDB.INDEXES:
+                bare.execute(f'DROP INDEX {name}')
+            bare.commit()
+            bare.close()
+
+            cells = []
+            for name in names:
+                query = queries[name]
+                week = (day - timedelta(days=7)).isoformat()
+                params = {'daily summary': (day_str, day_str), 'ticker history': ('TSLA', 30),
+                          'web shard': (day_str[:8] + '01', day_str[:8] + '31'),
+                          'weekly web shard': (day_str[:8] + '01', day_str[:8] + '31'),
+                          'monthly web shard': (day_str[:8] + '01', day_str[:8] + '31'),
+                          'comments': (week, day_str, 'TSLA'), 'comment stats': (52.5, 47.5, week, day_str),
+                          'rolling stats': (None,)}.get(name, ())
+                indexed = latency(db_path, query, params) * 1000
+                bare_time = latency(bare_path, query, params) * 1000
+                cells.append(f"{indexed:9.2f} / {bare_time:9.2f}")
+            print(f"  {n_days:5d}  {n_days * args.posts:7d}  " + '  '.join(f"{cell:>22s}" for cell in cells))
+    return True
+
+def _pandas_daily_summary(conn, date):
+    """The previous daily summary: one pandas filter and INSERT per ticker (counts cast to int)"""
+    import json
+    import pandas as pd
+
+    conn.execute('DELETE FROM daily_ticker_summary WHERE date = ?', (date,))
+    mentions_df = pd.read_sql_query('''
+        SELECT sm.ticker, pr.subreddit, pr.post_sentiment, pr.comment_sentiment,
+               pr.overall_sentiment, pr.post_score, pr.comment_score, pr.overall_score,
+               pr.num_comments_analyzed, sm.attributed_comments, sm.attributed_score
+        FROM stock_mentions sm
+        JOIN posts_raw pr ON sm.post_id = pr.id
+        WHERE sm.date = ?
+    ''', conn, params=(date,))
+    for ticker in mentions_df['ticker'].unique():
+        ticker_data = mentions_df[mentions_df['ticker'] == ticker]
+        sentiment_counts = ticker_data['overall_sentiment'].value_counts()
+        avg_attributed_score = ticker_data['attributed_score'].mean()
+        conn.execute('''
+            INSERT INTO daily_ticker_summary
+            (date, ticker, mention_count, total_posts, total_comments,
+             avg_post_score, avg_comment_score, avg_overall_score,
+             sentiment_positive, sentiment_negative, sentiment_neutral,
+             subreddit_breakdown, attributed_comments, avg_attributed_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            date, ticker, len(ticker_data), len(ticker_data), int(ticker_data['num_comments_analyzed'].sum()),
+            round(ticker_data['post_score'].mean(), 2), round(ticker_data['comment_score'].mean(), 2),
+            round(ticker_data['overall_score'].mean(), 2),
+            int(sentiment_counts.get('positive', 0)), int(sentiment_counts.get('negative', 0)),
+            int(sentiment_counts.get('neutral', 0)),
+            json.dumps(ticker_data['subreddit'].value_counts().to_dict()), int(ticker_data['attributed_comments'].sum()),
+            None if pd.isna(avg_attributed_score) else round(avg_attributed_score, 2)
+        ))
+
+def bench_db_summary(args):
+    """Daily ticker summaries: pandas per-ticker filtering vs one SQL GROUP BY, per date and for a range"""
+    import json
+    import math
+    import shutil
+    import sqlite3
+    import tempfile
+    from datetime import date, timedelta
+    from database import RedditDB
+
+    def summaries(db_path):
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('''
+            SELECT date, ticker, mention_count, total_posts, total_comments, avg_post_score,
+                   avg_comment_score, avg_overall_score, sentiment_positive, sentiment_negative,
+                   sentiment_neutral, subreddit_breakdown, attributed_comments, avg_attributed_score
+            FROM daily_ticker_summary ORDER BY date, ticker
+        ''').fetchall()
+        conn.close()
+        # Key order of the breakdown is not meaningful
+        return [row[:11] + (json.loads(row[11]),) + row[12:] for row in rows]
+
+    def same(a, b):
+        # Averages may differ by one unit in the last rounded digit, as SQLite
+        # and pandas sum in a different order and round halves differently
+        if isinstance(a, float) and isinstance(b, float):
+            return math.isclose(a, b, abs_tol=0.0100001)
+        return a == b
+
+    rng = random.Random(9)
+    dates = [(date(2024, 1, 1) + timedelta(days=i)).isoformat() for i in range(args.days)]
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path = os.path.join(tmp, 'base.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = RedditDB(base_path)
+        for day in dates:
+            db.append_posts(_fake_analysis_frame(args.posts, rng), day)
+        n_mentions = db.conn.execute('SELECT COUNT(*) FROM stock_mentions').fetchone()[0]
+        db.close()
+        print(f"{args.days} days x {args.posts} posts, {n_mentions} stock mentions")
+
+        def run(name, fn):
+            path = os.path.join(tmp, f'{name}.db')
+            shutil.copy(base_path, path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                target = RedditDB(path)
+            elapsed, _ = _timed(lambda: fn(target), repeat=1)
+            target.close()
+            return elapsed, summaries(path)
+
+        def pandas_per_date(target):
+            for day in dates:
+                with target._write_transaction() as conn:
+                    _pandas_daily_summary(conn, day)
+
+        runs = [
+            ('pandas, per date', pandas_per_date),
+            ('SQL, per date', lambda target: [target.refresh_daily_summary(day) for day in dates]),
+            ('SQL, whole range', lambda target: target.refresh_daily_summary(dates[0], dates[-1])),
+        ]
+        results = []
+        times = []
+        for name, fn in runs:
+            elapsed, result = run(name.replace(', ', '_').replace(' ', '_'), fn)
+            times.append(elapsed)
+            results.append(result)
+            print(f"  {name:18s} {elapsed:7.3f} s   ({times[0] / elapsed:5.1f}x)")
+
+    identical = results[1] == results[2]
+    matches = len(results[0]) == len(results[1]) and all(
+        all(same(a, b) for a, b in zip(old, new)) for old, new in zip(results[0], results[1])
+    )
+    print(f"  {len(results[1])} summary rows; per-date and range identical: {identical}; "
+          f"match pandas (to 0.01): {matches}")
+    return identical and matches
+
+def _full_web_export(conn, output_dir):
+    """The previous web export: every file re-queried and rewritten with the full history"""
+    import pandas as pd
+    from database import RedditDB
+
+    pd.read_sql_query('''
+        SELECT DATE(date) as date, ticker, AVG(avg_overall_score) as avg_overall_score
+        FROM daily_ticker_summary GROUP BY DATE(date), ticker ORDER BY date, ticker
+    ''', conn).to_json(f'{output_dir}/sentiment_over_time.json', orient='records')
+    pd.read_sql_query('''
+        SELECT DATE(date) as date, ticker, SUM(mention_count) as mention_count
+        FROM daily_ticker_summary GROUP BY DATE(date), ticker ORDER BY date, ticker
+    ''', conn).to_json(f'{output_dir}/mentions_over_time.json', orient='records')
+    pd.read_sql_query(RedditDB.LATEST_ENGAGEMENT_QUERY, conn).to_json(
+        f'{output_dir}/engagement_by_ticker.json', orient='records')
+
+def bench_web_export(args):
+    """Dashboard export: full-history files vs monthly shards, as records and columnar"""
+    import json
+    import tempfile
+    from datetime import date, timedelta
+    from database import RedditDB, load_web_export
+
+    def sizes(directory, files):
+        # Plain and precompressed bytes of the given files
+        return [sum(os.path.getsize(os.path.join(directory, name + suffix))
+                    for name in files if os.path.exists(os.path.join(directory, name + suffix)))
+                for suffix in ('', '.gz', '.br')]
+
+    def all_files(directory):
+        return [os.path.relpath(os.path.join(root, name), directory)
+                for root, _, names in os.walk(directory) for name in names if name.endswith('.json')]
+
+    def kib(n):
+        return f"{n / 1024:7.0f}" if n else f"{'-':>7s}"
+
+    rng = random.Random(5)
+    dates = [(date(2024, 1, 1) + timedelta(days=i)).isoformat() for i in range(args.days)]
+    with tempfile.TemporaryDirectory() as tmp:
+        full_dir = os.path.join(tmp, 'full')
+        os.makedirs(full_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = RedditDB(os.path.join(tmp, 'history.db'))
+        for day in dates:
+            db.append_posts(_fake_analysis_frame(args.posts, rng), day)
+        db.refresh_daily_summary(dates[0], dates[-1])
+        print(f"{args.days} days x {args.posts} posts; export and read times in ms, sizes in KiB (plain / gzip / brotli)")
+
+        def export(directory, columnar):
+            with contextlib.redirect_stdout(io.StringIO()):
+                return db.export_for_web(directory, columnar=columnar)
+
+        modes = [('sharded records', os.path.join(tmp, 'records'), False),
+                 ('sharded columnar', os.path.join(tmp, 'columnar'), True)]
+        full_time, _ = _timed(lambda: _full_web_export(db.conn, full_dir), repeat=args.repeat)
+        full_read, _ = _timed(lambda: load_web_export(full_dir), repeat=args.repeat)
+        print(f"  {'':17s} {'export':>8s} {'read':>8s}  {'all history':>23s}  {'latest week view':>23s}")
+        full_sizes = sizes(full_dir, all_files(full_dir))
+        print(f"  {'full history':17s} {full_time * 1000:8.1f} {full_read * 1000:8.1f}  "
+              + ' '.join(kib(n) for n in full_sizes) + '  ' + ' '.join(kib(n) for n in full_sizes))
+        rewrites = {}
+        for name, directory, columnar in modes:
+            export_time, _ = _timed(lambda: export(directory, columnar), repeat=1)
+            read_time, _ = _timed(lambda: load_web_export(directory), repeat=args.repeat)
+            rewrites[name] = [len(_timed(lambda: export(directory, columnar), repeat=1)[1])]
+            with open(os.path.join(directory, 'manifest.json')) as f:
+                manifest = json.load(f)
+            week = ['manifest.json', manifest['engagement']['file']] + [
+                shard['file'] for shard in manifest['shards'] if shard['end'] >= dates[max(0, len(dates) - 7)]
+            ]
+            print(f"  {name:17s} {export_time * 1000:8.1f} {read_time * 1000:8.1f}  "
+                  + ' '.join(kib(n) for n in sizes(directory, all_files(directory))) + '  '
+                  + ' '.join(kib(n) for n in sizes(directory, week)))
+
+        # A new batch of posts for the latest day, as a daily run adds
+        db.append_posts(_fake_analysis_frame(args.posts, rng), dates[-1])
+        db.refresh_daily_summary(dates[-1])
+        _full_web_export(db.conn, full_dir)
+        for name, directory, columnar in modes:
+            rewrites[name].append(len(export(directory, columnar)))
+            print(f"  {name}: {rewrites[name][0]} files rewritten by an unchanged export, "
+                  f"{rewrites[name][1]} after one day's posts")
+
+        expected = list(load_web_export(full_dir))
+        identical = all(list(load_web_export(directory)) == expected for _, directory, _ in modes)
+        db.close()
+    unchanged = all(counts[0] == 0 for counts in rewrites.values())
+    print(f"  identical records: {identical}; unchanged exports rewrote nothing: {unchanged}")
+    return identical and unchanged
+
+def bench_archive(args):
+    """Per-run CSV dumps vs the Parquet archive: size, backfill read time and database rebuild"""
+    import json
+    import sqlite3
+    import tempfile
+    from datetime import date, datetime, timedelta
+    import pandas as pd
+    import archive
+    from archive import ARCHIVE_SCHEMA, DATABASE_COLUMNS, iter_archive_runs, rebuild_database_from_archive
+    from database import RedditDB
+    from rebuild_db_from_csv import rebuild_database_from_csvs
+
+    def directory_size(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+    list_columns = [field.name for field in ARCHIVE_SCHEMA
+                    if field.name in DATABASE_COLUMNS and archive._is_nested(field.type)]
+
+    def read_csvs(csv_dir, start):
+        # What a CSV backfill has to do: read each dump and decode its list cells
+        frames = []
+        for name in sorted(os.listdir(csv_dir)):
+            run_date = datetime.strptime(name.split('_')[3], '%Y%m%d').date().isoformat()
+            if run_date < start:
+                continue
+            df = pd.read_csv(os.path.join(csv_dir, name), usecols=lambda column: column in DATABASE_COLUMNS)
+            for column in list_columns:
+                if column not in df:
+                    continue
+                df[column] = df[column].map(lambda value: archive._parse_cell(value) if isinstance(value, str) else None)
+            frames.append(df)
+        return frames
+
+    def read_archive_runs(archive_dir, start):
+        return [df for _, df in iter_archive_runs(archive_dir, start=start, columns=DATABASE_COLUMNS)]
+
+    def contents(db_path):
+        # Every column but created_at, the insert time
+        conn = sqlite3.connect(db_path)
+        rows = [conn.execute(query).fetchall() for query in [
+            f"SELECT id, date, {', '.join(RedditDB.POST_COLUMNS)}, reddit_id, comment_ids FROM posts_raw ORDER BY id",
+            'SELECT * FROM stock_mentions ORDER BY id',
+            '''
+                SELECT date, ticker, mention_count, total_posts, total_comments, avg_post_score,
+                       avg_comment_score, avg_overall_score, sentiment_positive, sentiment_negative,
+                       sentiment_neutral, subreddit_breakdown, attributed_comments, avg_attributed_score
+                FROM daily_ticker_summary ORDER BY date, ticker
+            ''',
+        ]]
+        conn.close()
+        return rows
+
+    rng = random.Random(11)
+    dates = [date(2024, 1, 1) + timedelta(days=i) for i in range(args.days)]
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_dir = os.path.join(tmp, 'csv')
+        archive_dir = os.path.join(tmp, 'archive')
+        os.makedirs(csv_dir)
+        texts = [text for text in _fake_texts(100, 20) if isinstance(text, str)]
+        for day in dates:
+            df = _fake_analysis_frame(args.posts, rng)
+            # Comment texts and IDs, JSON-encoded as csv_frame writes them
+            df['comments'] = [json.dumps([rng.choice(texts) for _ in range(n)]) for n in df['num_comments_analyzed']]
+            df['comment_ids'] = [json.dumps([f"c{day:%j}{i}x{j}" for j in range(n)])
+                                 for i, n in enumerate(df['num_comments_analyzed'])]
+            df.to_csv(os.path.join(csv_dir, f"reddit_analysis_complete_{day:%Y%m%d}_0900.csv"), index=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            archive.import_csv_dumps(csv_dir, archive_dir)
+        csv_size, archive_size = directory_size(csv_dir), directory_size(archive_dir)
+        print(f"{args.days} daily runs x {args.posts} posts")
+        print(f"  size              CSV {csv_size / 1e6:7.1f} MB   archive {archive_size / 1e6:7.1f} MB "
+              f"({csv_size / archive_size:5.1f}x)")
+
+        last_week = dates[max(0, len(dates) - 7)].isoformat()
+        for name, start in [('read all runs', dates[0].isoformat()), ('read last week', last_week)]:
+            csv_time, csv_frames = _timed(lambda: read_csvs(csv_dir, start), repeat=args.repeat)
+            archive_time, archive_frames = _timed(lambda: read_archive_runs(archive_dir, start), repeat=args.repeat)
+            print(f"  {name:17s} CSV {csv_time:7.3f} s    archive {archive_time:7.3f} s  "
+                  f"({csv_time / archive_time:5.1f}x)")
+
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                csv_rebuild, _ = _timed(lambda: rebuild_database_from_csvs(csv_dir, 'from_csv.db'), repeat=1)
+                archive_rebuild, _ = _timed(lambda: rebuild_database_from_archive(archive_dir, 'from_archive.db'),
+                                            repeat=1)
+            identical = contents('from_csv.db') == contents('from_archive.db')
+        finally:
+            os.chdir(cwd)
+        print(f"  database rebuild  CSV {csv_rebuild:7.3f} s    archive {archive_rebuild:7.3f} s  "
+              f"({csv_rebuild / archive_rebuild:5.1f}x)")
+    print(f"  identical databases: {identical}")
+    return identical
+
+def bench_comments(args):
+    """Per-comment analytics: decoding CSV dumps vs the comments table"""
+    import ast
+    import tempfile
+    from datetime import date, timedelta
+    import numpy as np
+    import pandas as pd
+    from database import RedditDB
+
+    def csv_scores(csv_dir):
+        # Every comment score of every run, as a backfill from the dumps reads them
+        scores = []
+        for name in sorted(os.listdir(csv_dir)):
+            df = pd.read_csv(os.path.join(csv_dir, name), usecols=['comment_word_scores'])
+            for cell in df['comment_word_scores']:
+                scores.extend(ast.literal_eval(cell))
+        return np.array(scores, dtype='<f4')
+
+    def csv_stats(csv_dir):
+        # Each comment counts once for every ticker its post mentions
+        rows = []
+        for name in sorted(os.listdir(csv_dir)):
+            run_date = date(int(name[25:29]), int(name[29:31]), int(name[31:33])).isoformat()
+            df = pd.read_csv(os.path.join(csv_dir, name), usecols=['mentioned_tickers', 'comment_word_scores'])
+            for tickers, cell in zip(df['mentioned_tickers'], df['comment_word_scores']):
+                scores = ast.literal_eval(cell)
+                rows.extend((run_date, ticker, score) for ticker in ast.literal_eval(tickers) for score in scores)
+        frame = pd.DataFrame(rows, columns=['date', 'ticker', 'score'])
+        stats = frame.groupby(['date', 'ticker'])['score'].agg(['count', 'mean', 'min', 'max']).reset_index()
+        return [(row.date, row.ticker, row.count, round(row.mean, 2), row.min, row.max)
+                for row in stats.itertuples()]
+
+    def db_stats(db, start, end):
+        stats = db.get_comment_stats(start, end)
+        return [(row.date, row.ticker, row.comments, row.avg_score, row.min_score, row.max_score)
+                for row in stats.itertuples()]
+
+    rng = random.Random(13)
+    dates = [date(2024, 1, 1) + timedelta(days=i) for i in range(args.days)]
+    start, end = dates[0].isoformat(), dates[-1].isoformat()
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_dir = os.path.join(tmp, 'csv')
+        os.makedirs(csv_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = RedditDB(os.path.join(tmp, 'comments.db'))
+        for day in dates:
+            df = _fake_analysis_frame(args.posts, rng)
+            df.to_csv(os.path.join(csv_dir, f"reddit_analysis_complete_{day:%Y%m%d}_0900.csv"), index=False)
+            db.append_posts(df, date=day.isoformat())
+        total = db.conn.execute('SELECT COUNT(*) FROM comments').fetchone()[0]
+        print(f"{args.days} days x {args.posts} posts, {total} comments")
+
+        csv_time, from_csv = _timed(lambda: csv_scores(csv_dir), repeat=args.repeat)
+        db_time, from_db = _timed(lambda: db.get_comments(start, end)['score'], repeat=args.repeat)
+        print(f"  all scores as NumPy      CSV {csv_time:7.3f} s    get_comments {db_time:7.3f} s  "
+              f"({csv_time / db_time:5.1f}x)")
+        scores_match = np.array_equal(from_csv, from_db)
+
+        csv_time, from_csv = _timed(lambda: csv_stats(csv_dir), repeat=args.repeat)
+        db_time, from_db = _timed(lambda: db_stats(db, start, end), repeat=args.repeat)
+        print(f"  stats by date and ticker CSV {csv_time:7.3f} s    one query    {db_time:7.3f} s  "
+              f"({csv_time / db_time:5.1f}x)")
+        stats_match = from_csv == from_db
+        db.close()
+    print(f"  identical scores: {scores_match}, identical stats: {stats_match}")
+    return scores_match and stats_match
+
+def bench_search(args):
+    """Ad-hoc text queries: regex scans of a DataFrame vs the FTS5 index, and index maintenance vs bulk load"""
+    import re
+    import tempfile
+    from datetime import date, timedelta
+    import pandas as pd
+    from database import RedditDB
+
+    rng = random.Random(17)
+    # Zipf-distributed made-up words, plus a phrase that is near tickers now and then
+    syllables = ['ka', 'lo', 'mi', 'ter', 'sun', 'bar', 'vex', 'dro', 'pal', 'qui']
+    vocabulary = [''.join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) for _ in range(5000)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    tickers = ['AAPL', 'TSLA', 'NVDA', 'AMD', 'GME']
+
+    def text():
+        words = rng.choices(vocabulary, weights, k=rng.randint(5, 30))
+        if rng.random() < 0.02:
+            words.insert(rng.randrange(len(words) + 1), 'guidance cut')
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(tickers))
+        return ' '.join(words)
+
+    dates = [date(2024, 1, 1) + timedelta(days=i) for i in range(args.days)]
+    frames = []
+    for day in dates:
+        df = _fake_analysis_frame(args.posts, rng)
+        df['post_content'] = [text() for _ in range(len(df))]
+        df['comments'] = [[text() for _ in range(n)] for n in df['num_comments_analyzed']]
+        frames.append((day.isoformat(), df))
+
+    # (FTS5 query, the equivalent case-insensitive regex, ticker)
+    near = r'guidance\W+cut(?:\W+\w+){0,5}?\W+nvda\b|\bnvda(?:\W+\w+){0,5}?\W+guidance\W+cut'
+    queries = [
+        ('"guidance cut"', r'\bguidance\W+cut\b', None),
+        ('guid*', r'\bguid', None),
+        ('NEAR("guidance cut" NVDA, 5)', near, None),
+        ('"guidance cut"', r'\bguidance\W+cut\b', 'TSLA'),
+    ]
+    start = dates[-90].isoformat() if len(dates) >= 90 else dates[0].isoformat()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            incremental = RedditDB(os.path.join(tmp, 'incremental.db'), search=True)
+            bulk = RedditDB(os.path.join(tmp, 'bulk.db'), search=True)
+
+        def load(db):
+            for day, df in frames:
+                db.append_posts(df, day)
+
+        incremental_time, _ = _timed(lambda: load(incremental), repeat=1)
+
+        def bulk_load():
+            with bulk.bulk_search_load():
+                load(bulk)
+
+        bulk_time, _ = _timed(bulk_load, repeat=1)
+        documents = bulk.conn.execute('SELECT COUNT(*) FROM post_search').fetchone()[0]
+        print(f"{args.days} days x {args.posts} posts, {documents} documents")
+        print(f"  load with index maintained per batch {incremental_time:7.2f} s    bulk load {bulk_time:7.2f} s")
+
+        # What an ad-hoc question meant before: every post and comment text in
+        # a DataFrame (its load time not counted), scanned with a regex
+        posts = pd.read_sql_query('SELECT id, date, reddit_id FROM posts_raw', bulk.conn)
+        ids = dict(zip(posts['reddit_id'], posts['id']))
+        documents = pd.DataFrame([
+            (ids[reddit_id], day, text)
+            for day, df in frames
+            for reddit_id, title, content, comments in zip(
+                df['url'].str.extract(r'/comments/(\w+)/')[0], df['post_title'], df['post_content'], df['comments'])
+            for text in [f"{title}\n{content}"] + comments
+        ], columns=['post_id', 'date', 'text'])
+        mentions = pd.read_sql_query('SELECT post_id, ticker FROM stock_mentions', bulk.conn)
+
+        def scan(pattern, ticker):
+            recent = documents[documents['date'] >= start]
+            matched = set(recent.loc[recent['text'].str.contains(pattern, flags=re.IGNORECASE), 'post_id'])
+            if ticker is not None:
+                matched &= set(mentions.loc[mentions['ticker'] == ticker, 'post_id'])
+            return matched
+
+        identical = True
+        for query, pattern, ticker in queries:
+            scan_time, scanned = _timed(lambda: scan(pattern, ticker), repeat=args.repeat)
+            search_time, found = _timed(lambda: bulk.search_posts(query, start, ticker=ticker, limit=None),
+                                        repeat=args.repeat)
+            same = scanned == set(found) == set(incremental.search_posts(query, start, ticker=ticker, limit=None))
+            identical = identical and same
+            label = query + (f" ticker={ticker}" if ticker else '')
+            print(f"  {label:38s} scan {scan_time * 1000:8.1f} ms   search {search_time * 1000:7.2f} ms  "
+                  f"({scan_time / search_time:6.0f}x)  {len(found)} posts")
+        incremental.close()
+        bulk.close()
+    print(f"  identical results: {identical}")
+    return identical
+
+def bench_retention(args):
+    """Tiered retention: database size and export time before and after, with the expired posts replayed"""
+    import json
+    import sqlite3
+    import tempfile
+    from datetime import date, timedelta
+    import archive
+    from database import RedditDB
+
+    def table_rows(conn):
+        return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('posts_raw', 'comments', 'daily_ticker_summary', 'weekly_ticker_summary',
+                              'monthly_ticker_summary')}
+
+    def monthly_mentions(conn, table, column):
+        return dict(conn.execute(f'SELECT substr({column}, 1, 7), SUM(mention_count) FROM {table} GROUP BY 1'))
+
+    def stored_posts(path, where):
+        conn = sqlite3.connect(path)
+        rows = conn.execute(f'''
+            SELECT reddit_id, date, post_title, overall_score, comment_ids,
+                   (SELECT group_concat(ticker || ':' || hex(comment_indices)) FROM stock_mentions WHERE post_id = pr.id),
+                   (SELECT COUNT(*) FROM comments AS c WHERE c.date = pr.date AND c.post_id = pr.id)
+            FROM posts_raw AS pr WHERE {where} ORDER BY reddit_id
+        ''').fetchall()
+        conn.close()
+        return rows
+
+    rng = random.Random(23)
+    dates = [date(2020, 1, 1) + timedelta(days=i) for i in range(args.days)]
+    today = (dates[-1] + timedelta(days=1)).isoformat()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'history.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = RedditDB(db_path, search=True)
+            with db.bulk_search_load():
+                for day in dates:
+                    df = _fake_analysis_frame(args.posts, rng)
+                    df['comments'] = [[f"comment {j} on {day}" for j in range(n)]
+                                      for n in df['num_comments_analyzed']]
+                    db.append_posts(df, day.isoformat())
+            db.refresh_daily_summary(dates[0].isoformat(), dates[-1].isoformat())
+
+        def export():
+            # A full export, into a new directory each time
+            directory = os.path.join(tmp, f'web{time.perf_counter_ns()}')
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.export_for_web(directory)
+            with open(os.path.join(directory, 'manifest.json')) as f:
+                return json.load(f)['shards']
+
+        def database_size():
+            # Pages still in the write-ahead log are not in the file yet
+            db.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            return os.path.getsize(db_path)
+
+        before_rows = table_rows(db.conn)
+        before_size = database_size()
+        before_mentions = monthly_mentions(db.conn, 'daily_ticker_summary', 'date')
+        before_export, shards = _timed(export, repeat=args.repeat)
+        cutoff = (dates[-1] + timedelta(days=1) - timedelta(days=RedditDB.RETENTION_DAYS['raw'])).isoformat()
+        expired = stored_posts(db_path, f"date < '{cutoff}'")
+
+        archive_dir = os.path.join(tmp, 'archive')
+        retention_time, deleted = _timed(
+            lambda: db.apply_retention(archive_dir=archive_dir, today=today, vacuum_pages=None), repeat=1)
+        after_rows = table_rows(db.conn)
+        after_size = database_size()
+        after_export, after_shards = _timed(export, repeat=args.repeat)
+        # Every month's mentions are still there, in whichever tier holds it
+        kept = {**monthly_mentions(db.conn, 'monthly_ticker_summary', 'period'),
+                **monthly_mentions(db.conn, 'daily_ticker_summary', 'date')}
+        db.close()
+
+        print(f"{args.days} days x {args.posts} posts, retention {RedditDB.RETENTION_DAYS} days, "
+              f"applied in {retention_time:.2f} s")
+        print(f"  {'':22s} {'before':>10s} {'after':>10s}")
+        for table in before_rows:
+            print(f"  {table:22s} {before_rows[table]:10d} {after_rows[table]:10d}")
+        print(f"  {'database MiB':22s} {before_size / 2 ** 20:10.1f} {after_size / 2 ** 20:10.1f}")
+        print(f"  {'full export ms (best)':22s} {before_export * 1000:10.1f} {after_export * 1000:10.1f}")
+        print(f"  {'shards':22s} {len(shards):10d} {len(after_shards):10d}")
+
+        # The rebuild re-exports the web data into the working directory
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                archive.rebuild_database_from_archive(archive_dir, 'replay.db')
+            replayed = stored_posts('replay.db', 'true')
+        finally:
+            os.chdir(cwd)
+    identical = replayed == expired and len(expired) == deleted['raw']
+    # Weeks are exported with the month they start in, which adds the month
+    # before the first day once its daily rows are gone
+    covered = {shard['month'] for shard in shards} <= {shard['month'] for shard in after_shards}
+    totals = kept == before_mentions
+    print(f"  expired posts replayed from the archive: {identical} ({len(expired)} posts); "
+          f"every month still exported: {covered}; monthly mention totals kept: {totals}")
+    return identical and covered and totals
+
+def _pandas_rolling_stats(conn):
+    """
+    Rolling statistics recomputed over the whole daily_ticker_summary
+    history, as the dashboard did for each view, in ticker_rolling_stats
+    columns and row order
+    """
+    import numpy as np
+    import pandas as pd
+    from database import RedditDB
+
+    daily = pd.read_sql_query('SELECT date, ticker, mention_count, avg_overall_score FROM daily_ticker_summary', conn)
+    dates = pd.date_range(daily['date'].min(), daily['date'].max()).strftime('%Y-%m-%d')
+    mentions = daily.pivot(index='date', columns='ticker', values='mention_count').reindex(dates).fillna(0)
+    scores = (daily.pivot(index='date', columns='ticker', values='avg_overall_score') * 100).round().reindex(dates)
+
+    columns = {}
+    for window in RedditDB.ROLLING_WINDOWS:
+        columns[f'mentions_ma{window}'] = (mentions.rolling(window, min_periods=1).sum() / window).round(2)
+    for window in RedditDB.ROLLING_WINDOWS:
+        scored = scores.notna().astype(int).rolling(window, min_periods=1).sum().replace(0, np.nan)
+        columns[f'score_ma{window}'] = (scores.rolling(window, min_periods=1).sum() / scored / 100).round(2)
+
+    # Each stretch of days with a mention in the longest window is tracked
+    # from scratch, with an unadjusted EWMA starting at its first day
+    tracked = mentions.rolling(max(RedditDB.ROLLING_WINDOWS), min_periods=1).sum() > 0
+    stretches = (~tracked).cumsum()
+    alpha = 2 / (RedditDB.SPIKE_SPAN + 1)
+    means, variances, days = (pd.DataFrame(index=mentions.index, columns=mentions.columns, dtype=float)
+                              for _ in range(3))
+    for ticker in mentions.columns:
+        rows = tracked[ticker]
+        groups = mentions.loc[rows, ticker].groupby(stretches.loc[rows, ticker])
+        means.loc[rows, ticker] = groups.transform(lambda s: s.ewm(alpha=alpha, adjust=False).mean())
+        variances.loc[rows, ticker] = groups.transform(lambda s: s.ewm(alpha=alpha, adjust=False).var(bias=True))
+        days.loc[rows, ticker] = groups.cumcount() + 1
+    previous_days = days - 1
+    spikes = ((mentions - means.shift()) / np.sqrt(variances.shift())).round(2)
+    spikes = spikes.where((previous_days >= RedditDB.SPIKE_MIN_DAYS) & (variances.shift() > 0))
+    columns.update(mentions_ewma=means, mentions_ewmvar=variances, spike_z=spikes, days_tracked=days)
+
+    frame = pd.concat({name: column.where(tracked).stack(future_stack=True) for name, column in columns.items()},
+                      axis=1)
+    frame = frame[tracked.stack(future_stack=True)].rename_axis(['date', 'ticker']).reset_index()
+    return frame.sort_values(['date', 'ticker'], ignore_index=True)
+
+def bench_rolling(args):
+    """Rolling averages and mention spikes: a pandas recompute of the whole history vs ticker_rolling_stats updates"""
+    import math
+    import tempfile
+    from datetime import date, timedelta
+    import pandas as pd
+    from database import RedditDB
+
+    def same(a, b):
+        # Rounded averages may differ by one unit in the last digit, as
+        # pandas and Python round halves differently
+        if a is None or b is None or (isinstance(a, float) and math.isnan(a)):
+            return (a is None or math.isnan(a)) and (b is None or math.isnan(b))
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=0.0100001)
+
+    rng = random.Random(29)
+    checkpoints = sorted(args.days)
+    start = date(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = RedditDB(os.path.join(tmp, 'history.db'))
+        # Missing days, and an outage long enough for every ticker to stop being tracked
+        print(f"{args.posts} posts per day (every 9th day and days 100-139 missing); best of {args.repeat} in ms")
+        print(f"  {'days':>5s}  {'rows':>7s}  {'pandas recompute':>16s}  {'day update':>10s}  {'latest stats':>12s}")
+        for n_days in range(1, checkpoints[-1] + 1):
+            day = (start + timedelta(days=n_days - 1)).isoformat()
+            if n_days % 9 and not 100 <= n_days < 140:
+                db.append_posts(_fake_analysis_frame(rng.randint(args.posts // 2, args.posts * 2), rng), day)
+            db.refresh_daily_summary(day)
+            if n_days not in checkpoints:
+                continue
+
+            # A day's update includes its daily summary and rollups, as saving it does
+            recompute_time, _ = _timed(lambda: _pandas_rolling_stats(db.conn), repeat=args.repeat)
+            update_time, _ = _timed(lambda: db.refresh_daily_summary(day), repeat=args.repeat)
+            latest_time, _ = _timed(lambda: db.get_rolling_stats(), repeat=args.repeat)
+            rows = db.conn.execute('SELECT COUNT(*) FROM ticker_rolling_stats').fetchone()[0]
+            print(f"  {n_days:5d}  {rows:7d}  {recompute_time * 1000:16.1f}  {update_time * 1000:10.2f}  "
+                  f"{latest_time * 1000:12.2f}")
+
+        stored = pd.read_sql_query('SELECT * FROM ticker_rolling_stats ORDER BY date, ticker', db.conn)
+        expected = _pandas_rolling_stats(db.conn)
+
+        # The same history summarized in one pass
+        db.refresh_daily_summary(start.isoformat(), day)
+        one_pass = pd.read_sql_query('SELECT * FROM ticker_rolling_stats ORDER BY date, ticker', db.conn)
+        db.close()
+
+    identical = stored.equals(one_pass)
+    matches = (len(stored) == len(expected)
+               and (stored[['date', 'ticker']].values == expected[['date', 'ticker']].values).all()
+               and all(same(a, b) for column in expected.columns[2:]
+                       for a, b in zip(stored[column].tolist(), expected[column].tolist())))
+    print(f"  {len(stored)} rows; day-by-day and one pass identical: {identical}; match pandas: {matches}")
+    return identical and matches
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline hot paths")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    word_score = subparsers.add_parser('word-score', help=bench_word_score.__doc__)
+    word_score.add_argument('--posts', type=int, default=500)
+    word_score.add_argument('--comments', type=int, default=50)
+    word_score.set_defaults(run=bench_word_score)
+
+    score = subparsers.add_parser('score', help=bench_score.__doc__)
+    score.add_argument('--posts', type=int, default=20000)
+    score.add_argument('--comments', type=int, default=20)
+    score.add_argument('--workers', type=int, default=None)
+    score.add_argument('--chunk-size', type=int, default=250)
+    score.set_defaults(run=bench_score)
+
+    cache = subparsers.add_parser('cache', help=bench_cache.__doc__)
+    cache.add_argument('--posts', type=int, default=2000)
+    cache.add_argument('--comments', type=int, default=20)
+    cache.set_defaults(run=bench_cache)
+
+    nb = subparsers.add_parser('nb', help=bench_nb.__doc__)
+    nb.add_argument('--posts', type=int, default=2000)
+    nb.add_argument('--comments', type=int, default=50)
+    nb.add_argument('--train-posts', type=int, default=500)
+    nb.add_argument('--check', type=int, default=5000)
+    nb.set_defaults(run=bench_nb)
+
+    nb_load = subparsers.add_parser('nb-load', help=bench_nb_load.__doc__)
+    nb_load.add_argument('--examples', type=int, default=20000)
+    nb_load.add_argument('--vocab', type=int, default=50000)
+    nb_load.set_defaults(run=bench_nb_load)
+
+    startup = subparsers.add_parser('startup', help=bench_startup.__doc__)
+    startup.add_argument('--runs', type=int, default=5)
+    startup.set_defaults(run=bench_startup)
+
+    analyze_stream = subparsers.add_parser('analyze-stream', help=bench_analyze_stream.__doc__)
+    analyze_stream.add_argument('--posts', type=int, default=5000)
+    analyze_stream.add_argument('--comments', type=int, default=20)
+    analyze_stream.add_argument('--chunk-size', type=int, default=200)
+    analyze_stream.set_defaults(run=bench_analyze_stream)
+
+    db_write = subparsers.add_parser('db-write', help=bench_db_write.__doc__)
+    db_write.add_argument('--days', type=int, default=100)
+    db_write.add_argument('--posts', type=int, default=300)
+    db_write.set_defaults(run=bench_db_write)
+
+    db_query = subparsers.add_parser('db-query', help=bench_db_query.__doc__)
+    db_query.add_argument('--days', type=int, nargs='+', default=[30, 120, 480])
+    db_query.add_argument('--posts', type=int, default=60)
+    db_query.add_argument('--repeat', type=int, default=20)
+    db_query.set_defaults(run=bench_db_query)
+
+    db_summary = subparsers.add_parser('db-summary', help=bench_db_summary.__doc__)
+    db_summary.add_argument('--days', type=int, default=200)
+    db_summary.add_argument('--posts', type=int, default=300)
+    db_summary.set_defaults(run=bench_db_summary)
+
+    web_export = subparsers.add_parser('web-export', help=bench_web_export.__doc__)
+    web_export.add_argument('--days', type=int, default=730)
+    web_export.add_argument('--posts', type=int, default=60)
+    web_export.add_argument('--repeat', type=int, default=5)
+    web_export.set_defaults(run=bench_web_export)
+
+    archive = subparsers.add_parser('archive', help=bench_archive.__doc__)
+    archive.add_argument('--days', type=int, default=60)
+    archive.add_argument('--posts', type=int, default=300)
+    archive.add_argument('--repeat', type=int, default=3)
+    archive.set_defaults(run=bench_archive)
+
+    comments = subparsers.add_parser('comments', help=bench_comments.__doc__)
+    comments.add_argument('--days', type=int, default=90)
+    comments.add_argument('--posts', type=int, default=200)
+    comments.add_argument('--repeat', type=int, default=3)
+    comments.set_defaults(run=bench_comments)
+
+    search = subparsers.add_parser('search', help=bench_search.__doc__)
+    search.add_argument('--days', type=int, default=120)
+    search.add_argument('--posts', type=int, default=200)
+    search.add_argument('--repeat', type=int, default=3)
+    search.set_defaults(run=bench_search)
+
+    retention = subparsers.add_parser('retention', help=bench_retention.__doc__)
+    retention.add_argument('--days', type=int, default=1200)
+    retention.add_argument('--posts', type=int, default=10)
+    retention.add_argument('--repeat', type=int, default=5)
+    retention.set_defaults(run=bench_retention)
+
+    rolling = subparsers.add_parser('rolling', help=bench_rolling.__doc__)
+    rolling.add_argument('--days', type=int, nargs='+', default=[90, 365, 730])
+    rolling.add_argument('--posts', type=int, default=40)
+    rolling.add_argument('--repeat', type=int, default=5)
+    rolling.set_defaults(run=bench_rolling)
+
+    args = parser.parse_args()
+    ok = args.run(args)
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
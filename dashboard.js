@@ -2,10 +2,18 @@
 let sentimentData = null;
 let mentionsData = null;
 let engagementData = null;
+let rollingStats = null; // Latest moving averages and mention spike z-scores by ticker, when exported
 let selectedTicker = null;
 let globalDates = [];
 let tickerColors = {};
 let stockPricesCache = {}; // Cache for stock prices to avoid repeated API calls
+let manifest = null; // Index of the monthly history shards, when the export has one
+let shardRequests = {}; // Shard file -> fetch promise, so each shard is fetched once
+
+const DATA_DIR = 'docs/data/';
+const INITIAL_DAYS = 90; // Dates shown on load when the history is sharded
+const COLUMNAR_FORMAT = 2; // Manifest format of shards holding one series per ticker
+const DAY_MS = 24 * 60 * 60 * 1000;
 
 // Global state
 let allData = [];
@@ -14,10 +22,27 @@ const API_KEY = '6SZERRM8P37D447V'; // Replace with your new Alpha Vantage API k
 // Load data when the page loads
 document.addEventListener('DOMContentLoaded', async function() {
     try {
-        // Load all JSON files
-        sentimentData = await fetch('docs/data/sentiment_over_time.json').then(r => r.json());
-        mentionsData = await fetch('docs/data/mentions_over_time.json').then(r => r.json());
-        engagementData = await fetch('docs/data/engagement_by_ticker.json').then(r => r.json());
+        manifest = await fetch(DATA_DIR + 'manifest.json').then(r => r.ok ? r.json() : null).catch(() => null);
+        if (manifest) {
+            // Dates and tickers come from the manifest; shards are fetched
+            // as the selected date range reaches them
+            sentimentData = [];
+            mentionsData = [];
+            globalDates = manifest.shards.flatMap(shard => shard.dates);
+            engagementData = toRecords(await fetch(versioned(manifest.engagement)).then(r => r.json()));
+            if (manifest.rolling_stats) {
+                rollingStats = toRecords(await fetch(versioned(manifest.rolling_stats)).then(r => r.json()));
+            }
+            // Spikes come only from the rolling statistics, so exports without them hide the button
+            document.getElementById('mentionSpikesButton').hidden = !rollingStats;
+            await loadShards(globalDates[Math.max(0, globalDates.length - INITIAL_DAYS)], globalDates[globalDates.length - 1]);
+        } else {
+            // Older exports hold the full history in single files
+            sentimentData = await fetch(DATA_DIR + 'sentiment_over_time.json').then(r => r.json());
+            mentionsData = await fetch(DATA_DIR + 'mentions_over_time.json').then(r => r.json());
+            engagementData = await fetch(DATA_DIR + 'engagement_by_ticker.json').then(r => r.json());
+            globalDates = [...new Set(sentimentData.map(d => d.date))].sort();
+        }
 
         // Initialize filters
         initializeFilters();
@@ -31,11 +56,58 @@ document.addEventListener('DOMContentLoaded', async function() {
     }
 });
 
+// URL of an exported file, with its hash so browsers cache it until it changes
+function versioned(entry) {
+    return `${DATA_DIR}${entry.file}?v=${entry.sha256.slice(0, 12)}`;
+}
+
+// Rows of an exported table, which columnar exports store as one array per column
+function toRecords(data) {
+    if (manifest.format !== COLUMNAR_FORMAT) return data;
+    return data.ticker.map((_, i) => Object.fromEntries(Object.keys(data).map(column => [column, data[column][i]])));
+}
+
+// Fetch the shards overlapping the start - end dates that are not loaded yet
+async function loadShards(start, end) {
+    if (!manifest) return;
+    const byDateAndTicker = (a, b) => a.date.localeCompare(b.date) || a.ticker.localeCompare(b.ticker);
+    const shards = manifest.shards.filter(shard => shard.end >= start && shard.start <= end);
+    await Promise.all(shards.map(shard => {
+        if (!shardRequests[shard.file]) {
+            shardRequests[shard.file] = fetch(versioned(shard)).then(r => r.json()).then(data => {
+                if (manifest.format === COLUMNAR_FORMAT) data = expandColumnarShard(data);
+                sentimentData.push(...data.sentiment_over_time);
+                mentionsData.push(...data.mentions_over_time);
+                sentimentData.sort(byDateAndTicker);
+                mentionsData.sort(byDateAndTicker);
+            });
+        }
+        return shardRequests[shard.file];
+    }));
+}
+
+// Records of a columnar shard: each series holds day offsets from the shard's
+// first date and a ticker number into the manifest's ticker dictionary
+function expandColumnarShard(data) {
+    const start = Date.parse(data.start);
+    const sentiment = [];
+    const mentions = [];
+    data.series.forEach(series => {
+        const ticker = manifest.tickers[series.ticker];
+        series.days.forEach((day, i) => {
+            const date = new Date(start + day * DAY_MS).toISOString().slice(0, 10);
+            sentiment.push({date, ticker, avg_overall_score: series.avg_overall_score[i]});
+            mentions.push({date, ticker, mention_count: series.mention_count[i]});
+        });
+    });
+    return {sentiment_over_time: sentiment, mentions_over_time: mentions};
+}
 
 // Initialize filters
 function initializeFilters() {
-    globalDates = [...new Set(sentimentData.map(d => d.date))].sort();
-    const tickers = [...new Set(sentimentData.map(d => d.ticker).concat(mentionsData.map(d => d.ticker)))].sort();
+    const tickers = manifest
+        ? [...new Set(manifest.shards.flatMap(shard => shard.tickers))].sort()
+        : [...new Set(sentimentData.map(d => d.ticker).concat(mentionsData.map(d => d.ticker)))].sort();
 
     // Assign colors to tickers
     const colors = getColorPalette(tickers.length);
@@ -65,9 +137,11 @@ function initializeFilters() {
         dateRange.removeAttribute('disabled');
         
         const maxIndex = globalDates.length - 1;
+        // Sharded history starts on its most recent dates, so only their shards load
+        const startIndex = manifest ? Math.max(0, maxIndex - INITIAL_DAYS + 1) : 0;
         
         noUiSlider.create(dateRange, {
-            start: [0, maxIndex], // Start with full range
+            start: [startIndex, maxIndex],
             connect: true,
             range: {
                 'min': 0,
@@ -77,18 +151,18 @@ function initializeFilters() {
             tooltips: false // Disable tooltips for now to avoid conflicts
         });
         
-        // Force set to full range after a brief delay to ensure DOM is ready
+        // Force set to the initial range after a brief delay to ensure DOM is ready
         setTimeout(() => {
-            console.log('Setting slider to full range:', [0, maxIndex]);
-            dateRange.noUiSlider.set([0, maxIndex]);
-            // Set label to full range
+            console.log('Setting slider to initial range:', [startIndex, maxIndex]);
+            dateRange.noUiSlider.set([startIndex, maxIndex]);
+            // Set label to the initial range
             if (label) {
-                label.textContent = `${globalDates[0]} - ${globalDates[maxIndex]}`;
+                label.textContent = `${globalDates[startIndex]} - ${globalDates[maxIndex]}`;
             }
-            console.log('Slider set to:', [0, maxIndex]);
+            console.log('Slider set to:', [startIndex, maxIndex]);
             console.log('Current slider values after set:', dateRange.noUiSlider.get());
             
-            // Force trigger update to ensure plots are created with full range
+            // Force trigger update to ensure plots are created with the initial range
             updatePlots();
         }, 200);
         
@@ -410,7 +484,7 @@ function createMentionsPlot() {
 
 
 // Update all plots when filters change
-function updatePlots() {
+async function updatePlots() {
     // Update stock prices first to ensure they always load
     updateStockPrices();
 
@@ -420,13 +494,27 @@ function updatePlots() {
     const endIndex = Math.round(parseFloat(dateRangeSlider[1]));
     const dateValues = [globalDates[startIndex], globalDates[endIndex]];
     updateDateRangeLabel(dateValues);
+    await loadShards(dateValues[0], dateValues[1]);
     createSentimentPlot();
     createMentionsPlot();
     createEngagementPlot();
 }
 
-// Quick filter functions
+// Quick filter functions. With exported rolling statistics they rank
+// tickers by their 30-day averages as of the latest exported day, whatever
+// the selected date range; exports without them rank the loaded history.
+function selectTopRolling(column, n) {
+    const topTickers = rollingStats
+        .filter(d => d[column] !== null && d[column] !== undefined)
+        .sort((a, b) => b[column] - a[column])
+        .slice(0, n)
+        .map(d => d.ticker);
+    
+    $('#tickerSelect').val(topTickers).trigger('change');
+}
+
 function filterTopMentions(n) {
+    if (rollingStats) return selectTopRolling('mentions_ma30', n);
     const topTickers = [...new Set(mentionsData.map(d => d.ticker))]
         .map(ticker => ({
             ticker,
@@ -442,6 +530,7 @@ function filterTopMentions(n) {
 }
 
 function filterTopSentiment(n) {
+    if (rollingStats) return selectTopRolling('score_ma30', n);
     const topTickers = [...new Set(sentimentData.map(d => d.ticker))]
         .map(ticker => ({
             ticker,
@@ -457,6 +546,12 @@ function filterTopSentiment(n) {
     $('#tickerSelect').val(topTickers).trigger('change');
 }
 
+// Tickers mentioned most unusually often on the latest day, by EWMA z-score
+function filterMentionSpikes(n) {
+    if (!rollingStats) return;
+    selectTopRolling('spike_z', n);
+}
+
 function resetFilters() {
     const dateRange = document.getElementById('dateRange');
     dateRange.noUiSlider.set([0, globalDates.length - 1]);
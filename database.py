@@ -1,18 +1,83 @@
 import sqlite3
-import pandas as pd
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import json
+from collections import Counter
+from itertools import chain
 import ast
+import gzip
+import hashlib
+import math
 import os
+import re
+
+# pandas and numpy are imported inside the functions that need them, so
+# scripts that only touch SeenPostIndex start quickly
 
 class RedditDB:
-    def __init__(self, db_path='reddit_sentiment.db'):
+    # Applied to the long-lived connection: WAL lets the dashboard export read
+    # while a run writes, and NORMAL sync is durable in WAL mode except on power
+    # loss. Negative cache_size is in KiB. auto_vacuum only takes effect on a
+    # new database (see _incremental_vacuum for older ones).
+    PRAGMAS = [
+        ('auto_vacuum', 'INCREMENTAL'),
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('temp_store', 'MEMORY'),
+        ('cache_size', -65536),
+        ('mmap_size', 268435456),
+    ]
+    
+    # posts_raw columns written from each DataFrame row, after date
+    POST_COLUMNS = [
+        'subreddit', 'post_title', 'post_content', 'post_author', 'post_score',
+        'num_comments', 'post_sentiment', 'post_word_score', 'comment_sentiment',
+        'comment_score', 'overall_sentiment', 'overall_score', 'num_comments_analyzed', 'url'
+    ]
+    
+    # Stay well under SQLite's bound-parameter limit
+    LOOKUP_BATCH_SIZE = 500
+    
+    # Full-text search documents are a post's title and content, and each of
+    # its comments. A document's ID is post_id * SEARCH_ROWID_SCALE plus 0
+    # for the post or 1 + the comment's position, so the documents of a post
+    # are one ID range.
+    SEARCH_ROWID_SCALE = 1 << 20
+    
+    def __init__(self, db_path='reddit_sentiment.db', search=False):
+        """
+        search creates the full-text index of posts and comments if the
+        database has none; once created, it is kept up to date on every write
+        """
         self.db_path = db_path
+        self._conn = None
+        self.search = search
+        self._search_deferred = False
         self.init_db()
     
+    @property
+    def conn(self):
+        """The database connection, opened once and reused by every method"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            for name, value in self.PRAGMAS:
+                self._conn.execute(f'PRAGMA {name}={value}')
+        return self._conn
+    
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
     def init_db(self):
         """Create tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.conn
         
         # Raw posts table
         conn.execute('''
@@ -33,6 +98,8 @@ class RedditDB:
                 overall_score REAL,
                 num_comments_analyzed INTEGER,
                 url TEXT,
+                reddit_id TEXT,
+                comment_ids TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
@@ -44,10 +111,31 @@ class RedditDB:
                 post_id INTEGER,
                 ticker TEXT,
                 date TEXT,
+                mentioned_in_post INTEGER,
+                attributed_comments INTEGER,
+                attributed_score REAL,
+                comment_indices BLOB,
                 FOREIGN KEY (post_id) REFERENCES posts_raw (id)
             )
         ''')
         
+        # One row per analyzed comment, numbered by its position in the
+        # post's comments (as in stock_mentions.comment_indices), with its
+        # Reddit ID, creation time and 0-100 word score. Rows are clustered
+        # on the post's date, so date ranges are read sequentially.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS comments (
+                date TEXT NOT NULL,
+                post_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                comment_id TEXT,
+                created_utc REAL,
+                score REAL,
+                PRIMARY KEY (date, post_id, position),
+                FOREIGN KEY (post_id) REFERENCES posts_raw (id)
+            ) WITHOUT ROWID
+        ''')
+        
         # Daily summary table (denormalized for fast queries)
         conn.execute('''
             CREATE TABLE IF NOT EXISTS daily_ticker_summary (
@@ -64,197 +152,1750 @@ class RedditDB:
                 sentiment_negative INTEGER,
                 sentiment_neutral INTEGER,
                 subreddit_breakdown TEXT,
+                attributed_comments INTEGER,
+                avg_attributed_score REAL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 UNIQUE(date, ticker)
             )
         ''')
         
+        # Weekly and monthly rollups of daily_ticker_summary, one row per
+        # (period, ticker) with period the week's Monday or the month's first
+        # day. They outlive the daily rows (see apply_retention).
+        for table, _ in self.ROLLUPS.values():
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    period TEXT NOT NULL,
+                    ticker TEXT NOT NULL,
+                    days INTEGER,
+                    mention_count INTEGER,
+                    total_comments INTEGER,
+                    avg_post_score REAL,
+                    avg_comment_score REAL,
+                    avg_overall_score REAL,
+                    sentiment_positive INTEGER,
+                    sentiment_negative INTEGER,
+                    sentiment_neutral INTEGER,
+                    attributed_comments INTEGER,
+                    avg_attributed_score REAL,
+                    UNIQUE(period, ticker)
+                )
+            ''')
+        
+        # Per ticker and day: 7- and 30-day moving averages of its mentions
+        # and of its daily average overall score (over the days it was
+        # mentioned), and the EWMA mean and variance of its mentions with the
+        # z-score of the day's mentions against the previous day's EWMA. A
+        # ticker has rows from its first mention until 30 days without one;
+        # see _save_rolling_stats.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ticker_rolling_stats (
+                date TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                mentions_ma7 REAL,
+                mentions_ma30 REAL,
+                score_ma7 REAL,
+                score_ma30 REAL,
+                mentions_ewma REAL,
+                mentions_ewmvar REAL,
+                spike_z REAL,
+                days_tracked INTEGER,
+                PRIMARY KEY (date, ticker)
+            ) WITHOUT ROWID
+        ''')
+        
+        # A random ID naming this database in the web export manifest, so an
+        # export written from another database is never patched incrementally,
+        # and a counter of daily_ticker_summary changes
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS db_meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO db_meta VALUES ('database_id', lower(hex(randomblob(16))))")
+        conn.execute("INSERT OR IGNORE INTO db_meta VALUES ('summary_version', 0)")
+        
+        # Each month of daily_ticker_summary with the counter value of its
+        # latest change, kept by the triggers below. Web exports record the
+        # versions they wrote, so every export directory is patched on its own.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS export_months (
+                month TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        for event, rows in [('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])]:
+            marks = ' '.join(f'''
+                INSERT INTO export_months VALUES (
+                    substr({row}.date, 1, 7), (SELECT value FROM db_meta WHERE name = 'summary_version')
+                ) ON CONFLICT (month) DO UPDATE SET version = excluded.version;''' for row in rows)
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS daily_ticker_summary_version_{event.lower()}
+                AFTER {event} ON daily_ticker_summary
+                BEGIN
+                    UPDATE db_meta SET value = value + 1 WHERE name = 'summary_version';{marks}
+                END
+            ''')
+        
+        self._migrate(conn)
+        
+        # Optional full-text index, see search_posts
+        has_search = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_search'"
+        ).fetchone()
+        if self.search and not has_search:
+            self._create_search_index(conn)
+        elif has_search and conn.execute("SELECT 1 FROM db_meta WHERE name = 'search_stale'").fetchone():
+            print("Rebuilding the full-text index after an interrupted bulk load...")
+            self._finish_search_load(conn)
+        self.search = bool(self.search or has_search)
+        
         conn.commit()
-        conn.close()
         print(f"Database initialized: {self.db_path}")
     
+    # Columns added after the original schema, as (table, column, type)
+    ADDED_COLUMNS = [
+        ('stock_mentions', 'mentioned_in_post', 'INTEGER'),
+        ('stock_mentions', 'attributed_comments', 'INTEGER'),
+        ('stock_mentions', 'attributed_score', 'REAL'),
+        ('stock_mentions', 'comment_indices', 'BLOB'),
+        ('daily_ticker_summary', 'attributed_comments', 'INTEGER'),
+        ('daily_ticker_summary', 'avg_attributed_score', 'REAL'),
+        ('posts_raw', 'reddit_id', 'TEXT'),
+        ('posts_raw', 'comment_ids', 'TEXT'),
+    ]
+    
+    # Secondary indexes, as (name, table, columns). The date index also
+    # carries the columns the daily summary reads, so that query never
+    # touches the stock_mentions table itself.
+    INDEXES = [
+        ('idx_stock_mentions_date', 'stock_mentions',
+         'date, post_id, ticker, attributed_comments, attributed_score'),
+        ('idx_stock_mentions_ticker_date', 'stock_mentions', 'ticker, date'),
+        ('idx_daily_ticker_summary_ticker_date', 'daily_ticker_summary', 'ticker, date'),
+        ('idx_posts_raw_date', 'posts_raw', 'date'),
+    ]
+    
+    # Natural keys, as (name, table, columns): a Reddit post is stored once,
+    # with one mention per ticker it mentions
+    UNIQUE_INDEXES = [
+        ('idx_posts_raw_reddit_id', 'posts_raw', 'reddit_id'),
+        ('idx_stock_mentions_post_ticker', 'stock_mentions', 'post_id, ticker'),
+    ]
+    
+    def _migrate(self, conn):
+        """Bring databases created by older versions up to the current schema"""
+        for table, column, column_type in self.ADDED_COLUMNS:
+            existing = {info[1] for info in conn.execute(f'PRAGMA table_info({table})')}
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+        for name, table, columns in self.INDEXES:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+        
+        # Databases from before posts were keyed on their Reddit ID hold
+        # duplicates that would break the unique indexes
+        keyed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_posts_raw_reddit_id'"
+        ).fetchone()
+        if not keyed:
+            self._deduplicate(conn)
+        for name, table, columns in self.UNIQUE_INDEXES:
+            conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+        
+        # Summaries aggregated in pandas stored some numpy counts as 8-byte
+        # BLOBs; recompute those dates from their mentions
+        stale_dates = [row[0] for row in conn.execute('''
+            SELECT DISTINCT date FROM daily_ticker_summary d
+            WHERE (typeof(total_comments) = 'blob' OR typeof(sentiment_positive) = 'blob')
+              AND EXISTS (SELECT 1 FROM stock_mentions WHERE date = d.date)
+        ''')]
+        for date in stale_dates:
+            self._save_daily_summaries(conn, date, date, rolling=False)
+        if stale_dates:
+            self._save_rolling_stats(conn, min(stale_dates))
+        
+        # Summaries stored before export_months was kept
+        if not conn.execute('SELECT 1 FROM export_months LIMIT 1').fetchone():
+            conn.execute('INSERT INTO export_months SELECT DISTINCT substr(date, 1, 7), 0 FROM daily_ticker_summary')
+        
+        # Summaries stored before the rollups were kept
+        table, _ = self.ROLLUPS['monthly']
+        if not conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone():
+            first, last = conn.execute('SELECT MIN(date), MAX(date) FROM daily_ticker_summary').fetchone()
+            if first is not None:
+                self._save_rollups(conn, first, last)
+        
+        # Summaries stored before the rolling statistics were kept
+        if not conn.execute('SELECT 1 FROM ticker_rolling_stats LIMIT 1').fetchone():
+            first = conn.execute('SELECT MIN(date) FROM daily_ticker_summary').fetchone()[0]
+            if first is not None:
+                self._save_rolling_stats(conn, first)
+    
+    def _deduplicate(self, conn):
+        """
+        Fill in posts_raw.reddit_id from the post URLs, then keep one row
+        per Reddit post (the one with the most comments analyzed, else the
+        latest) and one mention per post and ticker
+        """
+        rows = conn.execute('SELECT id, url FROM posts_raw WHERE reddit_id IS NULL').fetchall()
+        conn.executemany('UPDATE posts_raw SET reddit_id = ? WHERE id = ?',
+                         [(_reddit_id(None, url), post_id) for post_id, url in rows])
+        
+        conn.execute('''
+            CREATE TEMP TABLE duplicate_posts AS
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY reddit_id ORDER BY COALESCE(num_comments_analyzed, 0) DESC, id DESC
+                ) AS copy
+                FROM posts_raw WHERE reddit_id IS NOT NULL
+            )
+            WHERE copy > 1
+        ''')
+        conn.execute('''
+            CREATE TEMP TABLE duplicate_mentions AS
+            SELECT id, date FROM stock_mentions
+            WHERE post_id IN (SELECT id FROM duplicate_posts)
+               OR id NOT IN (SELECT MAX(id) FROM stock_mentions GROUP BY post_id, ticker)
+        ''')
+        
+        dates = [row[0] for row in conn.execute('SELECT DISTINCT date FROM duplicate_mentions')]
+        post_count = conn.execute('SELECT COUNT(*) FROM duplicate_posts').fetchone()[0]
+        conn.execute('DELETE FROM stock_mentions WHERE id IN (SELECT id FROM duplicate_mentions)')
+        conn.execute('DELETE FROM posts_raw WHERE id IN (SELECT id FROM duplicate_posts)')
+        conn.execute('DROP TABLE duplicate_posts')
+        conn.execute('DROP TABLE duplicate_mentions')
+        for date in dates:
+            self._save_daily_summaries(conn, date, date, rolling=False)
+        if dates:
+            self._save_rolling_stats(conn, min(dates))
+        if post_count:
+            print(f"Removed {post_count} duplicate posts; recomputed {len(dates)} daily summaries")
+    
+    # One row per (date, ticker) mentioned in the date range. The subreddit
+    # breakdown is grouped separately and joined back on (date, ticker).
+    DAILY_SUMMARY_QUERY = '''
+        INSERT INTO daily_ticker_summary
+        (date, ticker, mention_count, total_posts, total_comments,
+         avg_post_score, avg_comment_score, avg_overall_score,
+         sentiment_positive, sentiment_negative, sentiment_neutral,
+         subreddit_breakdown, attributed_comments, avg_attributed_score)
+        WITH mentions AS MATERIALIZED (
+            SELECT sm.date, sm.ticker, sm.attributed_comments, sm.attributed_score,
+                   pr.subreddit, pr.overall_sentiment, pr.post_score, pr.comment_score,
+                   pr.overall_score, pr.num_comments_analyzed
+            FROM stock_mentions sm
+            JOIN posts_raw pr ON sm.post_id = pr.id
+            WHERE sm.date BETWEEN ?1 AND ?2
+        ),
+        subreddits AS (
+            SELECT date, ticker, json_group_object(subreddit, posts) AS breakdown
+            FROM (
+                SELECT date, ticker, subreddit, COUNT(*) AS posts
+                FROM mentions
+                WHERE subreddit IS NOT NULL
+                GROUP BY date, ticker, subreddit
+            )
+            GROUP BY date, ticker
+        )
+        SELECT m.date, m.ticker, COUNT(*), COUNT(*), COALESCE(SUM(m.num_comments_analyzed), 0),
+               ROUND(AVG(m.post_score), 2), ROUND(AVG(m.comment_score), 2), ROUND(AVG(m.overall_score), 2),
+               SUM(m.overall_sentiment = 'positive'), SUM(m.overall_sentiment = 'negative'),
+               SUM(m.overall_sentiment = 'neutral'), COALESCE(s.breakdown, '{}'),
+               COALESCE(SUM(m.attributed_comments), 0), ROUND(AVG(m.attributed_score), 2)
+        FROM mentions m
+        LEFT JOIN subreddits s ON s.date = m.date AND s.ticker = m.ticker
+        GROUP BY m.date, m.ticker
+    '''
+    
+    # Rollup tiers of daily_ticker_summary, as tier: (table, SQL expression
+    # of a date's period start)
+    ROLLUPS = {
+        'weekly': ('weekly_ticker_summary', "date(date, '-6 days', 'weekday 1')"),
+        'monthly': ('monthly_ticker_summary', "substr(date, 1, 8) || '01'"),
+    }
+    
+    # One row per (period, ticker) from the daily summaries of whole periods.
+    # Averages are weighted by the days' mention counts.
+    ROLLUP_QUERY = '''
+        INSERT INTO {table}
+        (period, ticker, days, mention_count, total_comments, avg_post_score,
+         avg_comment_score, avg_overall_score, sentiment_positive, sentiment_negative,
+         sentiment_neutral, attributed_comments, avg_attributed_score)
+        SELECT {period} AS period, ticker, COUNT(*), SUM(mention_count), SUM(total_comments),
+               {weighted_post}, {weighted_comment}, {weighted_overall},
+               SUM(sentiment_positive), SUM(sentiment_negative), SUM(sentiment_neutral),
+               SUM(attributed_comments), {weighted_attributed}
+        FROM daily_ticker_summary
+        WHERE date BETWEEN ? AND ?
+        GROUP BY period, ticker
+    '''
+    
+    # Moving average windows of ticker_rolling_stats in days, the span of its
+    # mention EWMA (alpha = 2 / (span + 1)), and the days a ticker is tracked
+    # before its spike z-score is reported
+    ROLLING_WINDOWS = (7, 30)
+    SPIKE_SPAN = 30
+    SPIKE_MIN_DAYS = 7
+    
+    TICKER_HISTORY_QUERY = '''
+        SELECT * FROM daily_ticker_summary 
+        WHERE ticker = ? 
+        ORDER BY date DESC 
+        LIMIT ?
+    '''
+    
+    LATEST_ENGAGEMENT_QUERY = '''
+        SELECT 
+            ticker, 
+            avg_overall_score, 
+            CAST(total_comments AS INTEGER) as total_comments, 
+            mention_count 
+        FROM daily_ticker_summary 
+        WHERE date = (SELECT MAX(date) FROM daily_ticker_summary) 
+        ORDER BY mention_count DESC
+    '''
+    
+    # The rolling statistics of a date (NULL for the latest), busiest first
+    ROLLING_STATS_QUERY = '''
+        SELECT date, ticker, mentions_ma7, mentions_ma30, score_ma7, score_ma30, spike_z
+        FROM ticker_rolling_stats
+        WHERE date = COALESCE(?, (SELECT MAX(date) FROM ticker_rolling_stats))
+        ORDER BY mentions_ma30 DESC, ticker
+    '''
+    
+    WEB_SHARD_QUERY = '''
+        SELECT date, ticker, avg_overall_score, mention_count
+        FROM daily_ticker_summary
+        WHERE date BETWEEN ? AND ?
+        ORDER BY date, ticker
+    '''
+    
+    # Months whose daily summaries have expired are exported from a rollup,
+    # one point per period, with mentions per day the ticker was mentioned
+    # so they stay on the daily scale
+    WEB_ROLLUP_SHARD_QUERY = '''
+        SELECT period, ticker, avg_overall_score, ROUND(1.0 * mention_count / days, 2)
+        FROM {table}
+        WHERE period BETWEEN ? AND ?
+        ORDER BY period, ticker
+    '''
+    
+    # Each month's shard is read from the first of these tiers holding it
+    WEB_SHARD_QUERIES = {
+        'daily': WEB_SHARD_QUERY,
+        'weekly': WEB_ROLLUP_SHARD_QUERY.format(table='weekly_ticker_summary'),
+        'monthly': WEB_ROLLUP_SHARD_QUERY.format(table='monthly_ticker_summary'),
+    }
+    
+    # Comments of the posts stored for a date range, optionally only those
+    # of posts mentioning a ticker (?3 NULL for all)
+    COMMENTS_QUERY = '''
+        SELECT post_id, position, created_utc, score
+        FROM comments
+        WHERE date BETWEEN ?1 AND ?2
+          AND (?3 IS NULL OR post_id IN (
+              SELECT post_id FROM stock_mentions WHERE ticker = ?3 AND date BETWEEN ?1 AND ?2
+          ))
+        ORDER BY date, post_id, position
+    '''
+    
+    # Per-comment score statistics by day and ticker, over the comments of
+    # the posts mentioning each ticker. Comments are totalled per post first,
+    # so only one row per post is joined to its mentions. Takes the positive
+    # and negative score thresholds, then the date range.
+    COMMENT_STATS_QUERY = '''
+        WITH posts AS (
+            SELECT date, post_id, COUNT(*) AS comments, COUNT(score) AS scored,
+                   SUM(score) AS total, SUM(score * score) AS squares, MIN(score) AS low, MAX(score) AS high,
+                   SUM(score >= ?) AS positive, SUM(score <= ?) AS negative
+            FROM comments
+            WHERE date BETWEEN ? AND ?
+            GROUP BY date, post_id
+        )
+        SELECT p.date, sm.ticker, SUM(p.comments) AS comments, SUM(p.scored) AS scored_comments,
+               ROUND(SUM(p.total) / SUM(p.scored), 2) AS avg_score, MIN(p.low) AS min_score, MAX(p.high) AS max_score,
+               ROUND(SUM(p.squares) / SUM(p.scored) - (SUM(p.total) / SUM(p.scored)) * (SUM(p.total) / SUM(p.scored)), 2)
+                   AS score_variance,
+               SUM(p.positive) AS positive, SUM(p.negative) AS negative
+        FROM posts p
+        JOIN stock_mentions sm ON sm.post_id = p.post_id
+        GROUP BY p.date, sm.ticker
+        ORDER BY p.date, sm.ticker
+    '''
+    
     def save_daily_data(self, df, date=None):
         """Save processed data to database"""
-        conn = sqlite3.connect(self.db_path)
         if date is None:
             date = datetime.now().strftime('%Y-%m-%d')
         
-        # Save to all 3 tables within a single transaction
-        self._save_posts_raw(df, conn, date)
-        self._save_daily_summary(df, conn, date)
+        # Save to all 3 tables within a single transaction, refreshing the
+        # summaries of earlier dates whose posts were updated too
+        with self._write_transaction() as conn:
+            self._save_summaries_of(conn, self._save_posts_raw(df, conn, date) | {date})
+        print(f"Data saved to database for {date}")
+    
+    def append_posts(self, df, date=None):
+        """
+        Save one batch of posts and their mentions without touching the
+        daily summary. df is a DataFrame or a dict of equal-length column
+        lists (see archive.iter_archive_columns). Returns the dates whose
+        summaries need a refresh.
+        """
+        if date is None:
+            date = datetime.now().strftime('%Y-%m-%d')
+        
+        with self._write_transaction() as conn:
+            return self._save_posts_raw(df, conn, date)
+    
+    def refresh_daily_summary(self, date=None, end_date=None):
+        """
+        Recompute daily_ticker_summary for a date from the stored posts and
+        mentions, or for every date through end_date (e.g. after a backfill)
+        """
+        if date is None:
+            date = datetime.now().strftime('%Y-%m-%d')
+        
+        with self._write_transaction() as conn:
+            self._save_daily_summaries(conn, date, end_date or date)
+    
+    def refresh_daily_summaries(self, dates):
+        """
+        Recompute daily_ticker_summary for each of dates (e.g. the ones
+        append_posts returned) in one transaction. Unlike a
+        refresh_daily_summary call per date, the rolling statistics are
+        recomputed once, from the earliest date.
+        """
+        if not dates:
+            return
+        with self._write_transaction() as conn:
+            self._save_summaries_of(conn, dates)
+    
+    # Days each tier is kept, see apply_retention; monthly rollups are kept
+    # for good. A tier is always kept at least as long as the finer ones.
+    RETENTION_DAYS = {'raw': 180, 'daily': 730, 'weekly': 1826}
+    
+    # Free pages incremental_vacuum returns to the OS per apply_retention
+    # call (16 MiB of 4 KiB pages), so no run pays for compacting everything
+    VACUUM_PAGES = 4096
+    
+    def apply_retention(self, retention=None, archive_dir=None, today=None, vacuum_pages=VACUUM_PAGES):
+        """
+        Expire what each tier keeps past its retention in days (retention
+        overrides RETENTION_DAYS; None keeps a tier for good):
+        
+        - raw posts, with their mentions, comments and search documents, are
+          written to the columnar archive and deleted; their daily summaries stay
+        - daily summaries (with their rolling statistics) of whole months and
+          weekly rollups of whole months are deleted, as the coarser rollups
+          hold them
+        
+        then frees up to vacuum_pages pages of the database file (None for
+        all). Returns the number of rows deleted per tier.
+        """
+        from archive import ARCHIVE_DIR
+        
+        retention = {**self.RETENTION_DAYS, **(retention or {})}
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        cutoffs = {}
+        kept = 0
+        for tier in ('raw', 'daily', 'weekly'):
+            if retention[tier] is None:
+                break
+            kept = max(kept, retention[tier])
+            cutoff = datetime.strptime(today, '%Y-%m-%d') - timedelta(days=kept)
+            cutoffs[tier] = cutoff.strftime('%Y-%m-%d' if tier == 'raw' else '%Y-%m-01')
+        
+        deleted = {}
+        with self._write_transaction() as conn:
+            if 'raw' in cutoffs:
+                deleted['raw'] = self._expire_posts(conn, cutoffs['raw'], archive_dir or ARCHIVE_DIR)
+            # Months exported from the expired rows are re-exported from the
+            # next tier. The triggers mark the months of daily rows; a week is
+            # exported with the month it starts in, which may hold no days.
+            weekly, _ = self.ROLLUPS['weekly']
+            if 'daily' in cutoffs:
+                _raise_horizon(conn, 'daily_horizon', cutoffs['daily'])
+                deleted['daily'] = conn.execute('DELETE FROM daily_ticker_summary WHERE date < ?',
+                                                (cutoffs['daily'],)).rowcount
+                conn.execute('DELETE FROM ticker_rolling_stats WHERE date < ?', (cutoffs['daily'],))
+                if deleted['daily']:
+                    _mark_export_months(conn, f'SELECT substr(period, 1, 7) FROM {weekly} WHERE period < ?',
+                                        (cutoffs['daily'],))
+            if 'weekly' in cutoffs:
+                _mark_export_months(conn, f'SELECT substr(period, 1, 7) FROM {weekly} WHERE period < ?',
+                                    (cutoffs['weekly'],))
+                deleted['weekly'] = conn.execute(f'DELETE FROM {weekly} WHERE period < ?',
+                                                 (cutoffs['weekly'],)).rowcount
+        
+        freed = self._incremental_vacuum(vacuum_pages)
+        print("Retention: " + ', '.join(f"{count} {tier} rows before {cutoffs[tier]}" for tier, count in deleted.items())
+              + f" expired; freed {freed} pages")
+        return deleted
+    
+    def _expire_posts(self, conn, cutoff, archive_dir):
+        """Archive the posts stored before cutoff, then delete them; returns how many there were"""
+        from archive import ArchiveWriter
+        import pandas as pd
+        
+        conn.execute('DROP TABLE IF EXISTS temp.expired_posts')
+        conn.execute('CREATE TEMP TABLE expired_posts AS SELECT id FROM posts_raw WHERE date < ?', (cutoff,))
+        snapshots = self._post_snapshots(conn, cutoff)
+        if not snapshots:
+            conn.execute('DROP TABLE temp.expired_posts')
+            return 0
         
-        # Commit all changes at the very end
+        # Written before the rows are deleted; replaying a snapshot that was
+        # archived but not deleted is harmless, as posts are upserted
+        run_time = datetime.now()
+        for date, df in pd.DataFrame(snapshots).groupby('date', sort=True):
+            with ArchiveWriter(date, archive_dir, run_time, kind='expired') as writer:
+                writer.write(df.drop(columns='date'))
+        
+        if self.search:
+            documents = f'''
+                SELECT d.id, d.text FROM expired_posts e
+                JOIN search_documents d ON d.id BETWEEN e.id * {self.SEARCH_ROWID_SCALE}
+                                                    AND (e.id + 1) * {self.SEARCH_ROWID_SCALE} - 1
+            '''
+            conn.execute(f"INSERT INTO post_search (post_search, rowid, text) SELECT 'delete', id, text FROM ({documents})")
+            conn.execute(f'DELETE FROM search_documents WHERE id IN (SELECT id FROM ({documents}))')
+        conn.execute('DELETE FROM comments WHERE date < ?', (cutoff,))
+        conn.execute('DELETE FROM stock_mentions WHERE post_id IN (SELECT id FROM expired_posts)')
+        conn.execute('DELETE FROM posts_raw WHERE id IN (SELECT id FROM expired_posts)')
+        conn.execute('DROP TABLE temp.expired_posts')
+        _raise_horizon(conn, 'raw_horizon', cutoff)
+        return len(snapshots)
+    
+    def _post_snapshots(self, conn, cutoff):
+        """
+        The posts in expired_posts as archive records (plus their date), so
+        replaying them rebuilds the posts, their mentions and comments
+        """
+        posts = {}
+        for post_id, date, reddit_id, comment_ids, *values in conn.execute(f'''
+            SELECT id, date, reddit_id, comment_ids, {', '.join(self.POST_COLUMNS)}
+            FROM posts_raw WHERE id IN (SELECT id FROM expired_posts) ORDER BY id
+        '''):
+            posts[post_id] = {
+                'date': date, 'post_id': reddit_id, **dict(zip(self.POST_COLUMNS, values)), 'is_new_post': True,
+                'comment_ids': None if comment_ids is None else json.loads(comment_ids),
+                'comment_times': [], 'comment_word_scores': [], 'comments': [],
+                'mentioned_tickers': [], 'ticker_comments': {},
+            }
+        for post_id, created_utc, score in conn.execute(
+            'SELECT post_id, created_utc, score FROM comments WHERE date < ? ORDER BY date, post_id, position', (cutoff,)
+        ):
+            posts[post_id]['comment_times'].append(created_utc)
+            posts[post_id]['comment_word_scores'].append(score)
+        for post_id, ticker, comment_indices in conn.execute('''
+            SELECT post_id, ticker, comment_indices FROM stock_mentions
+            WHERE post_id IN (SELECT id FROM expired_posts) ORDER BY id
+        '''):
+            posts[post_id]['mentioned_tickers'].append(ticker)
+            if comment_indices is not None:
+                posts[post_id]['ticker_comments'][ticker] = unpack_comment_indices(comment_indices).tolist()
+        if self.search:
+            scale = self.SEARCH_ROWID_SCALE
+            for document_id, text in conn.execute(f'''
+                SELECT d.id, d.text FROM expired_posts e
+                JOIN search_documents d ON d.id BETWEEN e.id * {scale} + 1 AND (e.id + 1) * {scale} - 1
+                ORDER BY d.id
+            '''):
+                posts[document_id // scale]['comments'].append(text)
+        
+        for post in posts.values():
+            # Times are all known or not at all, as for IDs; texts are only kept
+            # by the search index, which skips empty comments
+            if None in post['comment_times']:
+                post['comment_times'] = None
+            if len(post['comments']) != len(post['comment_word_scores']):
+                post['comments'] = None
+        return list(posts.values())
+    
+    def _incremental_vacuum(self, pages):
+        """
+        Return up to pages free pages (None for all) to the OS. Databases
+        created without auto_vacuum are converted by one full VACUUM first.
+        """
+        conn = self.conn
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            print("Converting the database to incremental vacuum (one full VACUUM)...")
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            return free
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # Each step of the pragma frees one page, and executescript runs it to the end
+        conn.executescript(f'PRAGMA incremental_vacuum({pages if pages is not None else 0})')
+        # The file only shrinks once the WAL is checkpointed
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+    
+    @contextmanager
+    def _write_transaction(self):
+        """
+        Hold the write lock from the start (BEGIN IMMEDIATE), so no other
+        writer can take posts_raw IDs between reserving and using them.
+        Commits on success and rolls back on error.
+        """
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
         conn.commit()
-        conn.close()
-        print(f"Data saved to database for {date}")
+    
+    # Inserts a new post's comments from JSON arrays of their IDs, creation
+    # times and scores: (date, post_id, ids, times, scores). Rebuilds write
+    # several comments per post, and binding three arrays instead of six
+    # parameters per comment roughly halves the cost of the comments insert.
+    COMMENT_ARRAYS_INSERT = '''
+        INSERT INTO comments (date, post_id, position, comment_id, created_utc, score)
+        SELECT ?, ?, key, ? ->> key, ? ->> key, value FROM json_each(?) WHERE true
+        ON CONFLICT(date, post_id, position) DO UPDATE SET
+            comment_id = excluded.comment_id,
+            created_utc = excluded.created_utc,
+            score = excluded.score
+    '''
     
     def _save_posts_raw(self, df, conn, date):
-        """Save posts to posts_raw table (one row per post)"""
-        for _, row in df.iterrows():
-            cursor = conn.execute('''
-                INSERT INTO posts_raw 
-                (date, subreddit, post_title, post_content, post_author, post_score,
-                 num_comments, post_sentiment, post_word_score, comment_sentiment,
-                 comment_score, overall_sentiment, overall_score, num_comments_analyzed, url)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                date,
-                row['subreddit'],
-                row['post_title'],
-                row['post_content'],
-                row['post_author'],
-                row['post_score'],
-                row['num_comments'],
-                row['post_sentiment'],
-                row['post_word_score'],
-                row['comment_sentiment'],
-                row['comment_score'],
-                row['overall_sentiment'],
-                row['overall_score'],
-                row['num_comments_analyzed'],
-                row['url']
-            ))
+        """
+        Upsert posts into posts_raw (one row per Reddit post), their
+        stock_mentions and comments. Stored posts are only rewritten when they changed,
+        so reruns over the same data write nothing; incremental rows
+        (is_new_post False) add their new comments to the stored post.
+        Returns the dates whose daily summaries the changes affect.
+        """
+        if not _row_count(df):
+            return set()
+        
+        records = _post_records(df, self.POST_COLUMNS, texts=self.search)
+        
+        # Only posts already stored, or repeated within the batch, are diffed
+        # against their stored state; new posts (all of them on a rebuild)
+        # go straight to the inserts
+        batch_ids = Counter(record['reddit_id'] for record in records if record['reddit_id'] is not None)
+        stored = self._stored_posts(conn, self._existing_reddit_ids(conn, batch_ids))
+        diffed = stored.keys() | {reddit_id for reddit_id, count in batch_ids.items() if count > 1}
+        
+        # Reserve a contiguous block of IDs for new posts and insert them
+        # explicitly, so mentions can be linked without a lastrowid round trip
+        # per post. Requires the write lock, which _write_transaction holds.
+        next_id = conn.execute('''
+            SELECT MAX(
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'posts_raw'), 0),
+                COALESCE((SELECT MAX(id) FROM posts_raw), 0)
+            ) + 1
+        ''').fetchone()[0]
+        
+        score_index = self.POST_COLUMNS.index('post_score')
+        post_rows, mention_rows, comment_rows, comment_arrays, new_posts = [], [], [], [], []
+        changed = {}
+        for record in records:
+            if record['reddit_id'] not in diffed:
+                # A new post: its rows are built here in one pass
+                post_id, values = next_id, record['values']
+                next_id += 1
+                comment_ids = _json_list(record['comment_ids'])
+                post_rows.append((post_id, date) + values + (record['reddit_id'], comment_ids))
+                post_score = values[score_index]
+                mention_rows.extend(
+                    (post_id, ticker, date) + _attribution(record['ticker_comments'].get(ticker), post_score,
+                                                           record['comment_scores'])
+                    for ticker in record['tickers']
+                )
+                if record['comment_scores']:
+                    comment_arrays.append((date, post_id) + _comment_arrays(record, comment_ids))
+                if self.search:
+                    new_posts.append({'id': post_id, 'values': values, 'replaces_comments': True,
+                                      'comments': [(i, None, text) for i, text in enumerate(_comment_texts(record))]})
+                continue
             
-            # Get the post_id for stock_mentions table
-            post_id = cursor.lastrowid
+            post = stored.get(record['reddit_id'])
+            if post is None:
+                post = {'id': next_id, 'date': date, 'reddit_id': record['reddit_id'], 'values': None,
+                        'comment_ids': None, 'mentions': {}, 'stored_tickers': set()}
+                next_id += 1
+                if record['reddit_id'] is not None:
+                    stored[record['reddit_id']] = post
             
-            # Handle mentioned_tickers (it's a list)
-            mentioned_tickers = row['mentioned_tickers']
-            if isinstance(mentioned_tickers, list) and mentioned_tickers:
-                for ticker in mentioned_tickers:
-                    conn.execute('''
-                        INSERT INTO stock_mentions (post_id, ticker, date)
-                        VALUES (?, ?, ?)
-                    ''', (post_id, ticker, date))
-            elif isinstance(mentioned_tickers, str) and mentioned_tickers and mentioned_tickers != '[]':
-                try:
-                    tickers = ast.literal_eval(mentioned_tickers)
-                    if isinstance(tickers, list):
-                        for ticker in tickers:
-                            conn.execute('''
-                                INSERT INTO stock_mentions (post_id, ticker, date)
-                                VALUES (?, ?, ?)
-                            ''', (post_id, ticker, date))
-                except:
-                    # If it's a single ticker as string
-                    conn.execute('''
-                        INSERT INTO stock_mentions (post_id, ticker, date)
-                        VALUES (?, ?, ?)
-                    ''', (post_id, mentioned_tickers, date))
+            if record['is_delta'] and post['values'] is not None:
+                update = _merge_delta(post, record)
+                replaces_comments = False
+            else:
+                update = _full_post(record)
+                replaces_comments = True
+            if update is not None and update[:3] != (post['values'], post['comment_ids'], post['mentions']):
+                post['values'], post['comment_ids'], post['mentions'], post['comments'] = update
+                post['replaces_comments'] = replaces_comments
+                changed[post['id']] = post
+        
+        dates = {post['date'] for post in changed.values()} | ({date} if post_rows else set())
+        post_rows.extend(
+            (post['id'], post['date']) + post['values'] + (post['reddit_id'], _json_list(post['comment_ids']))
+            for post in changed.values()
+        )
+        mention_rows.extend(
+            (post['id'], ticker, post['date']) + attribution
+            for post in changed.values()
+            for ticker, attribution in post['mentions'].items()
+        )
+        comment_rows.extend(
+            (post['date'], post['id'], position) + comment
+            for post in changed.values()
+            for position, comment, _ in post['comments']
+        )
         
+        _insert_rows(conn, '''
+            INSERT INTO posts_raw 
+            (id, date, subreddit, post_title, post_content, post_author, post_score,
+             num_comments, post_sentiment, post_word_score, comment_sentiment,
+             comment_score, overall_sentiment, overall_score, num_comments_analyzed, url,
+             reddit_id, comment_ids)
+        ''', f'''
+            ON CONFLICT(reddit_id) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in self.POST_COLUMNS)},
+                comment_ids = excluded.comment_ids
+        ''', post_rows)
+        
+        _insert_rows(conn, '''
+            INSERT INTO stock_mentions
+            (post_id, ticker, date, mentioned_in_post, attributed_comments,
+             attributed_score, comment_indices)
+        ''', '''
+            ON CONFLICT(post_id, ticker) DO UPDATE SET
+                date = excluded.date,
+                mentioned_in_post = excluded.mentioned_in_post,
+                attributed_comments = excluded.attributed_comments,
+                attributed_score = excluded.attributed_score,
+                comment_indices = excluded.comment_indices
+        ''', mention_rows)
+        
+        # Tickers a rewritten post no longer mentions
+        conn.executemany('DELETE FROM stock_mentions WHERE post_id = ? AND ticker = ?', [
+            (post['id'], ticker)
+            for post in changed.values()
+            for ticker in post['stored_tickers'] - post['mentions'].keys()
+        ])
+        for post in changed.values():
+            post['stored_tickers'] = set(post['mentions'])
+        
+        # A full rewrite replaces all of a post's comments; a delta's new
+        # comments are numbered after the stored ones
+        conn.executemany('DELETE FROM comments WHERE date = ? AND post_id = ? AND position >= ?', [
+            (post['date'], post['id'], len(post['comments']))
+            for post in changed.values() if post['replaces_comments']
+        ])
+        _insert_rows(conn, 'INSERT INTO comments (date, post_id, position, comment_id, created_utc, score)', '''
+            ON CONFLICT(date, post_id, position) DO UPDATE SET
+                comment_id = excluded.comment_id,
+                created_utc = excluded.created_utc,
+                score = excluded.score
+        ''', comment_rows)
+        conn.executemany(self.COMMENT_ARRAYS_INSERT, comment_arrays)
+        
+        if self.search:
+            self._save_search_documents(conn, new_posts + list(changed.values()))
+        
+        return dates
+    
+    def _existing_reddit_ids(self, conn, reddit_ids):
+        """The Reddit IDs among reddit_ids that posts_raw already holds"""
+        reddit_ids = list(reddit_ids)
+        existing = set()
+        for i in range(0, len(reddit_ids), self.LOOKUP_BATCH_SIZE):
+            batch = reddit_ids[i:i + self.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            existing.update(reddit_id for reddit_id, in conn.execute(
+                f'SELECT reddit_id FROM posts_raw WHERE reddit_id IN ({placeholders})', batch
+            ))
+        return existing
+    
+    def _stored_posts(self, conn, reddit_ids):
+        """
+        The stored state of the posts among reddit_ids, as
+        {reddit_id: {'id', 'date', 'reddit_id', 'values', 'comment_ids',
+        'mentions', 'stored_tickers'}}, where values follow POST_COLUMNS
+        and mentions map each ticker to its attribution columns
+        """
+        reddit_ids = list(reddit_ids)
+        posts = {}
+        by_id = {}
+        for i in range(0, len(reddit_ids), self.LOOKUP_BATCH_SIZE):
+            batch = reddit_ids[i:i + self.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(f'''
+                SELECT id, date, reddit_id, comment_ids, {', '.join(self.POST_COLUMNS)}
+                FROM posts_raw WHERE reddit_id IN ({placeholders})
+            ''', batch)
+            for post_id, date, reddit_id, comment_ids, *values in rows:
+                post = {'id': post_id, 'date': date, 'reddit_id': reddit_id, 'values': tuple(values),
+                        'comment_ids': None if comment_ids is None else json.loads(comment_ids),
+                        'mentions': {}, 'stored_tickers': set()}
+                posts[reddit_id] = by_id[post_id] = post
+        
+        post_ids = list(by_id)
+        for i in range(0, len(post_ids), self.LOOKUP_BATCH_SIZE):
+            batch = post_ids[i:i + self.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(f'''
+                SELECT post_id, ticker, mentioned_in_post, attributed_comments, attributed_score, comment_indices
+                FROM stock_mentions WHERE post_id IN ({placeholders})
+            ''', batch)
+            for post_id, ticker, *attribution in rows:
+                by_id[post_id]['mentions'][ticker] = tuple(attribution)
+                by_id[post_id]['stored_tickers'].add(ticker)
+        return posts
+    
+    def _save_search_documents(self, conn, posts):
+        """
+        Rewrite the full-text documents of changed posts: all of a post's
+        documents on a full rewrite, else the post's own and its new comments.
+        The index is updated here rather than by triggers on search_documents,
+        as FTS5 inserts from a trigger run several times slower.
+        """
+        scale = self.SEARCH_ROWID_SCALE
+        title, content = self.POST_COLUMNS.index('post_title'), self.POST_COLUMNS.index('post_content')
+        ranges = [
+            (post['id'] * scale, post['id'] * scale + (scale - 1 if post['replaces_comments'] else 0))
+            for post in posts
+        ]
+        if not self._search_deferred:
+            # External content is removed from the index by its old text
+            conn.executemany('''
+                INSERT INTO post_search (post_search, rowid, text)
+                SELECT 'delete', id, text FROM search_documents WHERE id BETWEEN ? AND ?
+            ''', ranges)
+        conn.executemany('DELETE FROM search_documents WHERE id BETWEEN ? AND ?', ranges)
+        documents = []
+        for post in posts:
+            documents.append((post['id'] * scale, _post_text(post['values'][title], post['values'][content])))
+            documents.extend((post['id'] * scale + 1 + position, text)
+                             for position, _, text in post['comments'] if text)
+        conn.executemany('INSERT INTO search_documents (id, text) VALUES (?, ?)', documents)
+        if not self._search_deferred:
+            conn.executemany('INSERT INTO post_search (rowid, text) VALUES (?, ?)', documents)
+    
     def _save_stock_mentions(self, df, conn, date):
         """Stock mentions are saved in _save_posts_raw to get proper post_id"""
         pass  # This is handled in _save_posts_raw
     
-    def _save_daily_summary(self, df, conn, date):
-        """Save aggregated daily summary by ticker"""
-        # First, delete existing summary for this date to avoid duplicates
-        conn.execute('DELETE FROM daily_ticker_summary WHERE date = ?', (date,))
-
-        # Get all stock mentions for today
-        mentions_query = '''
-            SELECT sm.ticker, pr.subreddit, pr.post_sentiment, pr.comment_sentiment, 
-                   pr.overall_sentiment, pr.post_score, pr.comment_score, pr.overall_score,
-                   pr.num_comments_analyzed
-            FROM stock_mentions sm
-            JOIN posts_raw pr ON sm.post_id = pr.id
-            WHERE sm.date = ?
-        '''
+    def _save_daily_summaries(self, conn, start_date, end_date, rolling=True):
+        """
+        Recompute daily_ticker_summary for every date from start_date through
+        end_date, the rollups of their periods, and unless rolling is False
+        (for callers refreshing several ranges) the rolling statistics from
+        start_date on. Dates whose posts have expired (see apply_retention)
+        keep their summaries.
+        """
+        start_date = max(start_date, _meta(conn, 'raw_horizon') or start_date)
+        if start_date > end_date:
+            return
+        conn.execute('DELETE FROM daily_ticker_summary WHERE date BETWEEN ? AND ?', (start_date, end_date))
+        conn.execute(self.DAILY_SUMMARY_QUERY, (start_date, end_date))
+        self._save_rollups(conn, start_date, end_date)
+        if rolling:
+            self._save_rolling_stats(conn, start_date)
+    
+    def _save_summaries_of(self, conn, dates):
+        """
+        _save_daily_summaries over each run of consecutive days in dates,
+        then the rolling statistics once from the earliest date
+        """
+        dates = sorted(dates)
+        for start_date, end_date in _date_runs(dates):
+            self._save_daily_summaries(conn, start_date, end_date, rolling=False)
+        self._save_rolling_stats(conn, dates[0])
+    
+    def _save_rollups(self, conn, start_date, end_date):
+        """
+        Recompute the weekly and monthly rollups of every period overlapping
+        start_date through end_date. Periods starting before the daily
+        summaries' retention horizon are no longer whole, so keep their rows.
+        """
+        daily_horizon = _meta(conn, 'daily_horizon')
+        for tier, (table, period) in self.ROLLUPS.items():
+            first, _ = _period_bounds(tier, start_date)
+            _, last = _period_bounds(tier, end_date)
+            if daily_horizon and first < daily_horizon:
+                # The first period starting on or after the horizon
+                first, period_end = _period_bounds(tier, daily_horizon)
+                if first < daily_horizon:
+                    first = (datetime.strptime(period_end, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            if first > last:
+                continue
+            conn.execute(f'DELETE FROM {table} WHERE period BETWEEN ? AND ?', (first, last))
+            conn.execute(self.ROLLUP_QUERY.format(
+                table=table, period=period,
+                **{f'weighted_{name}': _weighted_average(f'avg_{name}_score', 'mention_count')
+                   for name in ('post', 'comment', 'overall', 'attributed')}
+            ), (first, last))
+    
+    def _save_rolling_stats(self, conn, start_date):
+        """
+        Recompute ticker_rolling_stats from start_date through the latest
+        daily summary, starting no earlier than the expired posts' horizon
+        (whose summaries no longer change) and no later than the day after
+        the latest stored statistics. Each day is updated from the previous day's EWMA state and
+        running window totals over the summaries of the last 30 days, so a
+        day costs O(tickers) however long the history is. Days without a
+        summary count as days without mentions.
+        """
+        last_date = conn.execute('SELECT MAX(date) FROM daily_ticker_summary').fetchone()[0]
+        stored = conn.execute('SELECT MAX(date) FROM ticker_rolling_stats').fetchone()[0]
+        if stored is not None:
+            start_date = min(max(start_date, _meta(conn, 'raw_horizon') or start_date), _shift_date(stored, 1))
+        conn.execute('DELETE FROM ticker_rolling_stats WHERE date >= ?', (start_date,))
+        if last_date is None or start_date > last_date:
+            return
+        
+        # (mentions, score in hundredths) per date and ticker, from the start
+        # of the longest window before start_date. Summary scores are rounded
+        # to 2 places, so the running score totals are exact integers.
+        days = {}
+        for date, ticker, count, score in conn.execute('''
+            SELECT date, ticker, mention_count, avg_overall_score FROM daily_ticker_summary
+            WHERE date BETWEEN ? AND ?
+        ''', (_shift_date(start_date, -max(self.ROLLING_WINDOWS)), last_date)):
+            days.setdefault(date, {})[ticker] = (count or 0, None if score is None else round(score * 100))
+        
+        # Window totals as of the day before start_date, as ticker: [mentions,
+        # score total, scored days], and each tracked ticker's EWMA state
+        totals = {window: {} for window in self.ROLLING_WINDOWS}
+        for window in self.ROLLING_WINDOWS:
+            for offset in range(1, window + 1):
+                for ticker, values in days.get(_shift_date(start_date, -offset), {}).items():
+                    _add_to_window(totals[window], ticker, values, 1)
+        ewma = {ticker: (mean, variance, tracked) for ticker, mean, variance, tracked in conn.execute(
+            'SELECT ticker, mentions_ewma, mentions_ewmvar, days_tracked FROM ticker_rolling_stats WHERE date = ?',
+            (_shift_date(start_date, -1),)
+        )}
+        
+        alpha = 2 / (self.SPIKE_SPAN + 1)
+        longest = totals[max(self.ROLLING_WINDOWS)]
+        rows = []
+        date = start_date
+        while date <= last_date:
+            today = days.get(date, {})
+            for window in self.ROLLING_WINDOWS:
+                for ticker, values in today.items():
+                    _add_to_window(totals[window], ticker, values, 1)
+                for ticker, values in days.get(_shift_date(date, -window), {}).items():
+                    _add_to_window(totals[window], ticker, values, -1)
         
-        mentions_df = pd.read_sql_query(mentions_query, conn, params=(date,))
+            for ticker in list(longest):
+                if longest[ticker][0] <= 0:
+                    # A whole window without mentions: the ticker is no longer tracked
+                    for window in self.ROLLING_WINDOWS:
+                        totals[window].pop(ticker, None)
+                    ewma.pop(ticker, None)
+                    continue
+        
+                # The z-score compares the day's mentions with the EWMA before it
+                mentions = today.get(ticker, (0, None))[0]
+                mean, variance, tracked = ewma.get(ticker, (mentions, 0.0, 0))
+                spike_z = None
+                if tracked >= self.SPIKE_MIN_DAYS and variance > 0:
+                    spike_z = round((mentions - mean) / variance ** 0.5, 2)
+                difference = mentions - mean
+                mean += alpha * difference
+                variance = (1 - alpha) * (variance + alpha * difference * difference)
+                ewma[ticker] = (mean, variance, tracked + 1)
+        
+                mention_averages, score_averages = [], []
+                for window in self.ROLLING_WINDOWS:
+                    count, score_total, scored = totals[window].get(ticker, (0, 0, 0))
+                    mention_averages.append(round(count / window, 2))
+                    score_averages.append(round(score_total / scored / 100, 2) if scored else None)
+                rows.append((date, ticker, *mention_averages, *score_averages, mean, variance, spike_z, tracked + 1))
+            date = _shift_date(date, 1)
+        conn.executemany('INSERT INTO ticker_rolling_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    
+    def get_ticker_history(self, ticker, days=30):
+        """Get historical data for a specific ticker"""
+        import pandas as pd
+        
+        return pd.read_sql_query(self.TICKER_HISTORY_QUERY, self.conn, params=(ticker, days))
+    
+    def get_rolling_stats(self, date=None):
+        """
+        Moving averages and mention spike z-scores of every tracked ticker on
+        a date (by default the latest), busiest first
+        """
+        import pandas as pd
         
-        if mentions_df.empty:
+        return pd.read_sql_query(self.ROLLING_STATS_QUERY, self.conn, params=(date,))
+    
+    # Fields of the arrays get_comments returns; created_utc and score are
+    # NaN where unknown
+    COMMENT_DTYPE = [('post_id', '<i8'), ('position', '<i4'), ('created_utc', '<f8'), ('score', '<f4')]
+    
+    def get_comments(self, start_date, end_date=None, ticker=None):
+        """
+        Comments of the posts stored from start_date through end_date (of
+        posts mentioning ticker, if given) as a NumPy structured array of
+        COMMENT_DTYPE, e.g. get_comments('2025-01-01', '2025-03-31')['score']
+        """
+        import numpy as np
+        
+        rows = self.conn.execute(self.COMMENTS_QUERY, (start_date, end_date or start_date, ticker))
+        return np.fromiter(rows, dtype=self.COMMENT_DTYPE)
+    
+    def get_comment_stats(self, start_date, end_date=None):
+        """Per-comment score statistics by date and ticker (see COMMENT_STATS_QUERY)"""
+        import pandas as pd
+        
+        positive, negative = _score_thresholds()
+        return pd.read_sql_query(self.COMMENT_STATS_QUERY, self.conn,
+                                 params=(positive, negative, start_date, end_date or start_date))
+    
+    # Posts with a document matching an FTS5 query, best first by their best
+    # matching document's bm25 rank, optionally by date range and ticker
+    SEARCH_QUERY = f'''
+        SELECT pr.id, MIN(s.rank) AS rank
+        FROM post_search s
+        JOIN posts_raw pr ON pr.id = s.rowid / {SEARCH_ROWID_SCALE}
+        WHERE s.post_search MATCH ?1
+          AND (?2 IS NULL OR pr.date >= ?2)
+          AND (?3 IS NULL OR pr.date <= ?3)
+          AND (?4 IS NULL OR EXISTS (SELECT 1 FROM stock_mentions sm WHERE sm.post_id = pr.id AND sm.ticker = ?4))
+        GROUP BY pr.id
+        ORDER BY rank
+        LIMIT ?5
+    '''
+    
+    def search_posts(self, query, start_date=None, end_date=None, ticker=None, limit=100):
+        """
+        posts_raw IDs of the posts whose title, content or comments match an
+        FTS5 query, best match first. The query may use phrases ("guidance
+        cut"), prefixes (guid*), NEAR("guidance cut" NVDA, 10) and boolean
+        operators. Dates filter on the post's date and ticker on its mentions;
+        limit None returns every match.
+        """
+        if not self.search:
+            raise RuntimeError(f"{self.db_path} has no full-text index; open it with RedditDB(search=True)")
+        rows = self.conn.execute(self.SEARCH_QUERY, (query, start_date, end_date, ticker, -1 if limit is None else limit))
+        return [post_id for post_id, _ in rows]
+    
+    def _create_search_index(self, conn):
+        """
+        Create the full-text index, with the posts already stored. Their
+        comment texts were never stored, so only comments written from now
+        on (or replayed, see archive.rebuild_database_from_archive) are indexed.
+        """
+        conn.execute('''
+            CREATE TABLE search_documents (
+                id INTEGER PRIMARY KEY,
+                text TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE VIRTUAL TABLE post_search USING fts5(
+                text, content = 'search_documents', content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        ''')
+        rows = conn.execute('SELECT id, post_title, post_content FROM posts_raw')
+        conn.executemany('INSERT INTO search_documents (id, text) VALUES (?, ?)', (
+            (post_id * self.SEARCH_ROWID_SCALE, _post_text(post_title, post_content))
+            for post_id, post_title, post_content in rows
+        ))
+        conn.execute("INSERT INTO post_search (post_search) VALUES ('rebuild')")
+    
+    def _finish_search_load(self, conn):
+        """Index all of search_documents in one pass and clear the bulk load mark"""
+        conn.execute("INSERT INTO post_search (post_search) VALUES ('rebuild')")
+        conn.execute("DELETE FROM db_meta WHERE name = 'search_stale'")
+    
+    @contextmanager
+    def bulk_search_load(self):
+        """
+        Stop updating the full-text index while writing many batches (a
+        backfill), then index everything in one pass, several times faster
+        than adding index segments batch by batch. The database is marked
+        meanwhile, so an interrupted load is reindexed when next opened.
+        """
+        if not self.search:
+            yield
             return
+        with self._write_transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO db_meta VALUES ('search_stale', 1)")
+        self._search_deferred = True
+        try:
+            yield
+        finally:
+            self._search_deferred = False
+        with self._write_transaction() as conn:
+            self._finish_search_load(conn)
+    
+    def rebuild_search_index(self):
+        """Rebuild the full-text index from search_documents, e.g. after a tokenizer change"""
+        with self._write_transaction() as conn:
+            conn.execute("INSERT INTO post_search (post_search) VALUES ('rebuild')")
+    
+    # Web export layout under output_dir: manifest.json lists the monthly
+    # shards of sentiment and mentions history, with their dates, tickers,
+    # content hashes and the tier they were read from (daily, or weekly or
+    # monthly points once the month's daily summaries expire). Format 1 shards hold records; format 2 shards hold one
+    # series per ticker, with day offsets from the shard's first date and
+    # ticker numbers into the manifest's ticker dictionary.
+    WEB_RECORDS_FORMAT = 1
+    WEB_COLUMNAR_FORMAT = 2
+    WEB_SHARD_DIR = 'shards'
+    WEB_ENGAGEMENT_FILE = 'engagement_by_ticker.json'
+    WEB_ROLLING_STATS_FILE = 'rolling_stats.json'
+    
+    # Full-history files written before the history was sharded
+    LEGACY_WEB_FILES = ['sentiment_over_time.json', 'mentions_over_time.json']
+    
+    def export_for_web(self, output_dir='docs/data', columnar=True):
+        """
+        Export data as JSON files for GitHub Pages, in the columnar format
+        unless columnar is False, each with a gzip copy (and a brotli copy if
+        the brotli package is installed). Only months whose daily summaries
+        changed since the last export are re-queried, and files whose content
+        hash is unchanged are left alone. Returns the files rewritten.
+        """
+        export_format = self.WEB_COLUMNAR_FORMAT if columnar else self.WEB_RECORDS_FORMAT
+        os.makedirs(os.path.join(output_dir, self.WEB_SHARD_DIR), exist_ok=True)
+        manifest_path = os.path.join(output_dir, 'manifest.json')
+        manifest, manifest_hash = _read_web_file(manifest_path)
         
-        # Group by ticker and calculate aggregations
-        for ticker in mentions_df['ticker'].unique():
-            ticker_data = mentions_df[mentions_df['ticker'] == ticker]
+        written = []
+        with self._write_transaction() as conn:
+            database_id = conn.execute("SELECT value FROM db_meta WHERE name = 'database_id'").fetchone()[0]
             
-            mention_count = len(ticker_data)
-            total_posts = len(ticker_data)  # Same as mention_count for now
-            total_comments = ticker_data['num_comments_analyzed'].sum()
-            avg_post_score = ticker_data['post_score'].mean()
-            avg_comment_score = ticker_data['comment_score'].mean()
-            avg_overall_score = ticker_data['overall_score'].mean()
+            versions = dict(conn.execute('SELECT month, version FROM export_months'))
             
-            # Count sentiments
-            sentiment_counts = ticker_data['overall_sentiment'].value_counts()
-            pos_count = sentiment_counts.get('positive', 0)
-            neg_count = sentiment_counts.get('negative', 0)
-            neu_count = sentiment_counts.get('neutral', 0)
+            # Without a manifest of this database's last export, every month is
+            # exported; with one, the months changed since, or whose shard is missing
+            if (manifest and manifest.get('format') == export_format
+                    and manifest.get('database_id') == database_id):
+                shards = {shard['month']: shard for shard in manifest['shards']}
+                tickers = manifest.get('tickers', [])
+                months = {month for month, version in versions.items()
+                          if shards.get(month, {}).get('version') != version}
+                months.update(month for month, shard in shards.items()
+                              if month not in versions or not os.path.exists(os.path.join(output_dir, shard['file'])))
+            else:
+                shards = {}
+                tickers = []
+                months = set(versions)
             
-            # Subreddit breakdown
-            subreddit_counts = ticker_data['subreddit'].value_counts().to_dict()
-            subreddit_breakdown = json.dumps(subreddit_counts)
+            for month in sorted(months):
+                for tier, query in self.WEB_SHARD_QUERIES.items():
+                    rows = conn.execute(query, (f'{month}-01', f'{month}-31')).fetchall()
+                    if rows:
+                        break
+                if not rows:
+                    # Versions are never reused, so a month that gets data again
+                    # later still differs from any manifest
+                    shards.pop(month, None)
+                    conn.execute('DELETE FROM export_months WHERE month = ?', (month,))
+                    continue
+                
+                previous = shards.get(month, {})
+                shard = {
+                    'month': month,
+                    'start': rows[0][0],
+                    'end': rows[-1][0],
+                    'dates': sorted({row[0] for row in rows}),
+                    'tickers': sorted({row[1] for row in rows}),
+                    'file': f'{self.WEB_SHARD_DIR}/{month}.json',
+                    'version': versions.get(month, 0),
+                    'tier': tier,
+                }
+                if columnar:
+                    # New tickers go at the end, so shards already written keep their numbers
+                    tickers.extend(ticker for ticker in shard['tickers'] if ticker not in tickers)
+                    content = _columnar_shard(rows, {ticker: i for i, ticker in enumerate(tickers)})
+                else:
+                    content = {
+                        'sentiment_over_time': [
+                            {'date': date, 'ticker': ticker, 'avg_overall_score': score}
+                            for date, ticker, score, _ in rows
+                        ],
+                        'mentions_over_time': [
+                            {'date': date, 'ticker': ticker, 'mention_count': count}
+                            for date, ticker, _, count in rows
+                        ],
+                    }
+                shard['sha256'] = _write_web_file(os.path.join(output_dir, shard['file']), content,
+                                                  previous.get('sha256'), written)
+                shards[month] = shard
             
-            # Insert new summary data
-            conn.execute('''
-                INSERT INTO daily_ticker_summary 
-                (date, ticker, mention_count, total_posts, total_comments,
-                 avg_post_score, avg_comment_score, avg_overall_score,
-                 sentiment_positive, sentiment_negative, sentiment_neutral,
-                 subreddit_breakdown)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                date, ticker, mention_count, total_posts, total_comments,
-                round(avg_post_score, 2), round(avg_comment_score, 2), round(avg_overall_score, 2),
-                pos_count, neg_count, neu_count, subreddit_breakdown
-            ))
+            # Latest engagement and rolling statistics by ticker
+            last_manifest = manifest or {}
+            engagement_hash = _write_web_file(
+                os.path.join(output_dir, self.WEB_ENGAGEMENT_FILE),
+                _query_content(conn.execute(self.LATEST_ENGAGEMENT_QUERY), columnar),
+                last_manifest.get('engagement', {}).get('sha256'), written
+            )
+            rolling_stats_hash = _write_web_file(
+                os.path.join(output_dir, self.WEB_ROLLING_STATS_FILE),
+                _query_content(conn.execute(self.ROLLING_STATS_QUERY, (None,)), columnar),
+                last_manifest.get('rolling_stats', {}).get('sha256'), written
+            )
+            
+            manifest = {
+                'format': export_format,
+                'database_id': database_id,
+                'shards': [shards[month] for month in sorted(shards)],
+                'engagement': {'file': self.WEB_ENGAGEMENT_FILE, 'sha256': engagement_hash},
+                'rolling_stats': {'file': self.WEB_ROLLING_STATS_FILE, 'sha256': rolling_stats_hash},
+            }
+            if columnar:
+                manifest['tickers'] = tickers
+            _write_web_file(manifest_path, manifest, manifest_hash, written)
+        
+        # Drop shards of months that no longer have data, and the full-history
+        # files the manifest replaces
+        current = {os.path.basename(shard['file']) for shard in manifest['shards']}
+        stale = [os.path.join(self.WEB_SHARD_DIR, name)
+                 for name in os.listdir(os.path.join(output_dir, self.WEB_SHARD_DIR))
+                 if name.partition('.json')[0] + '.json' not in current]
+        for name in stale + self.LEGACY_WEB_FILES:
+            if os.path.exists(os.path.join(output_dir, name)):
+                os.remove(os.path.join(output_dir, name))
+        
+        print(f"Data exported to {output_dir}: rewrote {len(written)} files, "
+              f"{len(manifest['shards'])} monthly shards")
+        return written
+
+def load_web_export(output_dir='docs/data'):
+    """
+    The sentiment and mentions history and the latest engagement exported by
+    RedditDB.export_for_web, as three lists of records, from its shards or
+    from the full-history files of older exports
+    """
+    manifest, _ = _read_web_file(os.path.join(output_dir, 'manifest.json'))
+    names = RedditDB.LEGACY_WEB_FILES + [RedditDB.WEB_ENGAGEMENT_FILE]
+    if manifest is None:
+        return [_read_web_file(os.path.join(output_dir, name))[0] for name in names]
     
-    def get_ticker_history(self, ticker, days=30):
-        """Get historical data for a specific ticker"""
+    engagement, _ = _read_web_file(os.path.join(output_dir, manifest['engagement']['file']))
+    if manifest['format'] == RedditDB.WEB_COLUMNAR_FORMAT:
+        engagement = [dict(zip(engagement, row)) for row in zip(*engagement.values())]
+    sentiment, mentions = [], []
+    for shard in manifest['shards']:
+        content, _ = _read_web_file(os.path.join(output_dir, shard['file']))
+        if manifest['format'] == RedditDB.WEB_COLUMNAR_FORMAT:
+            content = _expand_columnar_shard(content, manifest['tickers'])
+        sentiment.extend(content['sentiment_over_time'])
+        mentions.extend(content['mentions_over_time'])
+    return sentiment, mentions, engagement
+
+def _query_content(cursor, columnar):
+    """A query's rows as one array per column, or as a list of records"""
+    columns = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
+    if columnar:
+        return {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+    return [dict(zip(columns, row)) for row in rows]
+
+def _columnar_shard(rows, ticker_numbers):
+    """
+    A month of (date, ticker, avg_overall_score, mention_count) rows as one
+    series per ticker: its number, day offsets from the first date, and
+    value arrays
+    """
+    from datetime import date as Date
+    
+    start = Date.fromisoformat(rows[0][0])
+    series = {}
+    for day, ticker, score, count in rows:
+        columns = series.setdefault(ticker, {
+            'ticker': ticker_numbers[ticker], 'days': [], 'avg_overall_score': [], 'mention_count': []
+        })
+        columns['days'].append((Date.fromisoformat(day) - start).days)
+        columns['avg_overall_score'].append(score)
+        columns['mention_count'].append(count)
+    return {'start': rows[0][0], 'series': [series[ticker] for ticker in sorted(series)]}
+
+def _expand_columnar_shard(content, tickers):
+    """The sentiment and mentions records of a columnar shard, ordered by date and ticker"""
+    from datetime import date as Date, timedelta
+    
+    start = Date.fromisoformat(content['start'])
+    rows = sorted(
+        ((start + timedelta(days=day)).isoformat(), tickers[series['ticker']], score, count)
+        for series in content['series']
+        for day, score, count in zip(series['days'], series['avg_overall_score'], series['mention_count'])
+    )
+    return {
+        'sentiment_over_time': [{'date': date, 'ticker': ticker, 'avg_overall_score': score}
+                                for date, ticker, score, _ in rows],
+        'mentions_over_time': [{'date': date, 'ticker': ticker, 'mention_count': count}
+                               for date, ticker, _, count in rows],
+    }
+
+def _read_web_file(path):
+    """A JSON file's content and the SHA-256 of its bytes, or (None, None) if it does not exist"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None, None
+    return json.loads(data), hashlib.sha256(data).hexdigest()
+
+def _compressed_copies(data):
+    """
+    Precompressed copies of an exported file for the web server, as
+    (suffix, bytes): gzip, and brotli when the optional brotli package is
+    installed. gzip's header timestamp is zeroed, so equal data gives equal
+    files.
+    """
+    copies = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        return copies
+    copies.append(('.br', brotli.compress(data)))
+    return copies
+
+def _write_web_file(path, content, previous_hash, written):
+    """
+    Write content as compact JSON, with its compressed copies, unless its
+    SHA-256 matches previous_hash and the files exist. Appends path to written
+    when it is rewritten, and returns the hash.
+    """
+    data = json.dumps(content, separators=(',', ':')).encode()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == previous_hash and os.path.exists(path) and os.path.exists(f'{path}.gz'):
+        return digest
+    
+    # Replace each file in one step, so the dashboard never reads half of it
+    for file_path, file_data in [(path, data)] + [(path + suffix, copy) for suffix, copy in _compressed_copies(data)]:
+        temp_path = f'{file_path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(file_data)
+        os.replace(temp_path, file_path)
+    written.append(path)
+    return digest
+
+def _meta(conn, name):
+    """A db_meta value, or None if it is not set"""
+    row = conn.execute('SELECT value FROM db_meta WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+def _mark_export_months(conn, months_query, params):
+    """Give the months months_query selects a new export version, as the triggers do for daily rows"""
+    conn.execute("UPDATE db_meta SET value = value + 1 WHERE name = 'summary_version'")
+    conn.execute(f'''
+        INSERT INTO export_months
+        SELECT DISTINCT months.*, (SELECT value FROM db_meta WHERE name = 'summary_version')
+        FROM ({months_query}) AS months WHERE true
+        ON CONFLICT (month) DO UPDATE SET version = excluded.version
+    ''', params)
+
+def _raise_horizon(conn, name, date):
+    """Move a tier's retention horizon in db_meta forward to date (never back)"""
+    if (_meta(conn, name) or '') < date:
+        conn.execute('INSERT OR REPLACE INTO db_meta VALUES (?, ?)', (name, date))
+
+def _period_bounds(tier, date):
+    """First and last date of the weekly (Monday to Sunday) or monthly rollup period of a date"""
+    day = datetime.strptime(date, '%Y-%m-%d')
+    if tier == 'weekly':
+        first = day - timedelta(days=day.weekday())
+        last = first + timedelta(days=6)
+    else:
+        first = day.replace(day=1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')
+
+def _shift_date(date, days):
+    """A YYYY-MM-DD date moved by a number of days"""
+    return (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=days)).strftime('%Y-%m-%d')
+
+def _date_runs(dates):
+    """(first, last) of each run of consecutive days in sorted YYYY-MM-DD dates"""
+    runs = []
+    for date in dates:
+        if runs and _shift_date(runs[-1][1], 1) == date:
+            runs[-1][1] = date
+        else:
+            runs.append([date, date])
+    return [tuple(run) for run in runs]
+
+def _add_to_window(totals, ticker, values, sign):
+    """Add (sign 1) or take away (sign -1) a day's (mentions, score) in a ticker's window totals"""
+    count, score = values
+    entry = totals.setdefault(ticker, [0, 0, 0])
+    entry[0] += sign * count
+    if score is not None:
+        entry[1] += sign * score
+        entry[2] += sign
+
+def _weighted_average(column, weight):
+    """SQL for the weight-weighted average of column over a group, ignoring NULLs, to 2 places"""
+    return f'ROUND(SUM({column} * {weight}) / SUM(IIF({column} IS NULL, NULL, {weight})), 2)'
+
+def pack_comment_indices(indices):
+    """Pack comment indices (-1 = the post itself) into a little-endian int32 BLOB"""
+    import numpy as np
+    return np.asarray(indices, dtype='<i4').tobytes()
+
+def unpack_comment_indices(blob):
+    """Read a stock_mentions.comment_indices BLOB back into an int32 array"""
+    import numpy as np
+    return np.frombuffer(blob, dtype='<i4')
+
+def _parse_literal(value, expected_type):
+    """Decode a list/dict cell that may have been stringified for CSV"""
+    if isinstance(value, expected_type):
+        return value
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+    return parsed if isinstance(parsed, expected_type) else None
+
+# The str() of a list of plain ticker strings, as pandas writes mentioned_tickers to CSV
+_TICKER_LIST = re.compile(r"\[(?:'[^'\\]*'(?:, (?=')|(?=\])))*\]")
+_QUOTED = re.compile(r"'([^'\\]*)'")
+
+def _parse_tickers(mentioned_tickers):
+    """Read mentioned_tickers whether it is a list or its CSV string form"""
+    if isinstance(mentioned_tickers, list):
+        return mentioned_tickers
+    if not isinstance(mentioned_tickers, str) or not mentioned_tickers or mentioned_tickers == '[]':
+        return []
+    # Skip literal_eval for the common form, which a rebuild sees on every row
+    if _TICKER_LIST.fullmatch(mentioned_tickers):
+        return _QUOTED.findall(mentioned_tickers)
+    tickers = _parse_literal(mentioned_tickers, list)
+    # If it's a single ticker as string
+    return tickers if tickers is not None else [mentioned_tickers]
+
+def _attribution(indices, post_score, comment_scores):
+    """
+    stock_mentions attribution columns for one ticker in one post:
+    (mentioned_in_post, attributed_comments, attributed_score, comment_indices)
+    """
+    if indices is None:
+        return (None, None, None, None)
+    
+    in_post = -1 in indices
+    comment_ids = [i for i in indices if 0 <= i < len(comment_scores)]
+    
+    scores = [comment_scores[i] for i in comment_ids]
+    if in_post and post_score is not None and not math.isnan(post_score):
+        scores.append(post_score)
+    attributed_score = sum(scores) / len(scores) if scores else None
+    
+    return (int(in_post), len(comment_ids), attributed_score, pack_comment_indices(indices))
+
+# A Reddit post ID in a permalink (https://reddit.com/r/<sub>/comments/<id>/...)
+_PERMALINK_ID = re.compile(r'/comments/([A-Za-z0-9]+)')
+
+def _reddit_id(post_id, url):
+    """A post's Reddit ID, or, for rows from before it was kept, the one in its URL"""
+    if isinstance(post_id, str) and post_id:
+        return post_id
+    match = _PERMALINK_ID.search(url) if isinstance(url, str) else None
+    return match.group(1) if match else None
+
+def _row_count(df):
+    """Rows of a DataFrame or of a dict of column lists"""
+    return len(next(iter(df.values()), ())) if isinstance(df, dict) else len(df)
+
+def _post_records(df, columns, texts=False):
+    """
+    The posts_raw inputs of each DataFrame row: its values for columns (NaN
+    as None), Reddit ID, comment IDs, creation times and scores, tickers
+    and attribution inputs, and the comment texts if texts is True
+    """
+    missing = [None] * _row_count(df)
+    
+    def cells(name):
+        if name not in df:
+            return missing
+        return df[name] if isinstance(df, dict) else df[name].tolist()
+    
+    values = zip(*[[None if value != value else value for value in cells(column)] for column in columns])
+    records = []
+    for (row_values, post_id, url, is_new_post, comment_ids, comment_times, tickers, ticker_comments,
+         comment_scores, comments) in zip(
+        values, cells('post_id'), cells('url'), cells('is_new_post'), cells('comment_ids'), cells('comment_times'),
+        cells('mentioned_tickers'), cells('ticker_comments'), cells('comment_word_scores'),
+        cells('comments') if texts else missing
+    ):
+        tickers = _parse_tickers(tickers)
+        is_delta = is_new_post is False
+        # Attribution inputs are only read for mentions and delta merges
+        detailed = bool(tickers) or is_delta
+        records.append({
+            'values': row_values,
+            'reddit_id': _reddit_id(post_id, url),
+            'is_delta': is_delta,
+            'comment_ids': _parse_literal(comment_ids, list),
+            'comment_times': _parse_literal(comment_times, list),
+            'tickers': tickers,
+            'ticker_comments': (_parse_literal(ticker_comments, dict) or {}) if detailed else {},
+            'comment_scores': _parse_literal(comment_scores, list) or [],
+            'comment_scores_text': comment_scores if isinstance(comment_scores, str) else None,
+            'comment_texts': _parse_literal(comments, list) if texts else None,
+        })
+    return records
+
+def _full_post(record):
+    """(values, comment_ids, mentions, comments) of a post stored as a record describes it"""
+    post_score = record['values'][RedditDB.POST_COLUMNS.index('post_score')]
+    mentions = {
+        ticker: _attribution(record['ticker_comments'].get(ticker), post_score, record['comment_scores'])
+        for ticker in record['tickers']
+    }
+    comments = [(i, row, text) for i, (row, text) in enumerate(zip(_comment_rows(record), _comment_texts(record)))]
+    return record['values'], record['comment_ids'], mentions, comments
+
+def _comment_rows(record):
+    """
+    (comment_id, created_utc, score) of each of a record's scored comments.
+    IDs and times are None unless the record has one per score.
+    """
+    scores = record['comment_scores']
+    ids, times = record['comment_ids'], record['comment_times']
+    if not ids or len(ids) != len(scores):
+        ids = [None] * len(scores)
+    if not times or len(times) != len(scores):
+        times = [None] * len(scores)
+    return [(comment_id, created_utc, None if score != score else score)
+            for comment_id, created_utc, score in zip(ids, times, scores)]
+
+# The str() of a list of plain floats, as pandas writes comment_word_scores to CSV
+_SCORE_LIST = re.compile(r"\[(?:-?\d+(?:\.\d+)?(?:e[-+]\d+)?(?:, (?=-?\d)|(?=\])))*\]")
+
+def _comment_arrays(record, ids_text):
+    """
+    A record's comment IDs (ids_text, as dumped for posts_raw), creation
+    times and scores as JSON arrays, as RedditDB.COMMENT_ARRAYS_INSERT reads
+    them. IDs and times are None unless the record has one per score.
+    """
+    scores, text = record['comment_scores'], record['comment_scores_text']
+    ids, times = record['comment_ids'], record['comment_times']
+    # A CSV cell in the common form is already JSON, and dumping floats is slow
+    if text is None or not _SCORE_LIST.fullmatch(text):
+        text = json.dumps([None if score != score else score for score in scores])
+    return (
+        ids_text if ids and len(ids) == len(scores) else None,
+        _json_list(times) if times and len(times) == len(scores) else None,
+        text,
+    )
+
+def _insert_rows(conn, insert, upsert, rows, per_statement=200):
+    """
+    Run insert (a statement up to VALUES) followed by upsert over rows, with
+    per_statement rows in each VALUES list: SQLite's per-statement overhead
+    is then paid once per per_statement rows, not once per row
+    """
+    if not rows:
+        return
+    row = f"({', '.join('?' * len(rows[0]))})"
+    full = len(rows) - len(rows) % per_statement
+    if full:
+        conn.executemany(f"{insert} VALUES {', '.join([row] * per_statement)} {upsert}", [
+            tuple(chain.from_iterable(rows[i:i + per_statement])) for i in range(0, full, per_statement)
+        ])
+    if full < len(rows):
+        conn.executemany(f'{insert} VALUES {row} {upsert}', rows[full:])
+
+def _json_list(values):
+    """A list as stored in a JSON column, or None"""
+    return None if values is None else json.dumps(values)
+
+def _comment_texts(record):
+    """The text of each of a record's scored comments, or Nones if it has none to match"""
+    texts = record['comment_texts']
+    if not texts or len(texts) != len(record['comment_scores']):
+        return [None] * len(record['comment_scores'])
+    return texts
+
+def _post_text(title, content):
+    """A post's full-text search document"""
+    return '\n'.join(part for part in (title, content) if part)
+
+def _score_thresholds():
+    """
+    SentimentAnalyzer's default positive and negative thresholds, on the
+    0-100 scale scores are stored in
+    """
+    # Imported here, as NB_classifier loads numpy and VADER
+    from NB_classifier import POSITIVE_THRESHOLD, NEGATIVE_THRESHOLD
+    return ((POSITIVE_THRESHOLD + 1) / 2) * 100, ((NEGATIVE_THRESHOLD + 1) / 2) * 100
+
+def _sentiment_label(score):
+    positive, negative = _score_thresholds()
+    if score >= positive:
+        return 'positive'
+    if score <= negative:
+        return 'negative'
+    return 'neutral'
+
+def _merge_delta(post, record):
+    """
+    (values, comment_ids, mentions, comments) of a stored post with an
+    incremental record's new comments added, or None if it has none. Comments whose IDs
+    the post already holds are skipped, so applying a delta twice is a no-op.
+    """
+    columns = RedditDB.POST_COLUMNS
+    merged = dict(zip(columns, post['values']))
+    delta = dict(zip(columns, record['values']))
+    scores = record['comment_scores']
+    known = set(post['comment_ids'] or [])
+    new_ids = record['comment_ids'] if record['comment_ids'] and len(record['comment_ids']) == len(scores) else None
+    kept = [i for i in range(len(scores)) if new_ids is None or new_ids[i] not in known]
+    if not kept:
+        return None
+    
+    # Post-level fields come from the newer record; comment averages are
+    # weighted by comment count, and the overall score blended as
+    # SentimentAnalyzer does
+    from NB_classifier import POST_WEIGHT, COMMENT_WEIGHT
+    
+    old_count = merged['num_comments_analyzed'] or 0
+    count = old_count + len(kept)
+    for column in ('subreddit', 'post_title', 'post_content', 'post_author', 'post_score',
+                   'post_sentiment', 'post_word_score', 'url'):
+        merged[column] = delta[column]
+    merged['num_comments'] = (merged['num_comments'] or 0) + len(kept)
+    merged['num_comments_analyzed'] = count
+    merged['comment_score'] = ((merged['comment_score'] or 0) * old_count + sum(scores[i] for i in kept)) / count
+    merged['comment_sentiment'] = _sentiment_label(merged['comment_score'])
+    if merged['post_score'] is not None:
+        merged['overall_score'] = merged['post_score'] * POST_WEIGHT + merged['comment_score'] * COMMENT_WEIGHT
+        merged['overall_sentiment'] = _sentiment_label(merged['overall_score'])
+    
+    comment_ids = None
+    if new_ids is not None and (post['comment_ids'] is not None or not old_count):
+        comment_ids = (post['comment_ids'] or []) + [new_ids[i] for i in kept]
+    
+    # The delta's comment i is now comment position[i] of the post
+    position = {i: old_count + rank for rank, i in enumerate(kept)}
+    mentions = dict(post['mentions'])
+    for ticker in record['tickers']:
+        indices = record['ticker_comments'].get(ticker)
+        if indices is None:
+            mentions.setdefault(ticker, (None, None, None, None))
+            continue
+        mentions[ticker] = _merge_attribution(
+            mentions.get(ticker), [i for i in indices if i == -1 or i in position],
+            position, scores, merged['post_score']
+        )
+    comment_rows, texts = _comment_rows(record), _comment_texts(record)
+    comments = [(position[i], comment_rows[i], texts[i]) for i in kept]
+    return tuple(merged[column] for column in columns), comment_ids, mentions, comments
+
+def _merge_attribution(stored, indices, position, scores, post_score):
+    """stock_mentions attribution columns with a delta's attributed comments (and post) added"""
+    old_indices = unpack_comment_indices(stored[3]).tolist() if stored and stored[3] is not None else []
+    old_in_post = -1 in old_indices
+    old_comments = (stored[1] or 0) if stored else 0
+    post_valid = post_score is not None and not math.isnan(post_score)
+    
+    # Undo the stored average, which covers the attributed comments plus the
+    # post when the ticker was mentioned in it
+    total, count = 0.0, 0
+    if stored and stored[2] is not None:
+        count = old_comments + (1 if old_in_post and post_valid else 0)
+        total = stored[2] * count
+    
+    new_comments = [i for i in indices if i != -1]
+    total += sum(scores[i] for i in new_comments)
+    count += len(new_comments)
+    in_post = old_in_post or -1 in indices
+    if in_post and not old_in_post and post_valid:
+        total += post_score
+        count += 1
+    
+    merged_indices = old_indices + ([-1] if in_post and not old_in_post else []) + [position[i] for i in new_comments]
+    return (int(in_post), old_comments + len(new_comments), total / count if count else None,
+            pack_comment_indices(merged_indices))
+
+class SeenPostIndex:
+    """
+    Persistent index of scraped Reddit post IDs, stored next to RedditDB's
+    tables. For each post it keeps the newest comment timestamp already
+    processed and Reddit's comment count at that time, so later runs only
+    fetch new posts and new comments.
+    """
+    
+    # Stay well under SQLite's bound-parameter limit
+    LOOKUP_BATCH_SIZE = 500
+    
+    def __init__(self, db_path='reddit_sentiment.db'):
+        self.db_path = db_path
+        self.init_index()
+    
+    def init_index(self):
+        """Create the index table if it doesn't exist"""
         conn = sqlite3.connect(self.db_path)
         
-        query = '''
-            SELECT * FROM daily_ticker_summary 
-            WHERE ticker = ? 
-            ORDER BY date DESC 
-            LIMIT ?
-        '''
+        # WITHOUT ROWID keeps lookups a single B-tree search as the index grows
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS seen_posts (
+                post_id TEXT PRIMARY KEY,
+                last_comment_utc REAL NOT NULL,
+                num_comments INTEGER NOT NULL DEFAULT 0,
+                first_seen TEXT NOT NULL
+            ) WITHOUT ROWID
+        ''')
         
-        df = pd.read_sql_query(query, conn, params=(ticker, days))
+        conn.commit()
         conn.close()
-        return df
     
-    def export_for_web(self, output_dir='docs/data'):
-        """Export data as JSON files for GitHub Pages"""
-        os.makedirs(output_dir, exist_ok=True)
+    def get_marks(self, post_ids):
+        """Return {post_id: (last_comment_utc, num_comments)} for the seen posts among post_ids"""
+        post_ids = list(post_ids)
+        marks = {}
+        if not post_ids:
+            return marks
         
         conn = sqlite3.connect(self.db_path)
+        for i in range(0, len(post_ids), self.LOOKUP_BATCH_SIZE):
+            batch = post_ids[i:i + self.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(f'''
+                SELECT post_id, last_comment_utc, num_comments
+                FROM seen_posts
+                WHERE post_id IN ({placeholders})
+            ''', batch)
+            for post_id, last_comment_utc, num_comments in rows:
+                marks[post_id] = (last_comment_utc, num_comments)
+        conn.close()
+        return marks
+    
+    def mark_seen(self, posts):
+        """Record scraped post dicts (from get_posts_with_comments) as processed"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        rows = [
+            (post['post_id'], float(post['last_comment_utc']), int(post['reddit_num_comments']), today)
+            for post in posts
+        ]
+        if not rows:
+            return
         
-        # 1. Sentiment over time
-        sentiment_query = '''
-            SELECT DATE(date) as date, ticker, AVG(avg_overall_score) as avg_overall_score
-            FROM daily_ticker_summary 
-            GROUP BY DATE(date), ticker
-            ORDER BY date, ticker
-        '''
-        sentiment_df = pd.read_sql_query(sentiment_query, conn)
-        sentiment_df.to_json(f'{output_dir}/sentiment_over_time.json', orient='records')
-        
-        # 2. Mentions over time
-        mentions_query = '''
-            SELECT DATE(date) as date, ticker, SUM(mention_count) as mention_count
-            FROM daily_ticker_summary 
-            GROUP BY DATE(date), ticker
-            ORDER BY date, ticker
-        '''
-        mentions_df = pd.read_sql_query(mentions_query, conn)
-        mentions_df.to_json(f'{output_dir}/mentions_over_time.json', orient='records')
-        
-        # 3. Latest engagement by ticker
-        engagement_query = '''
-            SELECT 
-                ticker, 
-                avg_overall_score, 
-                CAST(total_comments AS INTEGER) as total_comments, 
-                mention_count 
-            FROM daily_ticker_summary 
-            WHERE date = (SELECT MAX(date) FROM daily_ticker_summary) 
-            ORDER BY mention_count DESC
-        '''
-        engagement_df = pd.read_sql_query(engagement_query, conn)
-        engagement_df.to_json(f'{output_dir}/engagement_by_ticker.json', orient='records')
-        
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany('''
+            INSERT INTO seen_posts (post_id, last_comment_utc, num_comments, first_seen)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(post_id) DO UPDATE SET
+                last_comment_utc = MAX(last_comment_utc, excluded.last_comment_utc),
+                num_comments = MAX(num_comments, excluded.num_comments)
+        ''', rows)
+        conn.commit()
+        conn.close()
+    
+    def __len__(self):
+        conn = sqlite3.connect(self.db_path)
+        count = conn.execute('SELECT COUNT(*) FROM seen_posts').fetchone()[0]
         conn.close()
-        print(f"Data exported to {output_dir}")
\ No newline at end of file
+        return count
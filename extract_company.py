@@ -1,134 +1,244 @@
 import pandas as pd
+import numpy as np
 import re
-from typing import List, Dict
+import ast
+import json
+from typing import List, Dict, Tuple
 import os
+from symbol_index import SymbolIndex, load_symbol_index
 
 class StockIdentifier:
-    def __init__(self):
+    def __init__(self, symbol_index: SymbolIndex = None):
         # Common stock ticker patterns (2-5 uppercase letters)
         self.ticker_pattern = r'\b[A-Z]{2,5}\b'
         
+        # Symbol universe and company name aliases (see data/ and symbol_index.py)
+        self.symbol_index = symbol_index if symbol_index is not None else load_symbol_index()
+        
         # Known company names to ticker mappings
-        self.company_to_ticker = {
-            'apple': 'AAPL',
-            'microsoft': 'MSFT',
-            'meta': 'META',
-            'facebook': 'META',
-            'google': 'GOOG',
-            'alphabet': 'GOOG',
-            'amazon': 'AMZN',
-            'nvidia': 'NVDA',
-            'tesla': 'TSLA',
-            'visa': 'V',
-            'mastercard': 'MA',
-            'boeing': 'BA',
-            'costco': 'COST',
-            'target': 'TGT',
-            'nike': 'NKE',
-            'pepsi': 'PEP',
-            'oracle': 'ORCL',
-            'walmart': 'WMT',
-            'expedia': 'EXPE',
-            'palantir': 'PLTR',
-            'carvana': 'CVNA',
-            'tyson': 'TSN',
-            'adobe': 'ADBE',
-            'ups': 'UPS',
-            'unitedhealth': 'UNH',
-            'devon energy': 'DVN',
-            'pultegroup': 'PHM',
-            'stellantis': 'STLA',
-            'mercadolibre': 'MELI',
-            'uber': 'UBER',
-            'asml': 'ASML',
-            'oklo': 'OKLO',
-            'ionq': 'IONQ'
-        }
+        self.company_to_ticker = self.symbol_index.aliases
         
-        # Common false positives to filter out
+        # Common false positives to filter out. With the full listings loaded
+        # many everyday words are also real symbols, so they are listed here too.
         self.false_positives = {
             'USD', 'USA', 'CEO', 'IPO', 'ETF', 'AI', 'IT', 'US', 'UK', 'EU', 'Q1', 'Q2', 'Q3', 'Q4',
             'YOY', 'QOQ', 'PE', 'EPS', 'ROI', 'GDP', 'CPI', 'PPI', 'FED', 'SEC', 'IRA', 'THE', 'AND',
             'FOR', 'BUT', 'NOT', 'ALL', 'CAN', 'GET', 'NEW', 'WAY', 'ONE', 'TWO', 'MAX', 'MIN', 'TOP',
-            'END', 'SET', 'PUT', 'CALL', 'BUY', 'SELL', 'HOLD', 'LONG', 'SHORT', 'BULL', 'BEAR'
+            'END', 'SET', 'PUT', 'CALL', 'BUY', 'SELL', 'HOLD', 'LONG', 'SHORT', 'BULL', 'BEAR',
+            'ARE', 'NOW', 'OUT', 'HAS', 'ANY', 'SEE', 'BIG', 'LOW', 'RUN', 'OPEN', 'REAL', 'GOOD',
+            'ON', 'OR', 'SO', 'GO', 'BE', 'AM', 'PM', 'DD', 'ATH', 'IMO', 'LOL', 'YOLO', 'EV', 'OP'
         }
         
         # ETF patterns
-        self.etf_patterns = {
-            'VOO': 'Vanguard S&P 500 ETF',
-            'VTI': 'Vanguard Total Stock Market ETF',
-            'VT': 'Vanguard Total World Stock ETF',
-            'VXUS': 'Vanguard Total International Stock ETF',
-            'SPY': 'SPDR S&P 500 ETF',
-            'VIX': 'Volatility Index'
-        }
+        self.etf_patterns = {symbol: self.symbol_index.names[symbol] for symbol in self.symbol_index.etfs}
         
-        # Initialize valid tickers list
-        self.valid_tickers = self._initialize_valid_tickers()
-    
-    def _initialize_valid_tickers(self) -> List[str]:
-        """Initialize the list of valid tickers"""
-        # Get all tickers from our mappings
-        tickers = set(self.company_to_ticker.values())
+        # Valid tickers are a frozenset, so membership checks are constant time
+        self.valid_tickers = self.symbol_index.symbols
         
-        # Add ETF tickers
-        tickers.update(self.etf_patterns.keys())
+        # One compiled pattern finds cashtags, company names and bare tickers in a single pass
+        self.matcher = self._compile_matcher()
+    
+    def _compile_matcher(self) -> re.Pattern:
+        """Compile the single-pass matcher for cashtags, company names and tickers"""
+        # Company names are matched case-insensitively on word boundaries, so
+        # 'ups' no longer matches inside 'startups' nor 'target' inside 'targeted'.
+        # Every branch starts a word, so one lookbehind rejects mid-word positions
+        # before any branch is tried.
+        names = _trie_pattern(list(self.company_to_ticker.keys()), case_insensitive=True)
+        return re.compile(
+            r'(?<![\w$])(?:'
+            r'(?P<cashtag>\$[A-Za-z]{1,5})\b'
+            rf'|(?P<name>{names})\b'
+            r'|(?P<ticker>[A-Z]{2,5})\b'
+            r')'
+        )
+    
+    def _match_ticker(self, match: re.Match) -> str:
+        """Map one matcher hit to its ticker, or None if it isn't a valid mention"""
+        kind = match.lastgroup
+        if kind == 'name':
+            return self.company_to_ticker[match.group('name').lower()]
+        if kind == 'cashtag':
+            # An explicit $TICKER skips the false-positive filter
+            ticker = match.group('cashtag')[1:].upper()
+            return ticker if ticker in self.valid_tickers else None
         
-        return list(tickers)
+        # Potential tickers are 2-5 letter words in all caps
+        ticker = match.group('ticker')
+        if ticker not in self.false_positives and ticker in self.valid_tickers:
+            return ticker
+        return None
     
     def extract_tickers(self, text: str) -> List[str]:
         """Extract stock tickers from text"""
         if not isinstance(text, str):
             return []
         
-        # Convert to lowercase for company name matching
-        text_lower = text.lower()
-        
-        # Find potential tickers (2-5 letter words in all caps)
-        potential_tickers = set(re.findall(self.ticker_pattern, text))
+        found_tickers = set()
+        for match in self.matcher.finditer(text):
+            ticker = self._match_ticker(match)
+            if ticker is not None:
+                found_tickers.add(ticker)
         
-        # Remove false positives
-        potential_tickers = potential_tickers - self.false_positives
+        return list(found_tickers)
+    
+    def match_batch(self, texts: List[str]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Run the matcher once over a whole batch of texts.
+        Returns (text_ids, tickers): one entry per mention, where text_ids[i]
+        is the index in texts of the text that mentions tickers[i].
+        """
+        texts = [text if isinstance(text, str) else '' for text in texts]
+        if not texts:
+            return np.empty(0, dtype=np.int64), []
         
-        # Filter to only valid tickers
-        found_tickers = [ticker for ticker in potential_tickers if ticker in self.valid_tickers]
+        # A newline can't be part of any match, so it safely separates texts
+        buffer = '\n'.join(texts)
+        starts = np.cumsum([0] + [len(text) + 1 for text in texts[:-1]])
         
-        # Check for company names
-        for company, ticker in self.company_to_ticker.items():
-            if company in text_lower and ticker not in found_tickers:
-                found_tickers.append(ticker)
+        positions = []
+        tickers = []
+        for match in self.matcher.finditer(buffer):
+            ticker = self._match_ticker(match)
+            if ticker is not None:
+                positions.append(match.start())
+                tickers.append(ticker)
         
-        return list(set(found_tickers))  # Remove any duplicates
+        text_ids = np.searchsorted(starts, positions, side='right') - 1
+        return text_ids, tickers
+    
+    def extract_tickers_batch(self, texts: List[str]) -> List[List[str]]:
+        """extract_tickers for many texts, in one pass over the batch"""
+        found = [set() for _ in texts]
+        text_ids, tickers = self.match_batch(texts)
+        for text_id, ticker in zip(text_ids.tolist(), tickers):
+            found[text_id].add(ticker)
+        return [list(tickers) for tickers in found]
+
+def _trie_pattern(words: List[str], case_insensitive: bool = False) -> str:
+    """
+    Build a prefix-factored alternation for words (e.g. 'ap(?:ple|ril)'), so
+    the regex engine tests each text position against a trie instead of
+    trying every word in turn. With case_insensitive, letters become
+    [aA]-style classes, which the engine matches faster than (?i).
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}  # End of a word
+    return _trie_node_pattern(trie, case_insensitive)
+
+def _trie_node_pattern(node: Dict, case_insensitive: bool) -> str:
+    alternatives = []
+    for char, child in sorted(node.items()):
+        if not char:
+            continue
+        if case_insensitive and char.lower() != char.upper():
+            atom = f'[{re.escape(char.lower())}{re.escape(char.upper())}]'
+        else:
+            atom = re.escape(char)
+        alternatives.append(atom + _trie_node_pattern(child, case_insensitive))
+    if not alternatives:
+        return ''
+    
+    optional = '' in node
+    if len(alternatives) == 1 and not optional:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')' + ('?' if optional else '')
+
+def parse_comment_list(comments) -> List[str]:
+    """
+    Decode a comments cell into a list of strings without eval.
+    JSON arrays (what the pipeline writes) take the fast path; Python list
+    reprs from older CSVs fall back to ast.literal_eval.
+    """
+    if isinstance(comments, list):
+        return comments
+    if not isinstance(comments, str) or not comments or comments == '[]':
+        return []
+    
+    try:
+        parsed = json.loads(comments)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(comments)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return [comments]  # Treat as single comment if parsing fails
+    return parsed if isinstance(parsed, list) else [comments]
+
+def encode_comment_list(comments) -> str:
+    """Encode a comments list for CSV as JSON, which parse_comment_list decodes fastest"""
+    return json.dumps(parse_comment_list(comments), ensure_ascii=False)
+
+def csv_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy of df with its list and dict columns JSON-encoded for CSV output"""
+    csv_df = df.copy()
+    csv_df['comments'] = csv_df['comments'].map(encode_comment_list)
+    if 'ticker_comments' in csv_df:
+        csv_df['ticker_comments'] = csv_df['ticker_comments'].map(json.dumps)
+    if 'comment_ids' in csv_df:
+        csv_df['comment_ids'] = csv_df['comment_ids'].map(json.dumps)
+    if 'comment_times' in csv_df:
+        csv_df['comment_times'] = csv_df['comment_times'].map(json.dumps)
+    return csv_df
+
+def attribute_post_tickers(stock_id: StockIdentifier, post: Dict) -> Dict[str, List[int]]:
+    """
+    Map each ticker mentioned in one post record to the indices of the
+    comments that mention it; -1 stands for the post title/content
+    """
+    comments = parse_comment_list(post['comments'])
+    texts = [f"{post['post_title']} {post['post_content']}"] + comments
+    
+    ticker_comments = {}
+    text_ids, tickers = stock_id.match_batch(texts)
+    for text_id, ticker in zip(text_ids.tolist(), tickers):
+        indices = ticker_comments.setdefault(ticker, [])
+        if not indices or indices[-1] != text_id - 1:
+            indices.append(text_id - 1)
+    return ticker_comments
+
+def extract_post_tickers(stock_id: StockIdentifier, post: Dict) -> List[str]:
+    """Extract tickers from one post record's title, content and comments"""
+    return list(attribute_post_tickers(stock_id, post))
 
 def process_reddit_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Process Reddit data to extract company mentions"""
+    """
+    Process Reddit data to extract company mentions.
+    Adds mentioned_tickers and ticker_comments, which maps each ticker to
+    the comment indices that mention it (-1 for the post itself).
+    """
     # Initialize stock identifier
     stock_id = StockIdentifier()
     
-    # Add a new column for ticker mentions
-    df['mentioned_tickers'] = None
+    # Flatten every post's text and comments into one batch: the post texts
+    # come first, followed by all comments, with owners mapping each text
+    # back to its row position and local_ids to its index within the post
+    post_texts = (df['post_title'].astype(str) + ' ' + df['post_content'].astype(str)).tolist()
+    comment_lists = [parse_comment_list(comments) for comments in df['comments']]
+    comment_counts = np.fromiter((len(comments) for comments in comment_lists), dtype=np.int64, count=len(df))
     
-    # Process each post and its comments
-    for idx, row in df.iterrows():
-        # Combine post title and content
-        post_text = f"{row['post_title']} {row['post_content']}"
-        
-        # Get tickers from post
-        post_tickers = stock_id.extract_tickers(post_text)
-        
-        # Get tickers from comments
-        comment_tickers = []
-        if isinstance(row['comments'], str):
-            # Convert string representation of list to actual list
-            comments = eval(row['comments'])
-            for comment in comments:
-                comment_tickers.extend(stock_id.extract_tickers(comment))
-        
-        # Combine all tickers found and remove duplicates
-        all_tickers = list(set(post_tickers + comment_tickers))
-        
-        # Add to the DataFrame
-        df.at[idx, 'mentioned_tickers'] = all_tickers
+    texts = post_texts + [comment for comments in comment_lists for comment in comments]
+    owners = np.concatenate([np.arange(len(df)), np.repeat(np.arange(len(df)), comment_counts)])
+    first_comment = len(df) + np.cumsum(comment_counts) - comment_counts
+    local_ids = np.concatenate([
+        np.full(len(df), -1),
+        np.arange(len(texts) - len(df)) - np.repeat(first_comment - len(df), comment_counts)
+    ])
+    
+    # Group mentions by post, keeping each ticker's comment indices in order
+    text_ids, tickers = stock_id.match_batch(texts)
+    attributions = [{} for _ in range(len(df))]
+    for owner, local_id, ticker in zip(owners[text_ids].tolist(), local_ids[text_ids].tolist(), tickers):
+        indices = attributions[owner].setdefault(ticker, [])
+        if not indices or indices[-1] != local_id:
+            indices.append(local_id)
+    
+    # Add the new columns for ticker mentions
+    df['mentioned_tickers'] = [list(ticker_comments) for ticker_comments in attributions]
+    df['ticker_comments'] = attributions
     
     return df
 
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the PRAW Reddit client, for exercising the scraper offline
+"""
+
+import copy
+import random
+import threading
+import time
+from datetime import datetime
+
+class FakeComment:
+    def __init__(self, body, created_utc, comment_id, link_id=None):
+        self.id = comment_id
+        self.body = body
+        self.created_utc = created_utc
+        self.link_id = link_id
+
+class FakeCommentForest:
+    def __init__(self, comments):
+        self._comments = comments
+
+    def replace_more(self, limit=0):
+        return []
+
+    def __iter__(self):
+        return iter(self._comments)
+
+class FakeSubmission:
+    """Mimics a PRAW Submission; the comment forest is 'fetched' on first access"""
+
+    def __init__(self, reddit, post_id, title, selftext, author, score, created_utc, permalink, comments):
+        self._reddit = reddit
+        self.id = post_id
+        self.title = title
+        self.selftext = selftext
+        self.author = author
+        self.score = score
+        self.created_utc = created_utc
+        self.permalink = permalink
+        self._comment_list = comments
+        self.num_comments = len(comments)
+        self._forest = None
+
+    @property
+    def comments(self):
+        if self._forest is None:
+            self._reddit._simulate_request()
+            self._forest = FakeCommentForest(self._comment_list)
+        return self._forest
+
+class FakeSubreddit:
+    def __init__(self, reddit, name):
+        self._reddit = reddit
+        self.display_name = name
+
+    def top(self, time_filter='day', limit=10):
+        self._reddit._simulate_request()
+        return iter(self._reddit._posts_for(self.display_name)[:limit])
+
+    def comments(self, limit=100):
+        """The subreddit's newest comments, newest first"""
+        self._reddit._simulate_request()
+        comments = [comment for post in self._reddit._posts_for(self.display_name)
+                    for comment in post._comment_list]
+        return iter(sorted(comments, key=lambda comment: comment.created_utc, reverse=True)[:limit])
+
+class FakeReddit:
+    """
+    Deterministic offline Reddit client.
+    Every listing and comment fetch sleeps for `latency` seconds, and the
+    client records how many requests were made and the peak concurrency.
+    """
+
+    tickers = ['AAPL', 'TSLA', 'NVDA', 'MSFT', 'AMZN', 'META', 'GOOG', 'PLTR']
+    phrases = [
+        'I think {t} is going to surge after earnings',
+        'Selling my {t} position, the downside risk is too high',
+        '{t} looks undervalued compared to its growth',
+        'Holding {t} long term, dividend is stable',
+        'Bearish on {t}, this is going to crash',
+    ]
+
+    def __init__(self, posts_per_subreddit=10, comments_per_post=20, latency=0.05, seed=42):
+        self.posts_per_subreddit = posts_per_subreddit
+        self.comments_per_post = comments_per_post
+        self.latency = latency
+        self.seed = seed
+
+        self.requests_made = 0
+        self.max_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._posts = {}
+
+    def subreddit(self, name):
+        return FakeSubreddit(self, name)
+
+    def submission(self, id):
+        """A listed post by ID, not yet fetched, like PRAW's lazy Submission"""
+        with self._lock:
+            post = next(post for posts in self._posts.values() for post in posts if post.id == id)
+        post = copy.copy(post)
+        post._forest = None
+        return post
+
+    def _simulate_request(self):
+        with self._lock:
+            self.requests_made += 1
+            self._active += 1
+            self.max_concurrency = max(self.max_concurrency, self._active)
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _posts_for(self, sub_name):
+        with self._lock:
+            if sub_name not in self._posts:
+                self._posts[sub_name] = self._generate_posts(sub_name)
+            return self._posts[sub_name]
+
+    def _generate_posts(self, sub_name):
+        rng = random.Random(f"{self.seed}:{sub_name}")
+        now = datetime.now().timestamp()
+        posts = []
+
+        for i in range(self.posts_per_subreddit):
+            post_id = f"{sub_name.lower()}{i:04d}"
+            created_utc = now - rng.uniform(0, 20 * 3600)
+            comments = [
+                FakeComment(
+                    rng.choice(self.phrases).format(t=rng.choice(self.tickers)),
+                    created_utc + rng.uniform(0, 3600),
+                    f"{post_id}c{j}",
+                    f"t3_{post_id}"
+                )
+                for j in range(self.comments_per_post)
+            ]
+            ticker = rng.choice(self.tickers)
+            posts.append(FakeSubmission(
+                self,
+                post_id=post_id,
+                title=f"{ticker} discussion thread #{i}",
+                selftext=rng.choice(self.phrases).format(t=ticker),
+                author=f"user_{rng.randint(1, 9999)}",
+                score=rng.randint(1, 5000),
+                created_utc=created_utc,
+                permalink=f"/r/{sub_name}/comments/{post_id}/thread_{i}/",
+                comments=comments
+            ))
+
+        return posts
+
+if __name__ == "__main__":
+    # Compare sequential and concurrent scraping against the stand-in client.
+    # The request budget is lifted so the run measures raw throughput.
+    from reddit_scrape import get_posts_with_comments
+
+    results = {}
+    for concurrent in (False, True):
+        client = FakeReddit(posts_per_subreddit=10, comments_per_post=20, latency=0.05)
+        start = time.perf_counter()
+        posts = get_posts_with_comments(client=client, concurrent=concurrent, max_in_flight=8,
+                                        requests_per_minute=None)
+        elapsed = time.perf_counter() - start
+
+        mode = 'concurrent' if concurrent else 'sequential'
+        results[mode] = posts
+        print(f"\n{mode}: {len(posts)} posts, {client.requests_made} requests, "
+              f"peak concurrency {client.max_concurrency}, {elapsed:.2f}s "
+              f"({client.requests_made / elapsed:.1f} req/s)")
+
+    same = [p['url'] for p in results['sequential']] == [p['url'] for p in results['concurrent']]
+    print(f"\nSame posts in the same order: {same}")
@@ -4,26 +4,47 @@ Main script to run the Reddit scraping, company extraction, and sentiment analys
 """
 
 import os
+import argparse
 from datetime import datetime
-import pandas as pd
-from reddit_scrape import get_posts_with_comments
-from extract_company import process_reddit_data
-from NB_classifier import SentimentAnalyzer
-from database import RedditDB
 
-def main():
+# The pipeline modules pull in pandas, praw, numpy and VADER, so they are
+# imported when a run starts rather than at startup
+
+def main(concurrent=False, max_in_flight=8, incremental=False, stream=False, workers=None,
+         use_cache=True, search=False, retention=True):
+    import pandas as pd
+    from reddit_scrape import get_posts_with_comments, is_mark_only
+    from extract_company import process_reddit_data
+    from NB_classifier import score_posts_parallel
+    from database import RedditDB, SeenPostIndex
+    from sentiment_cache import SentimentCache
+    from archive import write_archive
+    
     # Create output directory if it doesn't exist
     os.makedirs('output', exist_ok=True)
     
     print(f"\n=== Starting Reddit Analysis Pipeline at {datetime.now()} ===\n")
     
+    if stream:
+        run_streaming(concurrent=concurrent, max_in_flight=max_in_flight, incremental=incremental,
+                      workers=workers, use_cache=use_cache, search=search, retention=retention)
+        return
+    
     # Step 1: Scrape Reddit
     print("Step 1: Scraping Reddit posts...")
-    posts = get_posts_with_comments()
-    df = pd.DataFrame(posts)
+    seen_index = SeenPostIndex() if incremental else None
+    posts = get_posts_with_comments(concurrent=concurrent, max_in_flight=max_in_flight,
+                                    seen_index=seen_index)
+    df = pd.DataFrame([post for post in posts if not is_mark_only(post)])
     
     if df.empty:
-        print("!!! No posts were scraped from Reddit. Exiting. !!!")
+        if incremental:
+            # Seen posts whose new comments were all filtered out still
+            # advance their marks, so they aren't fetched again
+            seen_index.mark_seen(posts)
+            print("No new posts or comments since the last run. Exiting.")
+        else:
+            print("!!! No posts were scraped from Reddit. Exiting. !!!")
         return
 
     # Show summary of raw data
@@ -59,31 +80,18 @@ def main():
     # Step 3: Sentiment Analysis
     print("\nStep 3: Performing sentiment analysis...")
     
-    # Initialize sentiment analyzer
-    analyzer = SentimentAnalyzer()
-    
-    # Analyze sentiment
-    df['post_sentiment'] = None
-    df['post_score'] = None
-    df['post_word_score'] = None
-    df['comment_sentiment'] = None
-    df['comment_score'] = None
-    df['comment_word_scores'] = None
-    df['overall_sentiment'] = None
-    df['overall_score'] = None
-    df['num_comments_analyzed'] = None
-    
-    for idx, row in df.iterrows():
-        sentiment, confidence = analyzer.predict_sentiment(row.to_dict())
-        df.at[idx, 'post_sentiment'] = confidence['post_sentiment']
-        df.at[idx, 'post_score'] = float(confidence['post_score'])
-        df.at[idx, 'post_word_score'] = float(confidence['post_word_score'])
-        df.at[idx, 'comment_sentiment'] = confidence['comment_sentiment']
-        df.at[idx, 'comment_score'] = float(confidence['comment_score'])
-        df.at[idx, 'comment_word_scores'] = str(confidence['comment_word_scores'])  # Convert list to string for CSV
-        df.at[idx, 'overall_sentiment'] = confidence['overall_sentiment']
-        df.at[idx, 'overall_score'] = float(confidence['overall_score'])
-        df.at[idx, 'num_comments_analyzed'] = int(confidence['num_comments'])
+    # Score posts, on a process pool for large runs, reusing cached scores
+    # for texts seen on earlier runs
+    cache = SentimentCache() if use_cache else None
+    analyzer, model_path = load_analyzer()
+    records = df[['post_title', 'post_content', 'comments']].to_dict('records')
+    sentiment = pd.DataFrame(score_posts_parallel(records, workers=workers, analyzer=analyzer, cache=cache,
+                                                  model_path=model_path), index=df.index)
+    for column in sentiment.columns:
+        df[column] = sentiment[column]
+    if cache is not None:
+        print(cache.report())
+        cache.close()
     
     # Convert score columns to float
     score_columns = ['post_score', 'post_word_score', 'comment_score', 'overall_score']
@@ -92,16 +100,24 @@ def main():
     
     # Step 4: Save to database
     print("\nStep 4: Saving to database...")
-    db = RedditDB()
+    db = RedditDB(search=search)
     db.save_daily_data(df)
     
+    # Only advance the high-water marks once the delta is stored
+    if seen_index is not None:
+        seen_index.mark_seen(posts)
+        print(f"Seen-post index now holds {len(seen_index)} posts")
+    
+    if retention:
+        db.apply_retention()
+    
     # Also run the export
     print("\nStep 5: Exporting data for web dashboard...")
     db.export_for_web()
+    db.close()
 
-    # Save final results to CSV
-    final_output = os.path.join('output', f"reddit_analysis_complete_{datetime.now().strftime('%Y%m%d_%H%M')}.csv")
-    df.to_csv(final_output, index=False)
+    # Archive the final results
+    final_output = write_archive(df)
     
     print(f"\n=== Pipeline completed successfully at {datetime.now()} ===")
     print(f"Complete analysis saved to: {final_output}")
@@ -153,5 +169,85 @@ def main():
     print("\nTop Companies by Mention Count:")
     print(company_summary.sort_values('post_score_count', ascending=False).head(10))
 
+def load_analyzer():
+    """SentimentAnalyzer with the custom model loaded if one has been trained, and its path"""
+    from NB_classifier import SentimentAnalyzer, NB_MODEL_PATH
+    
+    analyzer = SentimentAnalyzer()
+    if not os.path.exists(NB_MODEL_PATH):
+        return analyzer, None
+    analyzer.load_model(NB_MODEL_PATH)
+    return analyzer, NB_MODEL_PATH
+
+def run_streaming(concurrent=False, max_in_flight=8, incremental=False, workers=None, use_cache=True,
+                  search=False, retention=True):
+    """Run all stages at once through the streaming pipeline, scoring on workers processes if more than one"""
+    from pipeline import run_streaming_pipeline
+    from database import RedditDB, SeenPostIndex
+    from sentiment_cache import SentimentCache
+    
+    print("Streaming: scraping, extraction, scoring and database writes run concurrently...")
+    db = RedditDB(search=search)
+    seen_index = SeenPostIndex() if incremental else None
+    analyzer, model_path = load_analyzer()
+    stats = run_streaming_pipeline(
+        scrape_kwargs={'concurrent': concurrent, 'max_in_flight': max_in_flight, 'seen_index': seen_index},
+        db=db,
+        seen_index=seen_index,
+        cache=SentimentCache() if use_cache else None,
+        analyzer=analyzer,
+        workers=workers,
+        model_path=model_path
+    )
+    
+    if not stats['posts']:
+        print("!!! No posts were scraped from Reddit. Exiting. !!!")
+        return
+    
+    if retention:
+        db.apply_retention()
+    
+    print("\nExporting data for web dashboard...")
+    db.export_for_web()
+    db.close()
+    
+    print(f"\n=== Pipeline completed successfully at {datetime.now()} ===")
+    print(f"Complete analysis saved to: {stats['archive_path']}")
+    print(f"Total posts collected: {stats['posts']}")
+    print(f"Total comments collected: {stats['comments']}")
+    
+    if stats['sentiment_cache']:
+        print(stats['sentiment_cache'])
+    
+    print("\nTop mentioned companies found in this run:")
+    for ticker, count in stats['ticker_counts'].most_common(10):
+        print(f"  {ticker}: {count} mentions")
+    
+    print("\nOverall Sentiment Distribution:")
+    for sentiment, count in stats['overall_sentiment'].most_common():
+        print(f"  {sentiment}: {count} posts")
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the Reddit sentiment pipeline")
+    parser.add_argument('--concurrent', action='store_true',
+                        help="Scrape subreddits and comment forests in parallel")
+    parser.add_argument('--max-in-flight', type=int, default=8,
+                        help="Maximum concurrent Reddit requests (with --concurrent)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only fetch posts and comments not seen on earlier runs")
+    parser.add_argument('--stream', action='store_true',
+                        help="Overlap scraping, extraction, scoring and database writes")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Sentiment scoring processes for large runs (default: one per CPU; "
+                             "with --stream, scoring uses a process pool only when given and above 1)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Rescore every text instead of reusing cached sentiment scores")
+    parser.add_argument('--search', action='store_true',
+                        help="Create a full-text index of posts and comments (kept up to date once created)")
+    parser.add_argument('--no-retention', action='store_true',
+                        help="Keep all raw posts and daily summaries instead of expiring them to the archive")
+    args = parser.parse_args()
+    
+    main(concurrent=args.concurrent, max_in_flight=args.max_in_flight,
+         incremental=args.incremental, stream=args.stream, workers=args.workers,
+         use_cache=not args.no_cache, search=args.search, retention=not args.no_retention)
\ No newline at end of file
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Streaming pipeline: overlaps Reddit I/O with ticker extraction, sentiment
+scoring and database writes.
+
+Each stage runs on its own thread and hands records to the next through a
+bounded queue, so a slow stage pushes back on the ones before it and memory
+stays bounded by the queue sizes rather than the size of the scrape.
+
+The threads overlap Reddit's network waits with the CPU-bound stages, but
+the GIL keeps extraction and scoring to one core between them. Scoring, the
+heavier of the two, can run on a process pool instead (workers > 1).
+"""
+
+import queue
+import threading
+from collections import Counter, deque
+from concurrent.futures import wait
+from datetime import datetime
+import pandas as pd
+from reddit_scrape import is_mark_only, iter_posts_with_comments
+from extract_company import StockIdentifier, attribute_post_tickers
+from NB_classifier import SentimentAnalyzer, scoring_pool, sentiment_fields, submit_scoring
+from database import RedditDB
+from archive import ARCHIVE_DIR, ArchiveWriter
+
+# Marks the end of a stage's input
+_DONE = object()
+
+class PipelineError(RuntimeError):
+    """Raised when a pipeline stage fails"""
+
+class _Stage(threading.Thread):
+    """Thread that applies fn to each record from inbox and passes the result on"""
+
+    def __init__(self, name, fn, inbox, outbox, stop, errors):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop = stop
+        self.errors = errors
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                try:
+                    item = self.inbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                _put(self.outbox, self.fn(item), self.stop)
+        except Exception as e:
+            self.errors.append((self.name, e))
+            self.stop.set()
+        finally:
+            _put(self.outbox, _DONE, self.stop, force=True)
+
+class _PoolScoreStage(threading.Thread):
+    """
+    Scoring stage that sends chunks of posts to a process pool (see
+    NB_classifier.scoring_pool), keeping at most max_chunks in flight, and
+    passes the scored posts on in their arrival order
+    """
+
+    def __init__(self, executor, chunk_size, max_chunks, inbox, outbox, stop, errors, cache=None):
+        super().__init__(name='score', daemon=True)
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop = stop
+        self.errors = errors
+        self.cache = cache
+        self.in_flight = deque()
+
+    def _submit(self, chunk):
+        self.in_flight.append((chunk, submit_scoring(self.executor, chunk)))
+
+    def _pass_on(self):
+        posts, future = self.in_flight.popleft()
+        results, stats = future.result()
+        if self.cache is not None:
+            self.cache.merge_stats(stats)
+        for post, fields in zip(posts, results):
+            post.update(fields)
+            _put(self.outbox, post, self.stop)
+
+    def run(self):
+        chunk = []
+        done = False
+        try:
+            while not self.stop.is_set():
+                if self.in_flight and self.in_flight[0][1].done():
+                    self._pass_on()
+                    continue
+                if self.in_flight and (done or len(self.in_flight) >= self.max_chunks):
+                    # Wait for the oldest chunk rather than take more posts
+                    wait([self.in_flight[0][1]], timeout=0.1)
+                    continue
+                if done:
+                    break
+                try:
+                    item = self.inbox.get(timeout=0.1)
+                except queue.Empty:
+                    # Score a partial chunk rather than hold it while the scrape waits
+                    if chunk:
+                        self._submit(chunk)
+                        chunk = []
+                    continue
+                if item is _DONE:
+                    done = True
+                else:
+                    chunk.append(item)
+                if chunk and (done or len(chunk) >= self.chunk_size):
+                    self._submit(chunk)
+                    chunk = []
+        except Exception as e:
+            self.errors.append((self.name, e))
+            self.stop.set()
+        finally:
+            _put(self.outbox, _DONE, self.stop, force=True)
+
+def _put(q, item, stop, force=False):
+    """Put with backpressure, giving up if the pipeline is shutting down"""
+    while True:
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            if stop.is_set() and not force:
+                return
+            if stop.is_set():
+                # Make room so the end-of-stream marker always gets through
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+
+def run_streaming_pipeline(scrape_kwargs=None, db=None, seen_index=None, date=None,
+                           batch_size=25, queue_size=50, archive_dir=ARCHIVE_DIR, posts=None,
+                           cache=None, analyzer=None, workers=None, model_path=None):
+    """
+    Run scrape -> extract -> score -> write as concurrent stages.
+
+    posts may be any iterable of post records to stream instead of scraping
+    Reddit (e.g. the offline FakeReddit client's output). Posts are written
+    to posts_raw and the run's archive file in batches of batch_size; the daily summary is
+    refreshed once at the end. cache is an optional
+    sentiment_cache.SentimentCache for the scoring stage, and analyzer a
+    SentimentAnalyzer to score with (e.g. one with a custom model loaded).
+    With workers > 1, posts are scored in chunks of batch_size on a pool of
+    that many processes instead, which load the custom model at model_path
+    if given. Returns a dict of run statistics.
+    """
+    db = db or RedditDB()
+    if date is None:
+        date = datetime.now().strftime('%Y-%m-%d')
+    if posts is None:
+        posts = iter_posts_with_comments(**(scrape_kwargs or {}))
+
+    archive = ArchiveWriter(date, archive_dir)
+
+    stock_id = StockIdentifier()
+    executor = scoring_pool(workers, model_path, cache) if workers and workers > 1 else None
+    if executor is None:
+        analyzer = analyzer or SentimentAnalyzer()
+        if cache is not None:
+            analyzer.cache = cache
+
+    def extract(post):
+        post['ticker_comments'] = attribute_post_tickers(stock_id, post)
+        post['mentioned_tickers'] = list(post['ticker_comments'])
+        return post
+
+    def score(post):
+        post.update(sentiment_fields(analyzer.predict_sentiment(post)))
+        return post
+
+    stop = threading.Event()
+    errors = []
+    to_extract = queue.Queue(maxsize=queue_size)
+    to_score = queue.Queue(maxsize=queue_size)
+    to_write = queue.Queue(maxsize=queue_size)
+
+    if executor is None:
+        score_stage = _Stage('score', score, to_score, to_write, stop, errors)
+    else:
+        score_stage = _PoolScoreStage(executor, batch_size, workers * 2, to_score, to_write, stop, errors, cache)
+    stages = [
+        _Stage('extract', extract, to_extract, to_score, stop, errors),
+        score_stage,
+    ]
+
+    # Records that only advance a seen post's mark skip the stages; they are
+    # marked once the run's writes are done
+    mark_only = []
+
+    def scrape():
+        try:
+            for post in posts:
+                if stop.is_set():
+                    break
+                if is_mark_only(post):
+                    mark_only.append(post)
+                    continue
+                _put(to_extract, post, stop)
+        except Exception as e:
+            errors.append(('scrape', e))
+            stop.set()
+        finally:
+            _put(to_extract, _DONE, stop, force=True)
+
+    scraper = threading.Thread(target=scrape, name='scrape', daemon=True)
+    scraper.start()
+    for stage in stages:
+        stage.start()
+
+    stats = {
+        'posts': 0,
+        'comments': 0,
+        'batches': 0,
+        'ticker_counts': Counter(),
+        'overall_sentiment': Counter(),
+        'archive_path': archive.path,
+        'sentiment_cache': None
+    }
+
+    # Dates whose daily summaries the writes affect (posts first stored on
+    # an earlier date can be updated)
+    summary_dates = {date}
+
+    def write(batch):
+        batch_df = pd.DataFrame(batch)
+        summary_dates.update(db.append_posts(batch_df, date))
+        archive.write(batch_df)
+        if seen_index is not None:
+            seen_index.mark_seen(batch)
+
+        stats['batches'] += 1
+        stats['posts'] += len(batch)
+        stats['comments'] += int(batch_df['num_comments'].sum())
+        for post in batch:
+            stats['ticker_counts'].update(post['mentioned_tickers'])
+            stats['overall_sentiment'][post['overall_sentiment']] += 1
+        print(f"  Wrote batch {stats['batches']} ({stats['posts']} posts so far)")
+
+    # The writer runs on this thread and drains the last queue
+    batch = []
+    try:
+        while True:
+            try:
+                item = to_write.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            batch.append(item)
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+        if batch and not errors:
+            write(batch)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        scraper.join(timeout=5)
+        for stage in stages:
+            stage.join(timeout=5)
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        # Batches already in the database are archived even if a stage failed
+        archive.close()
+
+    if errors:
+        name, error = errors[0]
+        raise PipelineError(f"Pipeline stage '{name}' failed: {error}") from error
+
+    if seen_index is not None and mark_only:
+        seen_index.mark_seen(mark_only)
+    if stats['posts']:
+        db.refresh_daily_summaries(summary_dates)
+    if cache is not None:
+        stats['sentiment_cache'] = cache.report()
+        cache.close()
+    return stats
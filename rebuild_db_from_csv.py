@@ -13,7 +13,8 @@ def rebuild_database_from_csvs(output_dir='output/these', new_db_path='reddit_se
         os.remove(new_db_path)
         print(f"Removed existing database: {new_db_path}")
 
-    # 2. Initialize a new, clean database and create the schema
+    # 2. Initialize a new, clean database and create the schema. Every CSV
+    #    is written through this one connection.
     db = RedditDB(db_path=new_db_path)
     print(f"Created new database: {new_db_path}")
 
@@ -30,6 +31,7 @@ def rebuild_database_from_csvs(output_dir='output/these', new_db_path='reddit_se
     print(f"Found {len(csv_files)} CSV files to process.")
 
     # 4. Process each CSV file
+    dates = []
     for file_name in sorted(csv_files):
         file_path = os.path.join(output_dir, file_name)
         
@@ -53,11 +55,17 @@ def rebuild_database_from_csvs(output_dir='output/these', new_db_path='reddit_se
         print(f"  - Read {len(df)} rows from CSV.")
         
         # 5. Save the DataFrame to the database for the extracted date
-        db.save_daily_data(df, date=run_date)
+        db.append_posts(df, date=run_date)
+        dates.append(run_date)
+
+    # 6. Aggregate the daily summaries for every date in one statement
+    if dates:
+        db.refresh_daily_summary(min(dates), max(dates))
 
     print("\n✅ Database rebuild complete.")
     print("Running final export to update web data...")
     db.export_for_web()
+    db.close()
     print("✅ Web data exported successfully.")
     print(f"\nYour new database is ready: '{new_db_path}'")
     print("The web dashboard data has been updated from this new database.")
@@ -3,10 +3,13 @@
 Reddit scraper - gets posts with all their comments grouped together
 """
 
-import praw
-import pandas as pd
 from datetime import datetime, timedelta
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -20,65 +23,354 @@ CLIENT_SECRET = "uv5s2uQTrI27OFP4_4MJI5FZEUpkMg"
 USER_AGENT = "tickerData by kentobox3000"
 # ---
 
-# Initialize PRAW with your credentialsß
-reddit = praw.Reddit(
-    client_id=CLIENT_ID,
-    client_secret=CLIENT_SECRET,
-    user_agent=USER_AGENT
-)
+# PRAW client, created by get_reddit on first use so importing this
+# module doesn't load praw
+reddit = None
+
+# PRAW clients aren't thread-safe, so concurrent scrapes give each worker
+# thread its own (see _thread_reddit)
+_thread_clients = threading.local()
+
+def _new_reddit():
+    """A PRAW client initialized with your credentials"""
+    import praw
+    return praw.Reddit(
+        client_id=CLIENT_ID,
+        client_secret=CLIENT_SECRET,
+        user_agent=USER_AGENT
+    )
+
+def get_reddit():
+    """Return the shared PRAW client, initializing it with your credentials"""
+    global reddit
+    if reddit is None:
+        reddit = _new_reddit()
+    return reddit
+
+def _thread_reddit():
+    """Return the calling thread's own PRAW client"""
+    if getattr(_thread_clients, 'reddit', None) is None:
+        _thread_clients.reddit = _new_reddit()
+    return _thread_clients.reddit
 
 # Top 5 stock subreddits
 subreddits = ['stocks', 'investing', 'wallstreetbets', 'SecurityAnalysis', 'StockMarket']
 
-def get_posts_with_comments():
-    """Pull posts and group all their comments together"""
+# Reddit allows 100 OAuth requests per minute per client
+REDDIT_REQUESTS_PER_MINUTE = 100
+
+# Latest comments listed per subreddit on incremental runs (one request)
+RECENT_COMMENTS_LIMIT = 100
+
+class RequestScheduler:
+    """
+    Shared gate for concurrent Reddit requests.
+    Caps requests in flight (overall and per subreddit) and spends a
+    token bucket refilled at Reddit's per-minute request budget.
+    """
     
-    all_posts = []
-    cutoff_time = datetime.now() - timedelta(hours=24)
+    def __init__(self, max_in_flight=8, per_subreddit_in_flight=2,
+                 requests_per_minute=REDDIT_REQUESTS_PER_MINUTE, burst=10):
+        self.max_in_flight = max_in_flight
+        self.per_subreddit_in_flight = per_subreddit_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.requests_made = 0
+        
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._subreddit_slots = {}
+        self._lock = threading.Lock()
+        
+        # Token bucket state
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
     
-    for sub_name in subreddits:
-        print(f"Getting data from r/{sub_name}...")
+    def _slots_for(self, sub_name):
+        with self._lock:
+            if sub_name not in self._subreddit_slots:
+                self._subreddit_slots[sub_name] = threading.BoundedSemaphore(self.per_subreddit_in_flight)
+            return self._subreddit_slots[sub_name]
+    
+    def _take_token(self):
+        """Block until the request budget allows one more request"""
+        if not self.requests_per_minute:
+            with self._lock:
+                self.requests_made += 1
+            return
         
-        subreddit = reddit.subreddit(sub_name)
+        rate = self.requests_per_minute / 60.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.requests_made += 1
+                    return
+                wait = (1 - self._tokens) / rate
+            time.sleep(wait)
+    
+    @contextmanager
+    def request(self, sub_name):
+        """Hold one in-flight slot for a request against sub_name"""
+        with self._slots_for(sub_name), self._in_flight:
+            self._take_token()
+            yield
+
+def _collect_post(post, sub_name, cutoff_time, mark=None):
+    """
+    Fetch a post's comment forest and build its post record.
+    mark is the post's (last_comment_utc, num_comments) entry from a
+    SeenPostIndex; when given, only comments newer than it are kept. If
+    none of them are, the record only advances the mark (see is_mark_only).
+    """
+    post_time = datetime.fromtimestamp(post.created_utc)
+    since_utc = mark[0] if mark else None
+    
+    # Collect all comments for this post, and their Reddit IDs and times
+    comments_list = []
+    comment_ids = []
+    comment_times = []
+    last_comment_utc = since_utc or post.created_utc
+    post.comments.replace_more(limit=0)
+    
+    for comment in post.comments:
+        if since_utc is not None and comment.created_utc <= since_utc:
+            continue  # Already processed on an earlier run
+        last_comment_utc = max(last_comment_utc, comment.created_utc)
+        
+        comment_time = datetime.fromtimestamp(comment.created_utc)
         
-        # Get top posts from last 24 hours
-        for post in subreddit.top(time_filter='day', limit=10):
-            post_time = datetime.fromtimestamp(post.created_utc)
+        if (comment_time >= cutoff_time and 
+            comment.body not in ['[deleted]', '[removed]'] and
+            len(comment.body.strip()) > 10):  # Skip very short comments
             
-            if post_time >= cutoff_time:
-                # Collect all comments for this post
-                comments_list = []
-                post.comments.replace_more(limit=0)
-                
-                for comment in post.comments:
-                    comment_time = datetime.fromtimestamp(comment.created_utc)
-                    
-                    if (comment_time >= cutoff_time and 
-                        comment.body not in ['[deleted]', '[removed]'] and
-                        len(comment.body.strip()) > 10):  # Skip very short comments
-                        
-                        comments_list.append(comment.body.strip())
-                
-                # Add post with all its comments
-                post_data = {
-                    'subreddit': sub_name,
-                    'post_title': post.title,
-                    'post_content': post.selftext if post.selftext else '',
-                    'post_author': str(post.author) if post.author else 'Unknown',
-                    'post_score': post.score,
-                    'num_comments': len(comments_list),
-                    'created': post_time,
-                    'comments': comments_list,  # List of all comment texts
-                    'url': f"https://reddit.com{post.permalink}"
-                }
+            comments_list.append(comment.body.strip())
+            comment_ids.append(comment.id)
+            comment_times.append(comment.created_utc)
+    
+    # Add post with all its comments
+    post_data = {
+        'post_id': post.id,
+        'subreddit': sub_name,
+        'post_title': post.title,
+        'post_content': post.selftext if post.selftext else '',
+        'post_author': str(post.author) if post.author else 'Unknown',
+        'post_score': post.score,
+        'num_comments': len(comments_list),
+        'created': post_time,
+        'comments': comments_list,  # List of all comment texts
+        'comment_ids': comment_ids,
+        'comment_times': comment_times,
+        'url': f"https://reddit.com{post.permalink}",
+        'is_new_post': mark is None,
+        'last_comment_utc': last_comment_utc,
+        'reddit_num_comments': post.num_comments
+    }
+    
+    print(f"  Got post: '{post.title[:50]}...' with {len(comments_list)} "
+          f"{'comments' if mark is None else 'new comments'}")
+    return post_data
+
+def is_mark_only(post):
+    """
+    Whether a post record only advances a seen post's SeenPostIndex mark, as
+    its new comments were all filtered out (deleted, too short or too old).
+    Such records are passed to mark_seen, so the post isn't fetched again,
+    but there is nothing in them to analyze or store.
+    """
+    return not post['is_new_post'] and not post['comments']
+
+def _pending_posts(posts, seen_index=None, comment_times=None):
+    """
+    Pair each listed post with its SeenPostIndex mark, dropping seen posts
+    with no sign of new comments since they were last processed: neither a
+    higher comment count nor, in comment_times (from _fetch_comment_times),
+    a comment newer than the newest one processed. Deleted comments can keep
+    Reddit's count unchanged when new ones arrive, so the count alone
+    isn't enough.
+    """
+    if seen_index is None:
+        return [(post, None) for post in posts]
+    
+    comment_times = comment_times or {}
+    marks = seen_index.get_marks([post.id for post in posts])
+    pending = []
+    for post in posts:
+        mark = marks.get(post.id)
+        if mark is None or post.num_comments > mark[1] or comment_times.get(post.id, 0) > mark[0]:
+            pending.append((post, mark))
+    return pending
+
+def _fetch_recent_posts(client, sub_name, limit, cutoff_time, scheduler=None):
+    """Get the top posts of the last 24 hours for one subreddit"""
+    print(f"Getting data from r/{sub_name}...")
+    
+    subreddit = client.subreddit(sub_name)
+    
+    if scheduler is None:
+        posts = list(subreddit.top(time_filter='day', limit=limit))
+    else:
+        with scheduler.request(sub_name):
+            posts = list(subreddit.top(time_filter='day', limit=limit))
+    
+    return [post for post in posts if datetime.fromtimestamp(post.created_utc) >= cutoff_time]
+
+def _fetch_comment_times(client, sub_name, scheduler=None):
+    """{post_id: newest created_utc} over a subreddit's latest comments"""
+    subreddit = client.subreddit(sub_name)
+    
+    if scheduler is None:
+        comments = list(subreddit.comments(limit=RECENT_COMMENTS_LIMIT))
+    else:
+        with scheduler.request(sub_name):
+            comments = list(subreddit.comments(limit=RECENT_COMMENTS_LIMIT))
+    
+    comment_times = {}
+    for comment in comments:
+        post_id = comment.link_id.split('_', 1)[-1]
+        comment_times[post_id] = max(comment_times.get(post_id, 0), comment.created_utc)
+    return comment_times
+
+def _fetch_recent_posts_scheduled(get_client, sub_name, limit, cutoff_time, scheduler, comment_times=False):
+    client = get_client()
+    posts = _fetch_recent_posts(client, sub_name, limit, cutoff_time, scheduler)
+    return posts, _fetch_comment_times(client, sub_name, scheduler) if comment_times else None
+
+def _collect_post_scheduled(post, sub_name, cutoff_time, mark, scheduler, get_client=None):
+    with scheduler.request(sub_name):
+        if get_client is not None:
+            # Fetch the post through this thread's client rather than the one
+            # that listed it; this is the same single request for the post and
+            # its comments
+            post = get_client().submission(id=post.id)
+        return _collect_post(post, sub_name, cutoff_time, mark)
+
+def iter_posts_with_comments(client=None, concurrent=False, max_in_flight=8,
+                             per_subreddit_in_flight=2, post_limit=10, subreddit_limits=None,
+                             requests_per_minute=REDDIT_REQUESTS_PER_MINUTE, seen_index=None,
+                             ordered=False):
+    """
+    Yield post records as soon as their comments have been fetched
+    
+    With concurrent=True, subreddit listings and comment forests are fetched
+    on a thread pool behind a shared RequestScheduler, and posts are yielded
+    in completion order unless ordered=True. A subreddit's comment fetches
+    start as soon as its listing arrives. Without a client, each worker
+    thread uses a PRAW client of its own, as PRAW isn't thread-safe; a
+    client passed in is shared by all workers, so it must be thread-safe
+    (as FakeReddit is). subreddit_limits maps a subreddit name to its own
+    post limit (default post_limit).
+    
+    With a seen_index (database.SeenPostIndex), only new posts and comments
+    newer than each post's high-water mark are returned. Seen posts aren't
+    fetched at all unless their comment count has grown or a subreddit's
+    latest comments (one more request per subreddit) include a newer one.
+    The caller marks the returned posts as seen once they are safely stored;
+    records for which is_mark_only() is true are only to be marked.
+    """
+    subreddit_limits = subreddit_limits or {}
+    cutoff_time = datetime.now() - timedelta(hours=24)
+    check_comment_times = seen_index is not None and len(seen_index) > 0
+    
+    if not concurrent:
+        client = client or get_reddit()
+        for sub_name in subreddits:
+            limit = subreddit_limits.get(sub_name, post_limit)
+            posts = _fetch_recent_posts(client, sub_name, limit, cutoff_time)
+            comment_times = _fetch_comment_times(client, sub_name) if check_comment_times else None
+            for post, mark in _pending_posts(posts, seen_index, comment_times):
+                yield _collect_post(post, sub_name, cutoff_time, mark)
+        return
+    
+    scheduler = RequestScheduler(
+        max_in_flight=max_in_flight,
+        per_subreddit_in_flight=per_subreddit_in_flight,
+        requests_per_minute=requests_per_minute
+    )
+    
+    if client is None:
+        get_client, post_client = _thread_reddit, _thread_reddit
+    else:
+        get_client, post_client = (lambda: client), None
+    
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        listing_futures = {
+            executor.submit(
+                _fetch_recent_posts_scheduled, get_client, sub_name,
+                subreddit_limits.get(sub_name, post_limit), cutoff_time, scheduler, check_comment_times
+            ): sub_name
+            for sub_name in subreddits
+        }
+        
+        # Each subreddit's posts still to fetch, the fetches of it under way,
+        # and (when ordered) its results so far
+        queued = {}
+        running = {sub_name: 0 for sub_name in subreddits}
+        post_futures = {}
+        results = {}
+        next_sub, next_post = 0, 0
+        
+        pending = set(listing_futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in listing_futures:
+                    sub_name = listing_futures[future]
+                    posts, comment_times = future.result()
+                    posts = _pending_posts(posts, seen_index, comment_times)
+                    queued[sub_name] = deque(enumerate(posts))
+                    results[sub_name] = [None] * len(posts)
+                    continue
                 
-                all_posts.append(post_data)
-                print(f"  Got post: '{post.title[:50]}...' with {len(comments_list)} comments")
+                sub_name, i = post_futures.pop(future)
+                running[sub_name] -= 1
+                if ordered:
+                    results[sub_name][i] = future
+                else:
+                    yield future.result()
+            
+            # Keep each subreddit at its in-flight cap, so a busy subreddit's
+            # fetches don't fill the pool with workers waiting on that cap
+            for sub_name, posts in queued.items():
+                while posts and running[sub_name] < per_subreddit_in_flight:
+                    i, (post, mark) = posts.popleft()
+                    future = executor.submit(
+                        _collect_post_scheduled, post, sub_name, cutoff_time, mark, scheduler, post_client
+                    )
+                    post_futures[future] = (sub_name, i)
+                    running[sub_name] += 1
+                    pending.add(future)
+            
+            # Yield posts in the sequential scrape's order as they become ready
+            while ordered and next_sub < len(subreddits) and subreddits[next_sub] in results:
+                sub_results = results[subreddits[next_sub]]
+                if next_post == len(sub_results):
+                    next_sub, next_post = next_sub + 1, 0
+                elif sub_results[next_post] is not None:
+                    post_data = sub_results[next_post].result()
+                    sub_results[next_post] = None
+                    next_post += 1
+                    yield post_data
+                else:
+                    break
     
-    return all_posts
+    print(f"Made {scheduler.requests_made} Reddit requests (max {max_in_flight} in flight)")
+
+def get_posts_with_comments(**kwargs):
+    """
+    Pull posts and group all their comments together
+    
+    Takes the same options as iter_posts_with_comments. Posts come back in
+    the same order as the sequential scrape, even when fetched concurrently.
+    """
+    return list(iter_posts_with_comments(ordered=True, **kwargs))
 
 def save_to_csv(posts, output_dir='output'):
     """Save posts to CSV in the output directory"""
+    import pandas as pd
+    
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of per-text sentiment scores.
+
+SentimentAnalyzer scores a post and each of its comments as separate texts.
+Top posts stay in the 24-hour window across runs and bots repeat the same
+comments, so the same texts get scored again and again. This cache keys
+each text's scores by a hash of the whitespace-normalized text plus the
+analyzer's scoring version (a digest of word_scores, the VADER/lexicon
+weights and the thresholds), so changing any of those simply stops old
+entries from matching.
+
+Two tiers: a size-bounded in-memory LRU, and a SQLite table in
+sentiment_cache.db next to reddit_sentiment.db that persists across runs.
+Entries of every version share the table (runs with and without a custom
+model each keep theirs), which close() bounds by dropping the oldest.
+"""
+
+import hashlib
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+DEFAULT_DB_PATH = 'sentiment_cache.db'
+
+# (compound, word_score) for one text
+Scores = Tuple[float, float]
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace; VADER and the lexicon score are unaffected by them"""
+    return ' '.join(text.split()) if isinstance(text, str) else ''
+
+class SentimentCache:
+    """Two-tier (LRU + SQLite) cache of per-text sentiment scores with hit statistics"""
+
+    # Stay well under SQLite's bound-parameter limit
+    LOOKUP_BATCH_SIZE = 500
+
+    # Buffered persistent writes are committed in batches of this size
+    FLUSH_SIZE = 2000
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_memory_entries=100000, persistent=True,
+                 max_disk_entries=1000000):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.persistent = persistent
+        self.max_disk_entries = max_disk_entries
+        self.version = None
+
+        self._memory = OrderedDict()
+        self._pending = {}
+        self._conn = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'compute_seconds': 0.0
+        }
+
+    def _connect(self):
+        # Opened on first use, so a cache can be created in one process and
+        # used in another. Callers use a cache from one thread at a time, but
+        # not always the thread that created it (e.g. the pipeline's score stage).
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS sentiment_cache (
+                    key BLOB PRIMARY KEY,
+                    version TEXT NOT NULL,
+                    compound REAL NOT NULL,
+                    word_score REAL NOT NULL,
+                    stored_at REAL NOT NULL DEFAULT 0
+                ) WITHOUT ROWID
+            ''')
+            # Caches from before entries were pruned by age lack the column
+            columns = {info[1] for info in self._conn.execute('PRAGMA table_info(sentiment_cache)')}
+            if 'stored_at' not in columns:
+                self._conn.execute('ALTER TABLE sentiment_cache ADD COLUMN stored_at REAL NOT NULL DEFAULT 0')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_sentiment_cache_stored_at ON sentiment_cache (stored_at)'
+            )
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS sentiment_cache_meta (
+                    name TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                )
+            ''')
+        return self._conn
+
+    def create(self):
+        """
+        Create the cache file and its tables now. Worker processes that open
+        a new file at the same time can fail to switch it to WAL mode.
+        """
+        if self.persistent:
+            self._connect()
+
+    def set_version(self, version: str):
+        """
+        Switch to an analyzer scoring version. Entries of other versions stay
+        on disk for the runs (or pool workers) still using them; their keys
+        never match this version's.
+        """
+        if version == self.version:
+            return
+        self.flush()
+        self._memory.clear()
+        self.version = version
+
+    def key(self, text: str) -> bytes:
+        """Cache key of a text under the current version"""
+        data = f"{self.version}\0{normalize_text(text)}".encode('utf-8', 'surrogatepass')
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, Scores]:
+        """Look up keys in memory, then on disk; missing keys are left out"""
+        found = {}
+        disk_keys = []
+        for key in dict.fromkeys(keys):
+            scores = self._memory.get(key)
+            if scores is None:
+                disk_keys.append(key)
+            else:
+                self._memory.move_to_end(key)
+                found[key] = scores
+        self.stats['memory_hits'] += len(found)
+
+        if disk_keys and self.persistent:
+            conn = self._connect()
+            on_disk = {}
+            for i in range(0, len(disk_keys), self.LOOKUP_BATCH_SIZE):
+                chunk = disk_keys[i:i + self.LOOKUP_BATCH_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT key, compound, word_score FROM sentiment_cache WHERE key IN ({placeholders})',
+                    chunk
+                )
+                for key, compound, word_score in rows:
+                    on_disk[key] = (compound, word_score)
+            self.stats['disk_hits'] += len(on_disk)
+            self._remember(on_disk)
+            found.update(on_disk)
+        return found
+
+    def put_many(self, scores: Dict[bytes, Scores]):
+        """Store newly computed scores in memory, and queue them for disk"""
+        self._remember(scores)
+        if self.persistent:
+            self._pending.update(scores)
+            if len(self._pending) >= self.FLUSH_SIZE:
+                self.flush()
+
+    def _remember(self, scores: Dict[bytes, Scores]):
+        self._memory.update(scores)
+        for key in scores:
+            self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def record_compute(self, texts: int, seconds: float):
+        """Count texts that missed the cache and the time spent scoring them"""
+        self.stats['misses'] += texts
+        self.stats['compute_seconds'] += seconds
+
+    def merge_stats(self, stats: Dict):
+        """Add statistics gathered by another cache (e.g. in a worker process)"""
+        for name, value in stats.items():
+            self.stats[name] += value
+
+    def flush(self):
+        """Commit queued entries to the SQLite tier"""
+        if not self._pending:
+            return
+        conn = self._connect()
+        stored_at = time.time()
+        conn.executemany(
+            '''
+            INSERT OR REPLACE INTO sentiment_cache (key, version, compound, word_score, stored_at)
+            VALUES (?, ?, ?, ?, ?)
+            ''',
+            [(key, self.version, compound, word_score, stored_at)
+             for key, (compound, word_score) in self._pending.items()]
+        )
+        conn.commit()
+        self._pending = {}
+
+    def _seconds_per_text(self) -> float:
+        """Average scoring time of a text: from this run, else as last recorded"""
+        if self.stats['misses']:
+            return self.stats['compute_seconds'] / self.stats['misses']
+        if not self.persistent:
+            return 0.0
+        row = self._connect().execute(
+            "SELECT value FROM sentiment_cache_meta WHERE name = 'seconds_per_text'"
+        ).fetchone()
+        return row[0] if row else 0.0
+
+    def prune(self):
+        """Drop the oldest entries on disk past max_disk_entries, whatever their version"""
+        if not self.persistent or self.max_disk_entries is None:
+            return
+        self.flush()
+        conn = self._connect()
+        excess = conn.execute('SELECT COUNT(*) FROM sentiment_cache').fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            conn.execute('''
+                DELETE FROM sentiment_cache WHERE key IN (
+                    SELECT key FROM sentiment_cache ORDER BY stored_at LIMIT ?
+                )
+            ''', (excess,))
+            conn.commit()
+
+    def close(self):
+        self.flush()
+        self.prune()
+        if self.persistent and self.stats['misses']:
+            # Lets fully cached runs still estimate the time they saved
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO sentiment_cache_meta (name, value) VALUES ('seconds_per_text', ?)",
+                (self._seconds_per_text(),)
+            )
+            conn.commit()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __len__(self):
+        if not self.persistent:
+            return len(self._memory)
+        self.flush()
+        return self._connect().execute('SELECT COUNT(*) FROM sentiment_cache').fetchone()[0]
+
+    def report(self) -> str:
+        """One-line summary of this run's hit rates and estimated time saved"""
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = hits + self.stats['misses']
+        if not lookups:
+            return "Sentiment cache: no texts scored"
+
+        # Hits are assumed to cost what an average miss costs to compute
+        per_text = self._seconds_per_text()
+        return (f"Sentiment cache: {hits}/{lookups} texts cached ({hits / lookups:.0%}; "
+                f"{self.stats['memory_hits']} memory, {self.stats['disk_hits']} disk), "
+                f"{self.stats['misses']} scored in {self.stats['compute_seconds']:.1f}s, "
+                f"~{hits * per_text:.1f}s saved")
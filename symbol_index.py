@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Ticker symbol universe for StockIdentifier.
+
+Symbols come from data/symbols.csv plus, when present, the NASDAQ Trader
+symbol directory files (data/nasdaqlisted.txt and data/otherlisted.txt,
+which cover NASDAQ, NYSE, NYSE American and NYSE Arca listings). Company
+name aliases come from data/company_aliases.csv.
+
+The parsed index is cached as a pickle next to the source files and
+rebuilt automatically whenever one of them changes.
+"""
+
+import csv
+import os
+import pickle
+import re
+import urllib.request
+from typing import Dict, FrozenSet
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CACHE_FILE = 'symbol_index.pickle'
+CACHE_VERSION = 1
+
+# NASDAQ Trader symbol directory (refreshed nightly)
+NASDAQ_TRADER_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/{}'
+NASDAQ_TRADER_FILES = ['nasdaqlisted.txt', 'otherlisted.txt']
+
+# Exchange codes used in otherlisted.txt
+EXCHANGE_CODES = {
+    'A': 'NYSE American',
+    'N': 'NYSE',
+    'P': 'NYSE Arca',
+    'Z': 'Cboe BZX',
+    'V': 'IEX'
+}
+
+# Only plain share-class symbols can be matched in text
+SYMBOL_PATTERN = re.compile(r'^[A-Z]{1,5}$')
+
+class SymbolIndex:
+    """Frozen symbol set plus name and alias lookups"""
+
+    __slots__ = ('symbols', 'names', 'etfs', 'aliases')
+
+    def __init__(self, symbols: FrozenSet[str], names: Dict[str, str],
+                 etfs: FrozenSet[str], aliases: Dict[str, str]):
+        self.symbols = symbols    # frozenset of ticker symbols
+        self.names = names        # symbol -> security name
+        self.etfs = etfs          # frozenset of ETF symbols
+        self.aliases = aliases    # lowercase company alias -> symbol
+
+    def __contains__(self, symbol):
+        return symbol in self.symbols
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __getstate__(self):
+        return (self.symbols, self.names, self.etfs, self.aliases)
+
+    def __setstate__(self, state):
+        self.symbols, self.names, self.etfs, self.aliases = state
+
+def _source_files(data_dir):
+    files = ['symbols.csv', 'company_aliases.csv'] + NASDAQ_TRADER_FILES
+    return [os.path.join(data_dir, f) for f in files if os.path.exists(os.path.join(data_dir, f))]
+
+def _fingerprint(paths):
+    """Identify the exact source files a cache was built from"""
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+    return (CACHE_VERSION, tuple(fingerprint))
+
+def _read_symbol_directory(path, symbol_column):
+    """Parse a pipe-delimited NASDAQ Trader file into (symbol, name, exchange, is_etf) rows"""
+    rows = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f, delimiter='|'):
+            symbol = (record.get(symbol_column) or '').strip()
+            if not symbol or symbol.startswith('File Creation Time'):
+                continue
+            if record.get('Test Issue') == 'Y':
+                continue
+            exchange = EXCHANGE_CODES.get(record.get('Exchange'), 'NASDAQ')
+            rows.append((symbol, record.get('Security Name', ''), exchange, record.get('ETF') == 'Y'))
+    return rows
+
+def build_symbol_index(data_dir=DATA_DIR) -> SymbolIndex:
+    """Parse the source files into a SymbolIndex"""
+    rows = []
+    nasdaq_listed = os.path.join(data_dir, 'nasdaqlisted.txt')
+    other_listed = os.path.join(data_dir, 'otherlisted.txt')
+    if os.path.exists(nasdaq_listed):
+        rows.extend(_read_symbol_directory(nasdaq_listed, 'Symbol'))
+    if os.path.exists(other_listed):
+        rows.extend(_read_symbol_directory(other_listed, 'ACT Symbol'))
+
+    # The curated file goes last so its names win
+    with open(os.path.join(data_dir, 'symbols.csv'), newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f):
+            rows.append((record['symbol'], record['name'], record['exchange'], record['etf'] == 'Y'))
+
+    names = {}
+    etfs = set()
+    for symbol, name, exchange, is_etf in rows:
+        if not SYMBOL_PATTERN.match(symbol):
+            continue
+        names[symbol] = name
+        if is_etf:
+            etfs.add(symbol)
+
+    aliases = {}
+    with open(os.path.join(data_dir, 'company_aliases.csv'), newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f):
+            aliases[record['alias'].strip().lower()] = record['symbol']
+            names.setdefault(record['symbol'], record['alias'])
+
+    return SymbolIndex(frozenset(names), names, frozenset(etfs), aliases)
+
+def load_symbol_index(data_dir=DATA_DIR, use_cache=True) -> SymbolIndex:
+    """Load the SymbolIndex, from the binary cache when it is up to date"""
+    fingerprint = _fingerprint(_source_files(data_dir))
+    cache_path = os.path.join(data_dir, CACHE_FILE)
+
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_fingerprint, state = pickle.load(f)
+            if cached_fingerprint == fingerprint:
+                return SymbolIndex(*state)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            pass  # Unreadable cache; rebuild it below
+
+    index = build_symbol_index(data_dir)
+
+    if use_cache:
+        try:
+            with open(cache_path, 'wb') as f:
+                # Plain containers only, so the cache loads without this module's classes
+                pickle.dump((fingerprint, index.__getstate__()), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            print(f"Could not write symbol index cache: {e}")
+
+    return index
+
+def download_symbol_files(data_dir=DATA_DIR):
+    """Fetch the current NASDAQ Trader listing files into data_dir"""
+    os.makedirs(data_dir, exist_ok=True)
+    for filename in NASDAQ_TRADER_FILES:
+        url = NASDAQ_TRADER_URL.format(filename)
+        path = os.path.join(data_dir, filename)
+        print(f"Downloading {url}...")
+        urllib.request.urlretrieve(url, path)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build the ticker symbol index")
+    parser.add_argument('--download', action='store_true',
+                        help="Fetch the full NYSE/NASDAQ/AMEX listings from NASDAQ Trader first")
+    args = parser.parse_args()
+
+    if args.download:
+        download_symbol_files()
+
+    start = time.perf_counter()
+    index = build_symbol_index()
+    parse_time = time.perf_counter() - start
+
+    load_symbol_index()  # Writes the cache
+    start = time.perf_counter()
+    index = load_symbol_index()
+    cache_time = time.perf_counter() - start
+
+    print(f"{len(index)} symbols ({len(index.etfs)} ETFs), {len(index.aliases)} company aliases")
+    print(f"Parse from source: {parse_time * 1000:.1f} ms, load from cache: {cache_time * 1000:.1f} ms")
@@ -0,0 +1,128 @@
+"""
+RedditDB writes: rerunning the same data changes nothing, and posts that
+retention expires to the archive replay back from it unchanged.
+"""
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive
+from database import RedditDB
+
+TICKERS = ['AAPL', 'TSLA', 'NVDA', 'GME', 'SPY']
+
+TABLES = ['posts_raw', 'stock_mentions', 'comments', 'daily_ticker_summary', 'weekly_ticker_summary',
+          'monthly_ticker_summary', 'ticker_rolling_stats']
+
+
+def analysis_frame(day, n_posts, rng):
+    """A run's analyzed posts, as the pipeline hands them to RedditDB"""
+    rows = []
+    for i in range(n_posts):
+        post_id = f"{day:%m%d}p{i}"
+        n_comments = rng.randint(0, 6)
+        scores = [round(rng.uniform(-1, 1), 4) for _ in range(n_comments)]
+        tickers = rng.sample(TICKERS, rng.randint(0, 2))
+        rows.append({
+            'post_id': post_id,
+            'subreddit': rng.choice(['stocks', 'wallstreetbets']),
+            'post_title': f"Post {i} about {' '.join(tickers) or 'the market'}",
+            'post_content': 'calls or puts',
+            'post_author': f"user{rng.randint(1, 50)}",
+            'post_score': round(rng.uniform(-1, 1), 4),
+            'num_comments': n_comments,
+            'comments': [f"comment {j} on {post_id}" for j in range(n_comments)],
+            'comment_ids': [f"{post_id}c{j}" for j in range(n_comments)],
+            'comment_times': [1700000000.0 + j for j in range(n_comments)],
+            'url': f"https://reddit.com/r/stocks/comments/{post_id}/post/",
+            'is_new_post': True,
+            'mentioned_tickers': tickers,
+            'ticker_comments': {ticker: sorted(rng.sample(range(-1, n_comments), 1)) for ticker in tickers},
+            'post_sentiment': 'neutral',
+            'post_word_score': 0.0,
+            'comment_sentiment': 'neutral',
+            'comment_score': round(sum(scores) / n_comments, 4) if n_comments else 0.0,
+            'comment_word_scores': scores,
+            'overall_sentiment': 'neutral',
+            'overall_score': round(rng.uniform(-1, 1), 4),
+            'num_comments_analyzed': n_comments,
+        })
+    return pd.DataFrame(rows)
+
+
+def table_contents(path):
+    """Rows of each table; summaries are recomputed for a run's dates, so theirs without the row ID"""
+    conn = sqlite3.connect(path)
+    contents = {}
+    for table in TABLES:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if table.endswith('_summary'):
+            columns = [column for column in columns if column != 'id']
+        contents[table] = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY 1, 2, 3").fetchall()
+    conn.close()
+    return contents
+
+
+def stored_posts(path):
+    """Each post with its mentions and comment count, keyed by Reddit ID rather than row ID"""
+    conn = sqlite3.connect(path)
+    rows = conn.execute('''
+        SELECT reddit_id, date, post_title, overall_score, comment_ids,
+               (SELECT group_concat(ticker || ':' || hex(comment_indices)) FROM stock_mentions WHERE post_id = pr.id),
+               (SELECT COUNT(*) FROM comments AS c WHERE c.date = pr.date AND c.post_id = pr.id)
+        FROM posts_raw AS pr ORDER BY reddit_id
+    ''').fetchall()
+    conn.close()
+    return rows
+
+
+def test_rerun_is_a_no_op(tmp_path):
+    path = str(tmp_path / 'reddit_sentiment.db')
+    rng = random.Random(5)
+    days = [date(2025, 1, 1) + timedelta(days=i) for i in range(3)]
+    frames = {day.isoformat(): analysis_frame(day, 20, rng) for day in days}
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = RedditDB(path)
+        for day, df in frames.items():
+            db.save_daily_data(df, day)
+        stored = table_contents(path)
+
+        for day, df in frames.items():
+            assert db.append_posts(df, day) == set()
+            db.save_daily_data(df, day)
+        db.close()
+
+    assert all(stored[table] for table in ('posts_raw', 'stock_mentions', 'comments', 'daily_ticker_summary'))
+    assert table_contents(path) == stored
+
+
+def test_expired_posts_replay_from_archive(tmp_path, monkeypatch):
+    # The rebuild exports the web data relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(11)
+    days = [date(2025, 1, 1) + timedelta(days=i) for i in range(10)]
+    today = (days[-1] + timedelta(days=1)).isoformat()
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = RedditDB('history.db')
+        for day in days:
+            db.append_posts(analysis_frame(day, 15, rng), day.isoformat())
+        db.refresh_daily_summary(days[0].isoformat(), days[-1].isoformat())
+        before = stored_posts('history.db')
+
+        deleted = db.apply_retention({'raw': 4, 'daily': None}, archive_dir='archive', today=today)
+        kept = stored_posts('history.db')
+        db.close()
+        archive.rebuild_database_from_archive('archive', 'replay.db')
+
+    expired = [post for post in before if post not in kept]
+    assert deleted['raw'] == len(expired) > 0
+    assert all(post[1] < '2025-01-07' for post in expired)
+    assert stored_posts('replay.db') == expired
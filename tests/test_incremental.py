@@ -0,0 +1,41 @@
+"""
+Incremental scraping against the offline FakeReddit client: a seen post is
+only fetched again when it has comments newer than its SeenPostIndex mark.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reddit_scrape
+from database import SeenPostIndex
+from fake_reddit import FakeComment, FakeReddit
+
+
+def scrape(client, seen_index):
+    posts = reddit_scrape.get_posts_with_comments(client=client, seen_index=seen_index, requests_per_minute=None)
+    seen_index.mark_seen(posts)
+    return posts
+
+
+def test_filtered_out_comments_advance_the_mark(tmp_path):
+    client = FakeReddit(posts_per_subreddit=2, comments_per_post=3, latency=0)
+    seen_index = SeenPostIndex(str(tmp_path / 'seen.db'))
+    assert all(post['is_new_post'] for post in scrape(client, seen_index))
+    assert scrape(client, seen_index) == []
+
+    # A new comment on one post, deleted before the next run
+    post = client._posts_for(reddit_scrape.subreddits[0])[0]
+    deleted_utc = max(comment.created_utc for comment in post._comment_list) + 60
+    post._comment_list.append(FakeComment('[deleted]', deleted_utc, f"{post.id}c99", f"t3_{post.id}"))
+    post.num_comments += 1
+
+    posts = scrape(client, seen_index)
+    assert [(record['post_id'], record['comments']) for record in posts] == [(post.id, [])]
+    assert reddit_scrape.is_mark_only(posts[0])
+    assert seen_index.get_marks([post.id])[post.id] == (deleted_utc, post.num_comments)
+
+    # With its mark advanced, the post isn't fetched again
+    requests = client.requests_made
+    assert scrape(client, seen_index) == []
+    assert client.requests_made - requests == 2 * len(reddit_scrape.subreddits)
@@ -0,0 +1,63 @@
+"""
+EXPLAIN QUERY PLAN checks for the RedditDB queries whose cost must not grow
+with the stored history. Each has to use its index and must not scan a
+whole stored table; scans of intermediate results (CTEs, subqueries) are
+fine, as they only hold matched rows.
+"""
+import contextlib
+import io
+import os
+import re
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import RedditDB
+
+# A table of the RedditDB schema after FROM/JOIN, with its alias if any
+TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+(posts_raw|stock_mentions|comments|(?:daily|weekly|monthly)_ticker_summary|ticker_rolling_stats)\b(?:\s+(?:AS\s+)?(\w+))?')
+
+# Query, sample parameters and the index it has to use ('PRIMARY KEY' for
+# the key of a WITHOUT ROWID table)
+PLANNED_QUERIES = {
+    'daily summary': (RedditDB.DAILY_SUMMARY_QUERY, ('2025-01-01', '2025-01-01'), 'idx_stock_mentions_date'),
+    'ticker history': (RedditDB.TICKER_HISTORY_QUERY, ('SPY', 30), 'idx_daily_ticker_summary_ticker_date'),
+    'latest engagement': (RedditDB.LATEST_ENGAGEMENT_QUERY, (), 'sqlite_autoindex_daily_ticker_summary_1'),
+    'rolling stats': (RedditDB.ROLLING_STATS_QUERY, (None,), 'PRIMARY KEY'),
+    'web shard': (RedditDB.WEB_SHARD_QUERY, ('2025-01-01', '2025-01-31'), 'sqlite_autoindex_daily_ticker_summary_1'),
+    'weekly web shard': (RedditDB.WEB_SHARD_QUERIES['weekly'], ('2025-01-01', '2025-01-31'),
+                         'sqlite_autoindex_weekly_ticker_summary_1'),
+    'monthly web shard': (RedditDB.WEB_SHARD_QUERIES['monthly'], ('2025-01-01', '2025-01-31'),
+                          'sqlite_autoindex_monthly_ticker_summary_1'),
+    'comments': (RedditDB.COMMENTS_QUERY, ('2025-01-01', '2025-01-31', 'SPY'), 'idx_stock_mentions_ticker_date'),
+    'comment stats': (RedditDB.COMMENT_STATS_QUERY, (52.5, 47.5, '2025-01-01', '2025-01-31'),
+                      'idx_stock_mentions_post_ticker'),
+}
+
+
+@pytest.fixture(scope='module')
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('plans') / 'reddit_sentiment.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        RedditDB(path).close()
+    return path
+
+
+@pytest.mark.parametrize('name', list(PLANNED_QUERIES))
+def test_query_uses_its_index(db_path, name):
+    query, params, index = PLANNED_QUERIES[name]
+    conn = sqlite3.connect(db_path)
+    plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+    conn.close()
+
+    # Stored tables as the plan names them, i.e. by alias when one is given
+    tables = set()
+    for table, alias in TABLE_REFERENCE.findall(query):
+        tables.update([table, alias])
+    scans = [step for step in plan if step.startswith('SCAN ') and step.split()[1] in tables]
+    assert not scans, f"{name} scans a stored table: {plan}"
+    assert any(f'INDEX {index} ' in step or f'USING {index} ' in step for step in plan), \
+        f"{name}: expected index {index}, got plan {plan}"
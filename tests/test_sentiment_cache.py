@@ -0,0 +1,56 @@
+"""
+The persistent tier of SentimentCache: entries of every scoring version are
+kept side by side, and close() bounds the table by dropping the oldest.
+"""
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment_cache import SentimentCache
+
+
+def store(path, version, texts, **kwargs):
+    cache = SentimentCache(path, **kwargs)
+    cache.set_version(version)
+    cache.put_many({cache.key(text): (0.5, 0.25) for text in texts})
+    cache.close()
+
+
+def cached(path, version, texts):
+    cache = SentimentCache(path)
+    cache.set_version(version)
+    found = cache.get_many([cache.key(text) for text in texts])
+    cache.close()
+    return len(found)
+
+
+def test_versions_keep_their_entries(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    store(path, 'lexicon', ['a post', 'a comment'])
+    store(path, 'custom model', ['a post'])
+    assert cached(path, 'lexicon', ['a post', 'a comment']) == 2
+    assert cached(path, 'custom model', ['a post', 'a comment']) == 1
+
+
+def test_close_drops_the_oldest_entries(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    store(path, 'lexicon', ['old 1', 'old 2'])
+    store(path, 'lexicon', ['new 1', 'new 2'], max_disk_entries=3)
+    assert cached(path, 'lexicon', ['new 1', 'new 2']) == 2
+    assert cached(path, 'lexicon', ['old 1', 'old 2']) == 1
+
+
+def test_caches_from_before_pruning_are_migrated(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE sentiment_cache (
+            key BLOB PRIMARY KEY, version TEXT NOT NULL, compound REAL NOT NULL, word_score REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+    conn.close()
+    store(path, 'lexicon', ['a post'])
+    assert cached(path, 'lexicon', ['a post']) == 1
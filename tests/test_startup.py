@@ -0,0 +1,36 @@
+"""
+The pipeline entry points must not import the heavy libraries they only
+need later, so cron runs and scoring pool workers start quickly. Each is
+imported in a fresh interpreter; benchmarks.py times them against budgets.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'praw', 'vaderSentiment')
+
+# Statement and the heavy modules it is allowed to import
+ENTRY_POINTS = {
+    'import main': ('import main', ()),
+    'import reddit_scrape, database': ('import reddit_scrape, database', ()),
+    'scoring worker': ('import NB_classifier; NB_classifier.SentimentAnalyzer()', ('numpy', 'vaderSentiment')),
+}
+
+
+def imported_modules(statement):
+    """Top-level module names loaded after running statement in a fresh interpreter"""
+    script = (f"{statement}\n"
+              "import sys; print(' '.join(sorted({name.split('.')[0] for name in sys.modules})))")
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True, cwd=ROOT)
+    return set(result.stdout.split())
+
+
+@pytest.mark.parametrize('name', list(ENTRY_POINTS))
+def test_startup_skips_heavy_imports(name):
+    statement, allowed = ENTRY_POINTS[name]
+    heavy = imported_modules(statement) & set(HEAVY_MODULES)
+    assert heavy <= set(allowed), f"{name} imports {sorted(heavy - set(allowed))} at startup"
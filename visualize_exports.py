@@ -1,11 +1,13 @@
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from database import load_web_export
 
 # Load data
-sentiment_df = pd.read_json('docs/data/sentiment_over_time.json')
-mentions_df = pd.read_json('docs/data/mentions_over_time.json')
-engagement_df = pd.read_json('docs/data/engagement_by_ticker.json')
+sentiment_records, mentions_records, engagement_records = load_web_export('docs/data')
+sentiment_df = pd.DataFrame(sentiment_records)
+mentions_df = pd.DataFrame(mentions_records)
+engagement_df = pd.DataFrame(engagement_records)
 
 # 1. Sentiment over time (line plot, one line per ticker)
 fig1 = px.line(